@@ -6,7 +6,7 @@ from sqlalchemy.orm import Session
 import json
 
 from database import engine, get_db, SessionLocal
-from models import Base, User, UserRole, Organization, Module, EmailTemplate, ModuleWhitelist, Subject
+from models import User, UserRole, Organization, Module, EmailTemplate, ModuleWhitelist, Subject
 from routers import auth_router
 from routers import telemetry_router
 from routers import class_router
@@ -16,15 +16,57 @@ from routers import invite_router
 from routers import dashboard_router
 from routers import sparc_router
 from app_registry import ensure_default_apps
+from telemetry_queue import ingest_queue, queue_mode_enabled
+from telemetry_writer import writer_pool
+from telemetry_manifest import manifest_connections
+from telemetry_erasure import erasure_worker
+from telemetry_compaction import compaction_worker
+from telemetry_partitions import PartitionMaintainer
 from routers.sparc_router import seed_wordgame_scores
 from auth import get_password_hash
-from sqlalchemy import text
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from alembic.runtime.migration import MigrationContext
+from anyio import to_thread
+from pathlib import Path
+import os
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+BACKEND_DIR = Path(__file__).resolve().parent
+
+partition_maintainer = PartitionMaintainer(engine)
 
 app = FastAPI(title="PING API", version="2.0.0")
 
+# Route handlers are plain functions that run in this threadpool, off the event loop
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+
+@app.on_event("startup")
+async def configure_threadpool():
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+def verify_schema_revision():
+    """
+    Refuse to start unless the database is at the latest migration
+    Schema changes are applied with `alembic upgrade head`, never by the API workers
+    """
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    expected = ScriptDirectory.from_config(config).get_current_head()
+    with engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, expected {expected}; "
+            "run `alembic upgrade head` in backend/"
+        )
+
+
+@app.on_event("startup")
+def check_schema_revision():
+    verify_schema_revision()
+
 
 @app.on_event("startup")
 def seed_apps():
@@ -36,12 +78,31 @@ def seed_apps():
         ensure_default_email_templates(db)
         ensure_admin_user(db, default_org_id)
         ensure_teacher_user(db, default_org_id)
-        ensure_schema_updates()
         seed_wordgame_scores(db)
     finally:
         db.close()
 
 
+@app.on_event("startup")
+def start_telemetry_ingest():
+    partition_maintainer.start()
+    writer_pool.start()
+    erasure_worker.start()
+    compaction_worker.start()
+    if queue_mode_enabled():
+        ingest_queue.start()
+
+
+@app.on_event("shutdown")
+def drain_telemetry_ingest():
+    ingest_queue.stop()
+    erasure_worker.stop()
+    compaction_worker.stop()
+    writer_pool.stop()
+    manifest_connections.close_all()
+    partition_maintainer.stop()
+
+
 def ensure_default_org(db: Session) -> int:
     existing = db.query(Organization).order_by(Organization.id.asc()).first()
     if existing:
@@ -211,65 +272,6 @@ def ensure_default_email_templates(db: Session):
     db.commit()
 
 
-def ensure_schema_updates():
-    with engine.connect() as conn:
-        conn.execute(text("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name = 'classes' AND column_name = 'description'
-                ) THEN
-                    ALTER TABLE classes ADD COLUMN description TEXT;
-                END IF;
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name = 'users' AND column_name = 'school'
-                ) THEN
-                    ALTER TABLE users ADD COLUMN school TEXT;
-                END IF;
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name = 'users' AND column_name = 'course'
-                ) THEN
-                    ALTER TABLE users ADD COLUMN course TEXT;
-                END IF;
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name = 'users' AND column_name = 'bio'
-                ) THEN
-                    ALTER TABLE users ADD COLUMN bio TEXT;
-                END IF;
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name = 'users' AND column_name = 'avatar'
-                ) THEN
-                    ALTER TABLE users ADD COLUMN avatar TEXT;
-                END IF;
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.tables
-                    WHERE table_name = 'subjects'
-                ) THEN
-                    CREATE TABLE subjects (
-                        id SERIAL PRIMARY KEY,
-                        key TEXT UNIQUE NOT NULL,
-                        name TEXT NOT NULL,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        sort_order INTEGER DEFAULT 0,
-                        created_at TIMESTAMPTZ DEFAULT NOW(),
-                        updated_at TIMESTAMPTZ
-                    );
-                END IF;
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name = 'modules' AND column_name = 'subject_id'
-                ) THEN
-                    ALTER TABLE modules ADD COLUMN subject_id INTEGER;
-                END IF;
-            END $$;
-        """))
-        conn.commit()
-
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
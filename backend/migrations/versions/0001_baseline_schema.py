@@ -0,0 +1,646 @@
+"""baseline schema
+
+The schema as Base.metadata.create_all built it before migrations existed, with
+behavior_data range-partitioned by month on PostgreSQL. Tables that already exist
+are left alone, so existing deployments can run upgrade head without stamping.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 12:31:13.770522
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PARTITIONED_BEHAVIOR_DATA_DDL = [
+    """
+    CREATE TABLE behavior_data (
+        id SERIAL NOT NULL,
+        user_id INTEGER REFERENCES users(id),
+        guest_session_id VARCHAR,
+        module_id VARCHAR NOT NULL,
+        session_id VARCHAR NOT NULL,
+        event_type VARCHAR NOT NULL,
+        event_data TEXT,
+        "timestamp" TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (id, "timestamp")
+    ) PARTITION BY RANGE ("timestamp")
+    """,
+    "CREATE INDEX ix_behavior_data_id ON behavior_data (id)",
+    "CREATE INDEX ix_behavior_data_session_id ON behavior_data (session_id)",
+    "CREATE INDEX ix_behavior_data_user_id ON behavior_data (user_id)",
+    "CREATE INDEX ix_behavior_data_guest_session_id ON behavior_data (guest_session_id)",
+    'CREATE INDEX ix_behavior_data_timestamp ON behavior_data ("timestamp")',
+    "CREATE TABLE behavior_data_default PARTITION OF behavior_data DEFAULT"
+]
+
+
+# Partitions from last month to this many months ahead; telemetry_partitions maintains them after
+PARTITION_MONTHS_AHEAD = 3
+
+
+def add_months(value: date, months: int) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def create_partitioned_behavior_data() -> None:
+    """Monthly partitions exist before the first insert, so nothing lands in the default partition"""
+    for statement in PARTITIONED_BEHAVIOR_DATA_DDL:
+        op.execute(statement)
+    current = datetime.utcnow().date().replace(day=1)
+    for offset in range(-1, PARTITION_MONTHS_AHEAD + 1):
+        start = add_months(current, offset)
+        op.execute(
+            f"CREATE TABLE behavior_data_p{start.year:04d}{start.month:02d} PARTITION OF behavior_data "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+        )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # Databases created by Base.metadata.create_all before migrations already have these tables
+    existing = set(sa.inspect(bind).get_table_names())
+
+    if "apps" not in existing:
+        op.create_table('apps',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('slug', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('base_url', sa.String(), nullable=True),
+        sa.Column('status', sa.Enum('ACTIVE', 'MAINTENANCE', 'DISABLED', name='appstatus'), nullable=True),
+        sa.Column('api_key_hash', sa.String(), nullable=True),
+        sa.Column('source_type', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_event_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_apps_id', 'apps', ['id'], unique=False)
+        op.create_index('ix_apps_slug', 'apps', ['slug'], unique=True)
+
+    if "email_templates" not in existing:
+        op.create_table('email_templates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('subject', sa.Text(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_email_templates_id', 'email_templates', ['id'], unique=False)
+        op.create_index('ix_email_templates_key', 'email_templates', ['key'], unique=True)
+
+    if "organizations" not in existing:
+        op.create_table('organizations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('domain', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('consent_text', sa.Text(), nullable=True),
+        sa.Column('privacy_policy', sa.Text(), nullable=True),
+        sa.Column('cookie_policy', sa.Text(), nullable=True),
+        sa.Column('data_collection_enabled', sa.Boolean(), nullable=True),
+        sa.Column('keyboard_tracking_enabled', sa.Boolean(), nullable=True),
+        sa.Column('telemetry_settings', sa.JSON(), nullable=True),
+        sa.Column('data_retention_days', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('domain')
+        )
+        op.create_index('ix_organizations_id', 'organizations', ['id'], unique=False)
+        op.create_index('ix_organizations_name', 'organizations', ['name'], unique=True)
+
+    if "subjects" not in existing:
+        op.create_table('subjects',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('sort_order', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_subjects_id', 'subjects', ['id'], unique=False)
+        op.create_index('ix_subjects_key', 'subjects', ['key'], unique=True)
+
+    if "telemetry_erasure_jobs" not in existing:
+        op.create_table('telemetry_erasure_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('guest_session_id', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('sessions_total', sa.Integer(), nullable=False),
+        sa.Column('sessions_erased', sa.Integer(), nullable=False),
+        sa.Column('rows_deleted', sa.BigInteger(), nullable=False),
+        sa.Column('files_removed', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_telemetry_erasure_jobs_guest_session_id', 'telemetry_erasure_jobs', ['guest_session_id'], unique=False)
+        op.create_index('ix_telemetry_erasure_jobs_id', 'telemetry_erasure_jobs', ['id'], unique=False)
+        op.create_index('ix_telemetry_erasure_jobs_job_id', 'telemetry_erasure_jobs', ['job_id'], unique=True)
+        op.create_index('ix_telemetry_erasure_jobs_status', 'telemetry_erasure_jobs', ['status'], unique=False)
+        op.create_index('ix_telemetry_erasure_jobs_user_id', 'telemetry_erasure_jobs', ['user_id'], unique=False)
+
+    if "app_metrics_daily" not in existing:
+        op.create_table('app_metrics_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('app_id', sa.Integer(), nullable=False),
+        sa.Column('metric_date', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('active_users', sa.Integer(), nullable=True),
+        sa.Column('new_users', sa.Integer(), nullable=True),
+        sa.Column('sessions', sa.Integer(), nullable=True),
+        sa.Column('events', sa.Integer(), nullable=True),
+        sa.Column('errors', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['app_id'], ['apps.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('app_id', 'metric_date', name='uq_app_metrics_daily')
+        )
+        op.create_index('ix_app_metrics_daily_id', 'app_metrics_daily', ['id'], unique=False)
+        op.create_index('ix_app_metrics_daily_metric_date', 'app_metrics_daily', ['metric_date'], unique=False)
+
+    if "modules" not in existing:
+        op.create_table('modules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('module_id', sa.String(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('subject', sa.String(), nullable=False),
+        sa.Column('subject_id', sa.Integer(), nullable=True),
+        sa.Column('unity_version', sa.String(), nullable=True),
+        sa.Column('build_path', sa.String(), nullable=True),
+        sa.Column('is_published', sa.Boolean(), nullable=True),
+        sa.Column('version', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('published_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_modules_id', 'modules', ['id'], unique=False)
+        op.create_index('ix_modules_module_id', 'modules', ['module_id'], unique=True)
+
+    if "users" not in existing:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('full_name', sa.String(), nullable=True),
+        sa.Column('school', sa.String(), nullable=True),
+        sa.Column('course', sa.String(), nullable=True),
+        sa.Column('bio', sa.Text(), nullable=True),
+        sa.Column('avatar', sa.String(), nullable=True),
+        sa.Column('role', sa.Enum('GUEST', 'STUDENT', 'TEACHER', 'ORG_ADMIN', 'PLATFORM_ADMIN', name='userrole'), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('is_verified', sa.Boolean(), nullable=True),
+        sa.Column('google_id', sa.String(), nullable=True),
+        sa.Column('oauth_provider', sa.String(), nullable=True),
+        sa.Column('guest_id', sa.String(), nullable=True),
+        sa.Column('organization_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_login', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+        op.create_index('ix_users_google_id', 'users', ['google_id'], unique=True)
+        op.create_index('ix_users_guest_id', 'users', ['guest_id'], unique=True)
+        op.create_index('ix_users_id', 'users', ['id'], unique=False)
+        op.create_index('ix_users_username', 'users', ['username'], unique=True)
+
+    if "activity_rollups" not in existing:
+        op.create_table('activity_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('module_id', sa.String(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('owner_key', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('guest_session_id', sa.String(), nullable=True),
+        sa.Column('organization_id', sa.Integer(), nullable=True),
+        sa.Column('session_count', sa.Integer(), nullable=False),
+        sa.Column('event_count', sa.BigInteger(), nullable=False),
+        sa.Column('last_active_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('module_id', 'owner_key', 'day', name='uq_activity_rollups_module_owner_day')
+        )
+        op.create_index('ix_activity_rollups_guest_session_id', 'activity_rollups', ['guest_session_id'], unique=False)
+        op.create_index('ix_activity_rollups_id', 'activity_rollups', ['id'], unique=False)
+        op.create_index('ix_activity_rollups_organization_id', 'activity_rollups', ['organization_id'], unique=False)
+        op.create_index('ix_activity_rollups_user_module', 'activity_rollups', ['user_id', 'module_id'], unique=False)
+
+    if "app_events" not in existing:
+        op.create_table('app_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('app_id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('external_user_id', sa.String(), nullable=True),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('event_name', sa.String(), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('occurred_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['app_id'], ['apps.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_app_events_id', 'app_events', ['id'], unique=False)
+        op.create_index('ix_app_events_occurred_at', 'app_events', ['occurred_at'], unique=False)
+        op.create_index('ix_app_events_received_at', 'app_events', ['received_at'], unique=False)
+        op.create_index('ix_app_events_session_id', 'app_events', ['session_id'], unique=False)
+
+    if "app_sessions" not in existing:
+        op.create_table('app_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('app_id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('external_user_id', sa.String(), nullable=True),
+        sa.Column('metadata', sa.JSON(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('ended_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_event_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['app_id'], ['apps.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_app_sessions_id', 'app_sessions', ['id'], unique=False)
+        op.create_index('ix_app_sessions_session_id', 'app_sessions', ['session_id'], unique=False)
+
+    if "audit_logs" not in existing:
+        op.create_table('audit_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('entity_type', sa.String(), nullable=True),
+        sa.Column('entity_id', sa.Integer(), nullable=True),
+        sa.Column('details', sa.Text(), nullable=True),
+        sa.Column('ip_address', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_audit_logs_created_at', 'audit_logs', ['created_at'], unique=False)
+        op.create_index('ix_audit_logs_id', 'audit_logs', ['id'], unique=False)
+
+    if "behavior_data" not in existing:
+        if bind.dialect.name == "postgresql":
+            create_partitioned_behavior_data()
+        else:
+            op.create_table('behavior_data',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('guest_session_id', sa.String(), nullable=True),
+            sa.Column('module_id', sa.String(), nullable=False),
+            sa.Column('session_id', sa.String(), nullable=False),
+            sa.Column('event_type', sa.String(), nullable=False),
+            sa.Column('event_data', sa.Text(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+            )
+            op.create_index('ix_behavior_data_guest_session_id', 'behavior_data', ['guest_session_id'], unique=False)
+            op.create_index('ix_behavior_data_id', 'behavior_data', ['id'], unique=False)
+            op.create_index('ix_behavior_data_session_id', 'behavior_data', ['session_id'], unique=False)
+            op.create_index('ix_behavior_data_timestamp', 'behavior_data', ['timestamp'], unique=False)
+            op.create_index('ix_behavior_data_user_id', 'behavior_data', ['user_id'], unique=False)
+
+    if "classes" not in existing:
+        op.create_table('classes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('join_code', sa.String(), nullable=False),
+        sa.Column('teacher_id', sa.Integer(), nullable=False),
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_classes_id', 'classes', ['id'], unique=False)
+        op.create_index('ix_classes_join_code', 'classes', ['join_code'], unique=True)
+
+    if "consent_records" not in existing:
+        op.create_table('consent_records',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('guest_session_id', sa.String(), nullable=True),
+        sa.Column('terms_accepted', sa.Boolean(), nullable=True),
+        sa.Column('privacy_accepted', sa.Boolean(), nullable=True),
+        sa.Column('data_collection_accepted', sa.Boolean(), nullable=True),
+        sa.Column('cookie_accepted', sa.Boolean(), nullable=True),
+        sa.Column('ip_address', sa.String(), nullable=True),
+        sa.Column('user_agent', sa.String(), nullable=True),
+        sa.Column('consented_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_consent_records_id', 'consent_records', ['id'], unique=False)
+
+    if "external_accounts" not in existing:
+        op.create_table('external_accounts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('provider', sa.String(), nullable=False),
+        sa.Column('external_user_id', sa.String(), nullable=True),
+        sa.Column('external_email', sa.String(), nullable=True),
+        sa.Column('linked_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('provider', 'external_user_id', name='uq_external_accounts_provider_user')
+        )
+        op.create_index('ix_external_accounts_id', 'external_accounts', ['id'], unique=False)
+
+    if "module_whitelist" not in existing:
+        op.create_table('module_whitelist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('module_id', sa.Integer(), nullable=False),
+        sa.Column('is_enabled', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['module_id'], ['modules.id'], ),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_module_whitelist_id', 'module_whitelist', ['id'], unique=False)
+
+    if "session_features" not in existing:
+        op.create_table('session_features',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('module_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('guest_session_id', sa.String(), nullable=True),
+        sa.Column('features', sa.JSON(), nullable=False),
+        sa.Column('feature_version', sa.Integer(), nullable=False),
+        sa.Column('event_count', sa.Integer(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_session_features_guest_session_id', 'session_features', ['guest_session_id'], unique=False)
+        op.create_index('ix_session_features_id', 'session_features', ['id'], unique=False)
+        op.create_index('ix_session_features_module_id', 'session_features', ['module_id'], unique=False)
+        op.create_index('ix_session_features_session_id', 'session_features', ['session_id'], unique=True)
+        op.create_index('ix_session_features_user_id', 'session_features', ['user_id'], unique=False)
+
+    if "sparc_game_sessions" not in existing:
+        op.create_table('sparc_game_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('game_slug', sa.String(), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=True),
+        sa.Column('completed', sa.Boolean(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('ended_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('metadata', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_sparc_game_sessions_id', 'sparc_game_sessions', ['id'], unique=False)
+
+    if "sparc_wordgame_scores" not in existing:
+        op.create_table('sparc_wordgame_scores',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('player_name', sa.String(), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=True),
+        sa.Column('scene', sa.String(), nullable=True),
+        sa.Column('played_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('original_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_sparc_wordgame_scores_id', 'sparc_wordgame_scores', ['id'], unique=False)
+
+    if "telemetry_sessions" not in existing:
+        op.create_table('telemetry_sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('module_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('guest_session_id', sa.String(), nullable=True),
+        sa.Column('event_count', sa.Integer(), nullable=False),
+        sa.Column('event_type_counts', sa.JSON(), nullable=True),
+        sa.Column('byte_size', sa.BigInteger(), nullable=False),
+        sa.Column('first_event_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_event_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('ended_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('compacted_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_telemetry_sessions_compacted_at', 'telemetry_sessions', ['compacted_at'], unique=False)
+        op.create_index('ix_telemetry_sessions_guest_session_id', 'telemetry_sessions', ['guest_session_id'], unique=False)
+        op.create_index('ix_telemetry_sessions_id', 'telemetry_sessions', ['id'], unique=False)
+        op.create_index('ix_telemetry_sessions_last_event_at', 'telemetry_sessions', ['last_event_at'], unique=False)
+        op.create_index('ix_telemetry_sessions_last_event_session', 'telemetry_sessions', ['last_event_at', 'session_id'], unique=False)
+        op.create_index('ix_telemetry_sessions_module_id', 'telemetry_sessions', ['module_id'], unique=False)
+        op.create_index('ix_telemetry_sessions_module_last_event_session', 'telemetry_sessions', ['module_id', 'last_event_at', 'session_id'], unique=False)
+        op.create_index('ix_telemetry_sessions_session_id', 'telemetry_sessions', ['session_id'], unique=True)
+        op.create_index('ix_telemetry_sessions_user_id', 'telemetry_sessions', ['user_id'], unique=False)
+
+    if "invite_codes" not in existing:
+        op.create_table('invite_codes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(), nullable=False),
+        sa.Column('role', sa.Enum('TEACHER', 'STUDENT', name='inviterole'), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('organization_id', sa.Integer(), nullable=True),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.Column('max_uses', sa.Integer(), nullable=True),
+        sa.Column('uses', sa.Integer(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_invite_codes_code', 'invite_codes', ['code'], unique=True)
+        op.create_index('ix_invite_codes_id', 'invite_codes', ['id'], unique=False)
+
+    if "class_students" not in existing:
+        op.create_table('class_students',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('invite_id', sa.Integer(), nullable=True),
+        sa.Column('invited_by', sa.Integer(), nullable=True),
+        sa.Column('joined_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+        sa.ForeignKeyConstraint(['invite_id'], ['invite_codes.id'], ),
+        sa.ForeignKeyConstraint(['invited_by'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('class_id', 'user_id', name='uq_class_students')
+        )
+        op.create_index('ix_class_students_id', 'class_students', ['id'], unique=False)
+
+    if "invite_uses" not in existing:
+        op.create_table('invite_uses',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('invite_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('used_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('ip_address', sa.String(), nullable=True),
+        sa.Column('user_agent', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['invite_id'], ['invite_codes.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_invite_uses_id', 'invite_uses', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_invite_uses_id', table_name='invite_uses')
+
+    op.drop_table('invite_uses')
+    op.drop_index('ix_class_students_id', table_name='class_students')
+
+    op.drop_table('class_students')
+    op.drop_index('ix_invite_codes_id', table_name='invite_codes')
+    op.drop_index('ix_invite_codes_code', table_name='invite_codes')
+
+    op.drop_table('invite_codes')
+    op.drop_index('ix_telemetry_sessions_user_id', table_name='telemetry_sessions')
+    op.drop_index('ix_telemetry_sessions_session_id', table_name='telemetry_sessions')
+    op.drop_index('ix_telemetry_sessions_module_last_event_session', table_name='telemetry_sessions')
+    op.drop_index('ix_telemetry_sessions_module_id', table_name='telemetry_sessions')
+    op.drop_index('ix_telemetry_sessions_last_event_session', table_name='telemetry_sessions')
+    op.drop_index('ix_telemetry_sessions_last_event_at', table_name='telemetry_sessions')
+    op.drop_index('ix_telemetry_sessions_id', table_name='telemetry_sessions')
+    op.drop_index('ix_telemetry_sessions_guest_session_id', table_name='telemetry_sessions')
+    op.drop_index('ix_telemetry_sessions_compacted_at', table_name='telemetry_sessions')
+
+    op.drop_table('telemetry_sessions')
+    op.drop_index('ix_sparc_wordgame_scores_id', table_name='sparc_wordgame_scores')
+
+    op.drop_table('sparc_wordgame_scores')
+    op.drop_index('ix_sparc_game_sessions_id', table_name='sparc_game_sessions')
+
+    op.drop_table('sparc_game_sessions')
+    op.drop_index('ix_session_features_user_id', table_name='session_features')
+    op.drop_index('ix_session_features_session_id', table_name='session_features')
+    op.drop_index('ix_session_features_module_id', table_name='session_features')
+    op.drop_index('ix_session_features_id', table_name='session_features')
+    op.drop_index('ix_session_features_guest_session_id', table_name='session_features')
+
+    op.drop_table('session_features')
+    op.drop_index('ix_module_whitelist_id', table_name='module_whitelist')
+
+    op.drop_table('module_whitelist')
+    op.drop_index('ix_external_accounts_id', table_name='external_accounts')
+
+    op.drop_table('external_accounts')
+    op.drop_index('ix_consent_records_id', table_name='consent_records')
+
+    op.drop_table('consent_records')
+    op.drop_index('ix_classes_join_code', table_name='classes')
+    op.drop_index('ix_classes_id', table_name='classes')
+
+    op.drop_table('classes')
+    op.drop_index('ix_behavior_data_user_id', table_name='behavior_data')
+    op.drop_index('ix_behavior_data_timestamp', table_name='behavior_data')
+    op.drop_index('ix_behavior_data_session_id', table_name='behavior_data')
+    op.drop_index('ix_behavior_data_id', table_name='behavior_data')
+    op.drop_index('ix_behavior_data_guest_session_id', table_name='behavior_data')
+
+    op.drop_table('behavior_data')
+    op.drop_index('ix_audit_logs_id', table_name='audit_logs')
+    op.drop_index('ix_audit_logs_created_at', table_name='audit_logs')
+
+    op.drop_table('audit_logs')
+    op.drop_index('ix_app_sessions_session_id', table_name='app_sessions')
+    op.drop_index('ix_app_sessions_id', table_name='app_sessions')
+
+    op.drop_table('app_sessions')
+    op.drop_index('ix_app_events_session_id', table_name='app_events')
+    op.drop_index('ix_app_events_received_at', table_name='app_events')
+    op.drop_index('ix_app_events_occurred_at', table_name='app_events')
+    op.drop_index('ix_app_events_id', table_name='app_events')
+
+    op.drop_table('app_events')
+    op.drop_index('ix_activity_rollups_user_module', table_name='activity_rollups')
+    op.drop_index('ix_activity_rollups_organization_id', table_name='activity_rollups')
+    op.drop_index('ix_activity_rollups_id', table_name='activity_rollups')
+    op.drop_index('ix_activity_rollups_guest_session_id', table_name='activity_rollups')
+
+    op.drop_table('activity_rollups')
+    op.drop_index('ix_users_username', table_name='users')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_index('ix_users_guest_id', table_name='users')
+    op.drop_index('ix_users_google_id', table_name='users')
+    op.drop_index('ix_users_email', table_name='users')
+
+    op.drop_table('users')
+    op.drop_index('ix_modules_module_id', table_name='modules')
+    op.drop_index('ix_modules_id', table_name='modules')
+
+    op.drop_table('modules')
+    op.drop_index('ix_app_metrics_daily_metric_date', table_name='app_metrics_daily')
+    op.drop_index('ix_app_metrics_daily_id', table_name='app_metrics_daily')
+
+    op.drop_table('app_metrics_daily')
+    op.drop_index('ix_telemetry_erasure_jobs_user_id', table_name='telemetry_erasure_jobs')
+    op.drop_index('ix_telemetry_erasure_jobs_status', table_name='telemetry_erasure_jobs')
+    op.drop_index('ix_telemetry_erasure_jobs_job_id', table_name='telemetry_erasure_jobs')
+    op.drop_index('ix_telemetry_erasure_jobs_id', table_name='telemetry_erasure_jobs')
+    op.drop_index('ix_telemetry_erasure_jobs_guest_session_id', table_name='telemetry_erasure_jobs')
+
+    op.drop_table('telemetry_erasure_jobs')
+    op.drop_index('ix_subjects_key', table_name='subjects')
+    op.drop_index('ix_subjects_id', table_name='subjects')
+
+    op.drop_table('subjects')
+    op.drop_index('ix_organizations_name', table_name='organizations')
+    op.drop_index('ix_organizations_id', table_name='organizations')
+
+    op.drop_table('organizations')
+    op.drop_index('ix_email_templates_key', table_name='email_templates')
+    op.drop_index('ix_email_templates_id', table_name='email_templates')
+
+    op.drop_table('email_templates')
+    op.drop_index('ix_apps_slug', table_name='apps')
+    op.drop_index('ix_apps_id', table_name='apps')
+
+    op.drop_table('apps')
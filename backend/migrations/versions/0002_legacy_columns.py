@@ -0,0 +1,56 @@
+"""legacy columns and indexes
+
+Columns and indexes that main.ensure_schema_updates used to add at every startup,
+for databases whose tables predate them. create_all never alters an existing table,
+so these are added here only where missing. behavior_data indexes are left to 0003,
+which builds them without blocking writes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEGACY_COLUMNS = [
+    ('classes', sa.Column('description', sa.Text(), nullable=True)),
+    ('users', sa.Column('school', sa.Text(), nullable=True)),
+    ('users', sa.Column('course', sa.Text(), nullable=True)),
+    ('users', sa.Column('bio', sa.Text(), nullable=True)),
+    ('users', sa.Column('avatar', sa.Text(), nullable=True)),
+    ('modules', sa.Column('subject_id', sa.Integer(), nullable=True)),
+    ('organizations', sa.Column('telemetry_settings', sa.JSON(), nullable=True)),
+    ('telemetry_sessions', sa.Column('compacted_at', sa.DateTime(timezone=True), nullable=True)),
+]
+
+LEGACY_INDEXES = [
+    ('ix_telemetry_sessions_compacted_at', 'telemetry_sessions', ['compacted_at']),
+    ('ix_telemetry_sessions_last_event_session', 'telemetry_sessions', ['last_event_at', 'session_id']),
+    ('ix_telemetry_sessions_module_last_event_session', 'telemetry_sessions', ['module_id', 'last_event_at', 'session_id']),
+    ('ix_activity_rollups_user_module', 'activity_rollups', ['user_id', 'module_id']),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, column in LEGACY_COLUMNS:
+        if column.name not in {existing['name'] for existing in inspector.get_columns(table)}:
+            op.add_column(table, column)
+    for name, table, columns in LEGACY_INDEXES:
+        if name not in {existing['name'] for existing in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    # The baseline declares these columns and indexes too; they are not removed
+    pass
@@ -0,0 +1,107 @@
+"""behavior_data hot path indexes, built online
+
+Composite indexes for the module/time, owner/module/time and guest/module lookups,
+plus the owner indexes older deployments may lack. On PostgreSQL they are built with
+CREATE INDEX CONCURRENTLY outside a transaction, so ingest keeps writing meanwhile.
+A partitioned behavior_data cannot be indexed concurrently as a whole: the parent
+index is created ON ONLY (invalid, no data scanned), each partition is indexed
+concurrently and attached, and the parent becomes valid once every partition is.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:45:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'behavior_data'
+
+INDEXES = [
+    ('ix_behavior_data_user_id', ['user_id']),
+    ('ix_behavior_data_guest_session_id', ['guest_session_id']),
+    ('ix_behavior_data_module_timestamp', ['module_id', 'timestamp']),
+    ('ix_behavior_data_user_module_timestamp', ['user_id', 'module_id', 'timestamp']),
+    ('ix_behavior_data_guest_module', ['guest_session_id', 'module_id']),
+]
+NEW_INDEXES = INDEXES[2:]
+
+
+def column_list(columns: list[str]) -> str:
+    return ', '.join(f'"{column}"' for column in columns)
+
+
+def index_state(bind, name: str) -> bool | None:
+    """True if the index exists and is valid, False if a failed concurrent build left it invalid"""
+    return bind.execute(sa.text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {'name': name}).scalar()
+
+
+def build_concurrently(bind, name: str, table: str, columns: list[str]) -> None:
+    state = index_state(bind, name)
+    if state:
+        return
+    if state is False:
+        op.execute(f'DROP INDEX CONCURRENTLY {name}')
+    op.execute(f'CREATE INDEX CONCURRENTLY {name} ON {table} ({column_list(columns)})')
+
+
+def partitions(bind) -> list[str]:
+    return bind.execute(sa.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :name ORDER BY child.relname"
+    ), {'name': TABLE}).scalars().all()
+
+
+def is_attached(bind, child_index: str, parent_index: str) -> bool:
+    return bool(bind.execute(sa.text(
+        "SELECT 1 FROM pg_inherits "
+        "WHERE inhrelid = to_regclass(:child) AND inhparent = to_regclass(:parent)"
+    ), {'child': child_index, 'parent': parent_index}).scalar())
+
+
+def build_partitioned(bind, name: str, columns: list[str]) -> None:
+    if index_state(bind, name):
+        return
+    op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON ONLY {TABLE} ({column_list(columns)})')
+    suffix = name[len(f'ix_{TABLE}_'):]
+    for partition in partitions(bind):
+        child_index = f'{partition}_{suffix}'
+        build_concurrently(bind, child_index, partition, columns)
+        if not is_attached(bind, child_index, name):
+            op.execute(f'ALTER INDEX {name} ATTACH PARTITION {child_index}')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, columns in INDEXES:
+            op.create_index(name, TABLE, columns, unique=False, if_not_exists=True)
+        return
+    partitioned = bind.execute(sa.text(
+        "SELECT c.relkind = 'p' FROM pg_class c WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {'name': TABLE}).scalar()
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            if partitioned:
+                build_partitioned(bind, name, columns)
+            else:
+                build_concurrently(bind, name, TABLE, columns)
+
+
+def downgrade() -> None:
+    for name, _ in NEW_INDEXES:
+        op.drop_index(name, table_name=TABLE, if_exists=True)
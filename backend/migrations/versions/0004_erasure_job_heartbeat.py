@@ -0,0 +1,30 @@
+"""erasure job heartbeat
+
+telemetry_erasure_jobs.heartbeat_at, bumped by the worker as a job progresses, so a
+job is only reclaimed once its heartbeat stops rather than a fixed time after it started.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('telemetry_erasure_jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('telemetry_erasure_jobs') as batch_op:
+        batch_op.drop_column('heartbeat_at')
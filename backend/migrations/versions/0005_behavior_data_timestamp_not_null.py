@@ -0,0 +1,54 @@
+"""behavior_data.timestamp not null
+
+The partitioned table needs timestamp NOT NULL (it is part of the primary key), and
+the model now says so everywhere. Tables created before that, by create_all or an
+earlier 0001, get it here. On PostgreSQL a NOT VALID check constraint is validated
+without blocking writes, after which SET NOT NULL skips its own table scan.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'behavior_data'
+CHECK_NAME = 'ck_behavior_data_timestamp_not_null'
+
+
+def timestamp_nullable(bind) -> bool:
+    columns = {column['name']: column for column in sa.inspect(bind).get_columns(TABLE)}
+    return columns['timestamp']['nullable']
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not timestamp_nullable(bind):
+        return
+    if bind.dialect.name != 'postgresql':
+        op.execute(f'UPDATE {TABLE} SET "timestamp" = CURRENT_TIMESTAMP WHERE "timestamp" IS NULL')
+        with op.batch_alter_table(TABLE) as batch_op:
+            batch_op.alter_column('timestamp', existing_type=sa.DateTime(timezone=True), nullable=False)
+        return
+    with op.get_context().autocommit_block():
+        op.execute(f'UPDATE {TABLE} SET "timestamp" = now() WHERE "timestamp" IS NULL')
+        op.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS {CHECK_NAME}')
+        op.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {CHECK_NAME} CHECK ("timestamp" IS NOT NULL) NOT VALID')
+        op.execute(f'ALTER TABLE {TABLE} VALIDATE CONSTRAINT {CHECK_NAME}')
+        op.execute(f'ALTER TABLE {TABLE} ALTER COLUMN "timestamp" SET NOT NULL')
+        op.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT {CHECK_NAME}')
+
+
+def downgrade() -> None:
+    # The partitioned table cannot drop NOT NULL from a primary key column; left as is
+    pass
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum, JSON, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Text, Enum, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -65,6 +65,7 @@ class Organization(Base):
     # Data collection settings
     data_collection_enabled = Column(Boolean, default=True)
     keyboard_tracking_enabled = Column(Boolean, default=True)
+    telemetry_settings = Column(JSON, nullable=True)  # overrides for sampling_rate, batch_ms, event_sampling, ...
     
     # Data retention (days)
     data_retention_days = Column(Integer, default=365)
@@ -201,10 +202,10 @@ class BehaviorData(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     user = relationship("User", back_populates="behavior_data")
     
-    guest_session_id = Column(String, nullable=True)  # For guest tracking
+    guest_session_id = Column(String, nullable=True, index=True)  # For guest tracking
     
     # Module info
     module_id = Column(String, nullable=False)
@@ -214,8 +215,113 @@ class BehaviorData(Base):
     event_type = Column(String, nullable=False)  # 'keypress', 'click', 'objective_complete', etc.
     event_data = Column(Text, nullable=True)  # JSON string
     
-    # Timestamp
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Timestamp; NOT NULL as the partition key of the PostgreSQL table
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    # Built online by migration 0003
+    __table_args__ = (
+        Index("ix_behavior_data_module_timestamp", "module_id", "timestamp"),
+        Index("ix_behavior_data_user_module_timestamp", "user_id", "module_id", "timestamp"),
+        Index("ix_behavior_data_guest_module", "guest_session_id", "module_id"),
+    )
+
+class TelemetrySession(Base):
+    __tablename__ = "telemetry_sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, unique=True, index=True, nullable=False)
+    module_id = Column(String, nullable=False, index=True)
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    guest_session_id = Column(String, nullable=True, index=True)
+
+    # Running counters, updated as batches are stored
+    event_count = Column(Integer, default=0, nullable=False)
+    event_type_counts = Column(JSON, nullable=True)  # {"key_down": 120, ...}
+    byte_size = Column(BigInteger, default=0, nullable=False)  # uncompressed JSONL bytes
+    first_event_at = Column(DateTime(timezone=True), nullable=True)
+    last_event_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+    # Timestamps
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    ended_at = Column(DateTime(timezone=True), nullable=True)
+    compacted_at = Column(DateTime(timezone=True), nullable=True, index=True)  # copied into columnar storage
+
+    # Keyset pagination of the admin session listing, across and within modules
+    __table_args__ = (
+        Index("ix_telemetry_sessions_last_event_session", "last_event_at", "session_id"),
+        Index("ix_telemetry_sessions_module_last_event_session", "module_id", "last_event_at", "session_id"),
+    )
+
+
+class TelemetryErasureJob(Base):
+    __tablename__ = "telemetry_erasure_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, unique=True, index=True, nullable=False)
+
+    # Whose telemetry is erased; no FK so the job outlives a deleted account
+    user_id = Column(Integer, nullable=True, index=True)
+    guest_session_id = Column(String, nullable=True, index=True)
+
+    status = Column(String, default="pending", nullable=False, index=True)  # pending, running, completed, failed
+    sessions_total = Column(Integer, default=0, nullable=False)
+    sessions_erased = Column(Integer, default=0, nullable=False)
+    rows_deleted = Column(BigInteger, default=0, nullable=False)
+    files_removed = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    # Bumped as the running job makes progress; a job whose heartbeat stops is reclaimed
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class SessionFeature(Base):
+    __tablename__ = "session_features"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, unique=True, index=True, nullable=False)
+    module_id = Column(String, nullable=False, index=True)
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    guest_session_id = Column(String, nullable=True, index=True)
+
+    # Derived metrics, e.g. {"keystroke_interval_median_ms": 142.0, "pointer_path_px": 8210.5, ...}
+    features = Column(JSON, nullable=False)
+    feature_version = Column(Integer, nullable=False)
+    event_count = Column(Integer, default=0, nullable=False)  # registry event count the features reflect
+
+    # Timestamps
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ActivityRollup(Base):
+    __tablename__ = "activity_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    module_id = Column(String, nullable=False)
+    day = Column(Date, nullable=False)  # UTC
+
+    # "u:<user_id>" or "g:<guest_session_id>"; non-null so upserts can conflict on it
+    owner_key = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    guest_session_id = Column(String, nullable=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=True, index=True)
+
+    # Maintained incrementally by the ingest path
+    session_count = Column(Integer, default=0, nullable=False)
+    event_count = Column(BigInteger, default=0, nullable=False)
+    last_active_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("module_id", "owner_key", "day", name="uq_activity_rollups_module_owner_day"),
+        # Roster lookups: one index range per class member
+        Index("ix_activity_rollups_user_module", "user_id", "module_id"),
+    )
+
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
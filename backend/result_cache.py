@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+# memory: per-process LRU; redis: shared by every worker (needs the redis package)
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL", "redis://localhost:6379/0")
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "15"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2048"))
+# Longest a result may lag behind ingest; polling during a lesson still hits within this window
+RESULT_CACHE_INVALIDATE_SECONDS = float(os.getenv("RESULT_CACHE_INVALIDATE_SECONDS", "2"))
+
+
+class MemoryCacheBackend:
+    name = "memory"
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def size(self) -> int | None:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    name = "redis"
+
+    def __init__(self, url: str = RESULT_CACHE_URL):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, decode_responses=True)
+
+    def get(self, key: str) -> str | None:
+        return self.client.get(key)
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.client.set(key, value, px=int(ttl * 1000))
+
+    def get_counter(self, key: str) -> int:
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+    def size(self) -> int | None:
+        return None
+
+
+class ResultCache:
+    """
+    Short-TTL cache of computed responses, scoped to an organization
+    Ingest records when an organization's data last changed; an entry computed before that
+    is still served until it is invalidate_seconds old, so a class that is ingesting gets
+    hits and no result is staler than that. invalidate_org bumps the organization's
+    generation, which is part of every key, to drop its entries at once.
+    """
+
+    def __init__(self, backend, ttl: float = RESULT_CACHE_TTL_SECONDS, invalidate_seconds: float = RESULT_CACHE_INVALIDATE_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.invalidate_seconds = invalidate_seconds
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "changes": 0, "invalidations": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _is_stale(self, computed_at: float, changed_at: str | None) -> bool:
+        if changed_at is None or float(changed_at) <= computed_at:
+            return False
+        return time.time() - computed_at >= self.invalidate_seconds
+
+    def get_or_compute(self, namespace: str, organization_id: int | None, key, compute):
+        """JSON-compatible result of compute(), served from the cache while fresh"""
+        if not RESULT_CACHE_ENABLED:
+            return jsonable_encoder(compute())
+        try:
+            generation = self.backend.get_counter(f"gen:org:{organization_id}")
+            changed_at = self.backend.get(f"changed:org:{organization_id}")
+            cache_key = f"{namespace}:{key}:g{generation}"
+            cached = self.backend.get(cache_key)
+        except Exception:
+            logger.warning("Result cache backend unavailable", exc_info=True)
+            self._count("errors")
+            return jsonable_encoder(compute())
+        if cached is not None:
+            entry = json.loads(cached)
+            if not self._is_stale(entry["computed_at"], changed_at):
+                self._count("hits")
+                return entry["value"]
+            self._count("stale")
+        self._count("misses")
+        # Taken before computing, so a change made meanwhile still counts as newer
+        computed_at = time.time()
+        value = jsonable_encoder(compute())
+        try:
+            self.backend.set(cache_key, json.dumps({"computed_at": computed_at, "value": value}), self.ttl)
+        except Exception:
+            self._count("errors")
+        return value
+
+    def record_change(self, organization_id: int | None) -> None:
+        """Note that an organization's data changed; its entries refresh within invalidate_seconds"""
+        if not RESULT_CACHE_ENABLED:
+            return
+        try:
+            # Only entries younger than the TTL can predate the change, so the marker expires with them
+            self.backend.set(f"changed:org:{organization_id}", repr(time.time()), self.ttl)
+            self._count("changes")
+        except Exception:
+            self._count("errors")
+
+    def invalidate_org(self, organization_id: int | None) -> None:
+        """Drop an organization's cached results now"""
+        if not RESULT_CACHE_ENABLED:
+            return
+        try:
+            self.backend.incr(f"gen:org:{organization_id}")
+            self._count("invalidations")
+        except Exception:
+            self._count("errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "enabled": RESULT_CACHE_ENABLED,
+            "backend": self.backend.name,
+            "ttl_seconds": self.ttl,
+            "invalidate_seconds": self.invalidate_seconds,
+            "entries": self.backend.size(),
+            "hit_ratio": round(stats["hits"] / lookups, 3) if lookups else None,
+            **stats
+        }
+
+
+def build_backend(kind: str = RESULT_CACHE_BACKEND):
+    if kind == "redis":
+        return RedisCacheBackend()
+    return MemoryCacheBackend()
+
+
+result_cache = ResultCache(build_backend())
@@ -1,18 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi import BackgroundTasks, Query
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case
-import os
-import re
-from pathlib import Path
-import tempfile
-import zipfile
-from datetime import datetime
+from datetime import datetime, date
+import base64
+import json
 
 from database import get_db
-from models import User, UserRole, EmailTemplate, Module, ModuleWhitelist, Subject, BehaviorData
+from models import User, UserRole, EmailTemplate, Module, ModuleWhitelist, Subject, TelemetrySession, Organization, SessionFeature
 from routers.auth_router import get_current_user
+from telemetry_paths import sanitize_segment, get_session_file_path
+from telemetry_dictionaries import (
+    module_has_dictionaries,
+    iter_standard_zstd,
+    train_module_dictionary,
+    list_module_dictionaries
+)
+from telemetry_export import stream_module_sessions_zip, iter_ndjson, iter_chunked
+from telemetry_replay import iter_replay_records, downsample_records, pace_records
+from telemetry_compaction import list_columnar_partitions, get_partition_file, run_compaction
+from telemetry_query import run_telemetry_query, TelemetryQueryError
+from telemetry_features import run_feature_extraction, serialize_session_feature
+from telemetry_manifest import lookup_sessions, read_session_events
+from result_cache import result_cache
+from telemetry_storage import invalidate_module_organizations
+from telemetry_hints import build_org_settings, invalidate_org_telemetry_settings
 from schemas import (
     EmailTemplateResponse,
     EmailTemplateUpdate,
@@ -21,25 +34,13 @@ from schemas import (
     ModuleResponse,
     SubjectCreate,
     SubjectUpdate,
-    SubjectResponse
+    SubjectResponse,
+    TelemetryQuery,
+    TelemetrySettingsUpdate
 )
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
-TELEMETRY_DATA_DIR = os.getenv("TELEMETRY_DATA_DIR", "/mnt/data/pingdata/telemetry")
-
-
-def sanitize_segment(value: str) -> str:
-    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", value or "").strip("_")
-    return safe or "unknown"
-
-
-def get_session_file_path(module_id: str, session_id: str) -> Path:
-    safe_module = sanitize_segment(module_id)
-    safe_session = sanitize_segment(session_id)
-    return Path(TELEMETRY_DATA_DIR) / safe_module / f"{safe_session}.jsonl.zst"
-
-
 def parse_date(value: str | None, end_of_day: bool = False) -> datetime | None:
     if not value:
         return None
@@ -49,6 +50,28 @@ def parse_date(value: str | None, end_of_day: bool = False) -> datetime | None:
     return dt
 
 
+def encode_session_cursor(row: TelemetrySession) -> str:
+    key = json.dumps([row.last_event_at.isoformat(), row.session_id])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_session_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        last_event_at, session_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(last_event_at), str(session_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def estimate_row_count(db: Session, query) -> int:
+    """Planner row estimate on PostgreSQL, so the total costs no scan; exact count elsewhere"""
+    if db.bind.dialect.name != "postgresql":
+        return query.count()
+    compiled = query.statement.compile(dialect=db.bind.dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 def resolve_subject(db: Session, subject_id: int | None, subject_key: str | None):
     if subject_id is not None:
         subject = db.query(Subject).filter(Subject.id == subject_id).first()
@@ -69,7 +92,7 @@ def require_admin(current_user: User):
 
 
 @router.get("/subjects", response_model=list[SubjectResponse])
-async def list_subjects(
+def list_subjects(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -78,7 +101,7 @@ async def list_subjects(
 
 
 @router.post("/subjects", response_model=SubjectResponse)
-async def create_subject(
+def create_subject(
     payload: SubjectCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -100,7 +123,7 @@ async def create_subject(
 
 
 @router.put("/subjects/{subject_id}", response_model=SubjectResponse)
-async def update_subject(
+def update_subject(
     subject_id: int,
     payload: SubjectUpdate,
     current_user: User = Depends(get_current_user),
@@ -121,64 +144,101 @@ async def update_subject(
     return subject
 
 
+def session_file_size(module_id: str, session_id: str, manifest_entry: dict | None) -> int | None:
+    """
+    Size of a session file, or None if it does not exist
+    Taken from the manifest when it indexes the session; otherwise the file is stat'ed,
+    as for modules without a manifest or sessions not indexed yet
+    """
+    if manifest_entry is not None:
+        return manifest_entry["byte_size"]
+    try:
+        return get_session_file_path(module_id, session_id).stat().st_size
+    except FileNotFoundError:
+        return None
+
+
 @router.get("/telemetry/sessions")
-async def list_telemetry_sessions(
+def list_telemetry_sessions(
     module_id: str | None = Query(default=None),
     start_date: str | None = Query(default=None),
     end_date: str | None = Query(default=None),
     limit: int = Query(default=50, ge=1, le=500),
-    offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(default=None),
+    include_total: bool = Query(default=False),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """
+    Newest sessions first, paged by (last_event_at, session_id) keyset so every page
+    is an index range scan; pass next_cursor back to get the following page
+    """
     require_admin(current_user)
 
     start_dt = parse_date(start_date)
     end_dt = parse_date(end_date, end_of_day=True)
 
-    query = db.query(
-        BehaviorData.module_id,
-        BehaviorData.session_id,
-        func.count(BehaviorData.id).label("event_count"),
-        func.min(BehaviorData.timestamp).label("started_at"),
-        func.max(BehaviorData.timestamp).label("ended_at"),
-        func.sum(case((BehaviorData.event_type == 'text_input', 1), else_=0)).label("text_input_count")
+    query = db.query(TelemetrySession).filter(
+        TelemetrySession.event_count > 0,
+        TelemetrySession.last_event_at.is_not(None)
     )
 
     if module_id:
-        query = query.filter(BehaviorData.module_id == module_id)
+        query = query.filter(TelemetrySession.module_id == module_id)
     if start_dt:
-        query = query.filter(BehaviorData.timestamp >= start_dt)
+        query = query.filter(TelemetrySession.last_event_at >= start_dt)
     if end_dt:
-        query = query.filter(BehaviorData.timestamp <= end_dt)
+        query = query.filter(TelemetrySession.first_event_at <= end_dt)
+
+    total = estimate_row_count(db, query) if include_total else None
+
+    if cursor:
+        last_event_at, last_session_id = decode_session_cursor(cursor)
+        query = query.filter(
+            tuple_(TelemetrySession.last_event_at, TelemetrySession.session_id) < (last_event_at, last_session_id)
+        )
 
-    query = query.group_by(BehaviorData.module_id, BehaviorData.session_id)
-    total = query.count()
-    rows = query.order_by(func.max(BehaviorData.timestamp).desc()).offset(offset).limit(limit).all()
+    rows = query.order_by(
+        TelemetrySession.last_event_at.desc(),
+        TelemetrySession.session_id.desc()
+    ).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # One manifest query per module instead of a stat per session file
+    session_ids_by_module: dict[str, list[str]] = {}
+    for row in rows:
+        session_ids_by_module.setdefault(row.module_id, []).append(row.session_id)
+    manifests = {
+        module: lookup_sessions(module, session_ids)
+        for module, session_ids in session_ids_by_module.items()
+    }
 
     sessions = []
     for row in rows:
-        file_path = get_session_file_path(row.module_id, row.session_id)
+        file_size = session_file_size(row.module_id, row.session_id, manifests[row.module_id].get(row.session_id))
         sessions.append({
             "module_id": row.module_id,
             "session_id": row.session_id,
             "event_count": int(row.event_count or 0),
-            "text_input_count": int(row.text_input_count or 0),
-            "started_at": row.started_at.isoformat() if row.started_at else None,
-            "ended_at": row.ended_at.isoformat() if row.ended_at else None,
-            "file_exists": file_path.exists()
+            "text_input_count": int((row.event_type_counts or {}).get("text_input", 0)),
+            "started_at": row.first_event_at.isoformat() if row.first_event_at else None,
+            "ended_at": row.last_event_at.isoformat() if row.last_event_at else None,
+            "file_exists": file_size is not None,
+            "file_size": file_size
         })
 
     return {
         "total": total,
+        "total_is_estimate": include_total and db.bind.dialect.name == "postgresql",
         "limit": limit,
-        "offset": offset,
+        "next_cursor": encode_session_cursor(rows[-1]) if has_more else None,
         "sessions": sessions
     }
 
 
 @router.get("/telemetry/sessions/{session_id}/download")
-async def download_session_file(
+def download_session_file(
     session_id: str,
     module_id: str = Query(...),
     current_user: User = Depends(get_current_user)
@@ -188,49 +248,236 @@ async def download_session_file(
     if not file_path.exists():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Telemetry file not found")
     filename = f"{sanitize_segment(module_id)}-{sanitize_segment(session_id)}.jsonl.zst"
+    if module_has_dictionaries(module_id):
+        # Frames may reference a trained dictionary; re-encode as plain zstd for the client
+        return StreamingResponse(
+            iter_standard_zstd(file_path),
+            media_type="application/zstd",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
     return FileResponse(path=str(file_path), filename=filename, media_type="application/zstd")
 
 
+@router.get("/telemetry/sessions/{session_id}/events")
+def read_session_window(
+    session_id: str,
+    module_id: str = Query(...),
+    start_ms: int | None = Query(default=None, description="Client timestamp (ms) lower bound"),
+    end_ms: int | None = Query(default=None, description="Client timestamp (ms) upper bound"),
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=1000, ge=1, le=10000),
+    current_user: User = Depends(get_current_user)
+):
+    require_admin(current_user)
+    try:
+        return read_session_events(module_id, session_id, start_ms, end_ms, offset, limit)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Telemetry file not found")
+
+
+@router.get("/telemetry/sessions/{session_id}/replay")
+def replay_session(
+    session_id: str,
+    module_id: str = Query(...),
+    start_ms: int | None = Query(default=None, description="Client timestamp (ms) lower bound"),
+    end_ms: int | None = Query(default=None, description="Client timestamp (ms) upper bound"),
+    downsample_hz: float | None = Query(default=None, gt=0, le=1000, description="Max pointer_move/touch_move rate"),
+    paced: bool = Query(default=False, description="Space events by their recorded timing"),
+    speed: float = Query(default=1.0, gt=0, le=64),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream a session's events as NDJSON, all at once or paced like the original session"""
+    require_admin(current_user)
+    if not get_session_file_path(module_id, session_id).exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Telemetry file not found")
+
+    records = iter_replay_records(module_id, session_id, start_ms, end_ms)
+    if downsample_hz:
+        records = downsample_records(records, downsample_hz)
+    if paced:
+        body = pace_records(records, speed)
+    else:
+        body = iter_chunked(iter_ndjson(records))
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
 @router.get("/telemetry/exports")
-async def download_all_sessions(
-    background_tasks: BackgroundTasks,
+def download_all_sessions(
     module_id: str = Query(...),
     start_date: str | None = Query(default=None),
     end_date: str | None = Query(default=None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     require_admin(current_user)
 
     start_dt = parse_date(start_date)
     end_dt = parse_date(end_date, end_of_day=True)
 
-    query = db.query(BehaviorData.session_id).filter(BehaviorData.module_id == module_id)
-    if start_dt:
-        query = query.filter(BehaviorData.timestamp >= start_dt)
-    if end_dt:
-        query = query.filter(BehaviorData.timestamp <= end_dt)
+    filename = f"{sanitize_segment(module_id)}-telemetry.zip"
+    return StreamingResponse(
+        stream_module_sessions_zip(module_id, start_dt, end_dt),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
-    session_ids = [row[0] for row in query.distinct().all()]
 
-    temp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    temp.close()
-    zip_path = Path(temp.name)
+@router.get("/telemetry/dictionaries/{module_id}")
+def get_telemetry_dictionaries(
+    module_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    require_admin(current_user)
+    return list_module_dictionaries(module_id)
 
-    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for sess_id in session_ids:
-            file_path = get_session_file_path(module_id, sess_id)
-            if file_path.exists():
-                arcname = f"{sanitize_segment(module_id)}/{file_path.name}"
-                zf.write(file_path, arcname=arcname)
 
-    background_tasks.add_task(zip_path.unlink, missing_ok=True)
-    filename = f"{sanitize_segment(module_id)}-telemetry.zip"
-    return FileResponse(path=str(zip_path), filename=filename, media_type="application/zip")
+@router.post("/telemetry/dictionaries/{module_id}/train", status_code=status.HTTP_202_ACCEPTED)
+def train_telemetry_dictionary(
+    module_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
+):
+    require_admin(current_user)
+    background_tasks.add_task(train_module_dictionary, module_id)
+    return {"module_id": module_id, "status": "training"}
+
+
+@router.get("/telemetry/columnar/{module_id}")
+def get_columnar_partitions(
+    module_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    require_admin(current_user)
+    return list_columnar_partitions(module_id)
+
+
+@router.get("/telemetry/columnar/{module_id}/{day}/download")
+def download_columnar_partition(
+    module_id: str,
+    day: str,
+    current_user: User = Depends(get_current_user)
+):
+    require_admin(current_user)
+    try:
+        day = date.fromisoformat(day).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="day must be YYYY-MM-DD")
+    path = get_partition_file(module_id, day)
+    if not path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Partition not found")
+    filename = f"{sanitize_segment(module_id)}-{day}.parquet"
+    return FileResponse(path=str(path), filename=filename, media_type="application/vnd.apache.parquet")
+
+
+@router.post("/telemetry/query")
+def query_telemetry(
+    payload: TelemetryQuery,
+    current_user: User = Depends(get_current_user)
+):
+    require_admin(current_user)
+    try:
+        return run_telemetry_query(payload.model_dump())
+    except TelemetryQueryError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+
+@router.post("/telemetry/columnar/compact", status_code=status.HTTP_202_ACCEPTED)
+def compact_telemetry(
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
+):
+    require_admin(current_user)
+    background_tasks.add_task(run_compaction)
+    return {"status": "compacting"}
+
+
+@router.post("/telemetry/features/run", status_code=status.HTTP_202_ACCEPTED)
+def extract_telemetry_features(
+    background_tasks: BackgroundTasks,
+    module_id: str | None = Query(default=None),
+    current_user: User = Depends(get_current_user)
+):
+    require_admin(current_user)
+    background_tasks.add_task(run_feature_extraction, module_id)
+    return {"module_id": module_id, "status": "extracting"}
+
+
+@router.get("/cache/stats")
+def get_result_cache_stats(current_user: User = Depends(get_current_user)):
+    require_admin(current_user)
+    return result_cache.stats()
+
+
+@router.get("/telemetry/features/{module_id}")
+def list_session_features(
+    module_id: str,
+    limit: int = Query(default=100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    require_admin(current_user)
+    rows = db.query(SessionFeature).filter(
+        SessionFeature.module_id == module_id
+    ).order_by(SessionFeature.computed_at.desc()).limit(limit).all()
+    return {"module_id": module_id, "sessions": [serialize_session_feature(row) for row in rows]}
+
+
+@router.get("/telemetry/sessions/{session_id}/features")
+def get_session_features(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    require_admin(current_user)
+    row = db.query(SessionFeature).filter(SessionFeature.session_id == session_id).first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Features not computed for this session")
+    return serialize_session_feature(row)
+
+
+def get_managed_organization(db: Session, current_user: User, organization_id: int) -> Organization:
+    require_admin(current_user)
+    if current_user.role != UserRole.PLATFORM_ADMIN and current_user.organization_id != organization_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    org = db.query(Organization).filter(Organization.id == organization_id).first()
+    if not org:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Organization not found")
+    return org
+
+
+@router.get("/telemetry/settings/{organization_id}")
+def get_telemetry_settings(
+    organization_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    org = get_managed_organization(db, current_user, organization_id)
+    return {
+        "organization_id": org.id,
+        "overrides": org.telemetry_settings or {},
+        "effective": build_org_settings(db, org.id)
+    }
+
+
+@router.put("/telemetry/settings/{organization_id}")
+def update_telemetry_settings(
+    organization_id: int,
+    overrides: TelemetrySettingsUpdate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    org = get_managed_organization(db, current_user, organization_id)
+    org.telemetry_settings = overrides.model_dump(exclude_none=True)
+    db.commit()
+    invalidate_org_telemetry_settings(org.id)
+    return {
+        "organization_id": org.id,
+        "overrides": org.telemetry_settings,
+        "effective": build_org_settings(db, org.id)
+    }
 
 
 @router.get("/email-templates", response_model=list[EmailTemplateResponse])
-async def list_email_templates(
+def list_email_templates(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -240,7 +487,7 @@ async def list_email_templates(
 
 
 @router.put("/email-templates/{template_key}", response_model=EmailTemplateResponse)
-async def update_email_template(
+def update_email_template(
     template_key: str,
     payload: EmailTemplateUpdate,
     current_user: User = Depends(get_current_user),
@@ -266,7 +513,7 @@ async def update_email_template(
 
 
 @router.get("/modules", response_model=list[ModuleResponse])
-async def list_modules(
+def list_modules(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -275,7 +522,7 @@ async def list_modules(
 
 
 @router.post("/modules", response_model=ModuleResponse)
-async def create_module(
+def create_module(
     payload: ModuleCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -313,11 +560,12 @@ async def create_module(
                 is_enabled=True
             ))
             db.commit()
+            invalidate_module_organizations(module.module_id)
     return module
 
 
 @router.put("/modules/{module_id}", response_model=ModuleResponse)
-async def update_module(
+def update_module(
     module_id: str,
     payload: ModuleUpdate,
     current_user: User = Depends(get_current_user),
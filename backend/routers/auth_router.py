@@ -18,6 +18,7 @@ from auth import (
     create_access_token, verify_token
 )
 from email_service import send_email, render_template
+from result_cache import result_cache
 
 from sqlalchemy import or_
 
@@ -27,7 +28,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 # Dependency to get current user
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
@@ -58,7 +59,7 @@ async def get_current_user(
     return user
 
 
-async def get_optional_user(
+def get_optional_user(
     token: str | None = Depends(oauth2_scheme_optional),
     db: Session = Depends(get_db)
 ):
@@ -79,7 +80,7 @@ async def get_optional_user(
 
 # User Registration
 @router.post("/register", response_model=UserResponse)
-async def register_user(
+def register_user(
     user_data: UserCreate,
     request: Request,
     db: Session = Depends(get_db)
@@ -180,6 +181,8 @@ async def register_user(
 
     db.commit()
     db.refresh(new_user)
+    if invite.role == InviteRole.STUDENT and class_obj:
+        result_cache.invalidate_org(class_obj.organization_id)
 
     template = db.query(EmailTemplate).filter(
         EmailTemplate.key == "welcome_user",
@@ -197,7 +200,7 @@ async def register_user(
 
 # User Login
 @router.post("/login", response_model=Token)
-async def login(
+def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -234,7 +237,7 @@ async def login(
 
 # Alternative login endpoint for JSON
 @router.post("/login-json", response_model=Token)
-async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
+def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
     """Login with JSON body (email and password)"""
     
     user = db.query(User).filter(User.email == user_data.email).first()
@@ -264,13 +267,13 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
 
 # Get current user info
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+def get_me(current_user: User = Depends(get_current_user)):
     """Get current logged in user information"""
     return current_user
 
 
 @router.put("/me", response_model=UserResponse)
-async def update_me(
+def update_me(
     update_data: UserUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -295,7 +298,7 @@ async def update_me(
 
 
 @router.post("/password-reset")
-async def reset_password(
+def reset_password(
     payload: PasswordResetRequest,
     db: Session = Depends(get_db)
 ):
@@ -329,7 +332,7 @@ async def reset_password(
 
 
 @router.put("/password")
-async def update_password(
+def update_password(
     payload: PasswordUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -345,7 +348,7 @@ async def update_password(
 
 
 @router.delete("/me")
-async def deactivate_account(
+def deactivate_account(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -357,7 +360,7 @@ async def deactivate_account(
 
 # Guest Session Creation
 @router.post("/guest", response_model=GuestSessionResponse)
-async def create_guest_session(
+def create_guest_session(
     guest_data: GuestSessionCreate,
     db: Session = Depends(get_db)
 ):
@@ -397,7 +400,7 @@ async def create_guest_session(
 
 # Submit Consent
 @router.post("/consent", response_model=ConsentResponse)
-async def submit_consent(
+def submit_consent(
     consent_data: ConsentCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -429,7 +432,7 @@ async def submit_consent(
 
 # Check if user has valid consent
 @router.get("/consent/check")
-async def check_consent(
+def check_consent(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
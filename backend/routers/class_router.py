@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func, and_
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -6,12 +7,14 @@ import random
 import string
 
 from database import get_db
-from models import User, Class, Module, ModuleWhitelist, BehaviorData, UserRole, ClassStudent
+from models import User, Class, Module, ModuleWhitelist, UserRole, ClassStudent, SessionFeature, ActivityRollup
 from schemas import (
     ClassCreate, ClassUpdate, ClassResponse, ClassWithStats,
     JoinCodeValidate, JoinClassRequest, StudentProgress
 )
 from routers.auth_router import get_current_user
+from telemetry_features import serialize_session_feature
+from result_cache import result_cache
 
 router = APIRouter(prefix="/api/classes", tags=["classes"])
 
@@ -39,8 +42,62 @@ def get_class_module_ids(db: Session, class_obj: Class) -> List[str]:
     ).all()
     return [module_id for (module_id,) in module_ids]
 
+def roster_activity(db: Session, class_id: int, module_ids: List[str]):
+    """
+    One row per rostered student with their session/event totals in the class's modules
+    Driven by class_students, so each member costs one index lookup into activity_rollups
+    """
+    return db.query(
+        User.id,
+        User.full_name,
+        User.username,
+        User.email,
+        func.coalesce(func.sum(ActivityRollup.session_count), 0),
+        func.coalesce(func.sum(ActivityRollup.event_count), 0),
+        func.max(ActivityRollup.last_active_at)
+    ).select_from(ClassStudent).join(
+        User, User.id == ClassStudent.user_id
+    ).outerjoin(
+        ActivityRollup, and_(
+            ActivityRollup.user_id == ClassStudent.user_id,
+            ActivityRollup.module_id.in_(module_ids)
+        )
+    ).filter(
+        ClassStudent.class_id == class_id
+    ).group_by(User.id, User.full_name, User.username, User.email).order_by(User.id)
+
+def calculate_class_stats(db: Session, class_obj: Class) -> dict:
+    """
+    Roster statistics for the class detail view; guests cannot join a roster
+    """
+    module_ids = get_class_module_ids(db, class_obj)
+    roster = roster_activity(db, class_obj.id, module_ids).all()
+    return {
+        "student_count": len(roster),
+        "guest_count": 0,
+        "total_sessions": sum(row[4] for row in roster),
+        "module_count": len(module_ids)
+    }
+
+def calculate_class_students(db: Session, class_obj: Class) -> list[dict]:
+    module_ids = get_class_module_ids(db, class_obj)
+    return [
+        {
+            "user_id": user_id,
+            "guest_id": None,
+            "name": full_name or username,
+            "email": email,
+            "total_sessions": total_sessions,
+            "total_events": total_events,
+            "last_active": last_active
+        }
+        for user_id, full_name, username, email, total_sessions, total_events, last_active
+        in roster_activity(db, class_obj.id, module_ids)
+    ]
+
+
 @router.post("/", response_model=ClassResponse)
-async def create_class(
+def create_class(
     class_data: ClassCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -75,7 +132,7 @@ async def create_class(
     return new_class
 
 @router.get("/", response_model=List[ClassResponse])
-async def get_my_classes(
+def get_my_classes(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -93,7 +150,7 @@ async def get_my_classes(
     return classes
 
 @router.get("/{class_id}", response_model=ClassWithStats)
-async def get_class_details(
+def get_class_details(
     class_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -122,40 +179,19 @@ async def get_class_details(
                 detail="You don't have access to this class"
             )
     
-    # Calculate statistics
-    # Count unique students (both registered and guests)
-    module_ids = get_class_module_ids(db, class_obj)
-    if module_ids:
-        student_count = db.query(BehaviorData.user_id).filter(
-            BehaviorData.module_id.in_(module_ids)
-        ).distinct().count()
-
-        guest_count = db.query(BehaviorData.guest_session_id).filter(
-            BehaviorData.guest_session_id.isnot(None),
-            BehaviorData.module_id.in_(module_ids)
-        ).distinct().count()
-
-        total_sessions = db.query(BehaviorData.session_id).filter(
-            BehaviorData.module_id.in_(module_ids)
-        ).distinct().count()
-    else:
-        student_count = 0
-        guest_count = 0
-        total_sessions = 0
+    # Statistics are cached per class; ingest for the class's organization invalidates them
+    stats = result_cache.get_or_compute(
+        "class-details", class_obj.organization_id, class_obj.id,
+        lambda: calculate_class_stats(db, class_obj)
+    )
     
     # Build response with stats
-    response = ClassWithStats(
-        **class_obj.__dict__,
-        student_count=student_count,
-        guest_count=guest_count,
-        total_sessions=total_sessions,
-        module_count=len(module_ids)
-    )
+    response = ClassWithStats(**class_obj.__dict__, **stats)
     
     return response
 
 @router.put("/{class_id}", response_model=ClassResponse)
-async def update_class(
+def update_class(
     class_id: int,
     class_data: ClassUpdate,
     current_user: User = Depends(get_current_user),
@@ -196,7 +232,7 @@ async def update_class(
     return class_obj
 
 @router.post("/{class_id}/regenerate-code", response_model=ClassResponse)
-async def regenerate_join_code(
+def regenerate_join_code(
     class_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -237,7 +273,7 @@ async def regenerate_join_code(
     return class_obj
 
 @router.post("/validate-code")
-async def validate_join_code(
+def validate_join_code(
     code_data: JoinCodeValidate,
     db: Session = Depends(get_db)
 ):
@@ -271,7 +307,7 @@ async def validate_join_code(
 
 
 @router.post("/join", response_model=ClassResponse)
-async def join_class(
+def join_class(
     join_data: JoinClassRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -305,11 +341,13 @@ async def join_class(
         ))
         db.commit()
         db.refresh(class_obj)
+        # The roster changed, so the cached class statistics are stale now
+        result_cache.invalidate_org(class_obj.organization_id)
 
     return class_obj
 
 @router.get("/{class_id}/students", response_model=List[StudentProgress])
-async def get_class_students(
+def get_class_students(
     class_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -338,85 +376,69 @@ async def get_class_students(
                 detail="You don't have access to this class"
             )
     
-    students_data = []
-    
-    # Get registered students who participated
+    return result_cache.get_or_compute(
+        "class-students", class_obj.organization_id, class_obj.id,
+        lambda: calculate_class_students(db, class_obj)
+    )
+
+@router.get("/{class_id}/features")
+def get_class_session_features(
+    class_id: int,
+    user_id: Optional[int] = Query(default=None),
+    limit: int = Query(default=200, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Derived per-session metrics (typing rhythm, focus, pointer movement, idle time)
+    of the class's rostered students in the class's modules, newest first
+    """
+    verify_teacher_access(current_user)
+
+    class_obj = db.query(Class).filter(Class.id == class_id).first()
+
+    if not class_obj:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Class not found"
+        )
+
+    if class_obj.teacher_id != current_user.id:
+        if current_user.role == UserRole.PLATFORM_ADMIN:
+            pass
+        elif current_user.role != UserRole.ORG_ADMIN or class_obj.organization_id != current_user.organization_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have access to this class"
+            )
+
+    if user_id is not None and not db.query(ClassStudent.id).filter(
+        ClassStudent.class_id == class_id,
+        ClassStudent.user_id == user_id
+    ).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student not found in this class"
+        )
+
     module_ids = get_class_module_ids(db, class_obj)
     if not module_ids:
         return []
 
-    registered_students = db.query(User).join(
-        BehaviorData, User.id == BehaviorData.user_id
+    # Only rostered students' sessions, like the class statistics
+    query = db.query(SessionFeature).join(
+        ClassStudent, ClassStudent.user_id == SessionFeature.user_id
     ).filter(
-        BehaviorData.module_id.in_(module_ids)
-    ).distinct().all()
-    
-    for student in registered_students:
-        # Get student's sessions
-        sessions = db.query(BehaviorData.session_id).filter(
-            BehaviorData.user_id == student.id,
-            BehaviorData.module_id.in_(module_ids)
-        ).distinct().all()
-        
-        # Get total events
-        total_events = db.query(BehaviorData).filter(
-            BehaviorData.user_id == student.id,
-            BehaviorData.module_id.in_(module_ids)
-        ).count()
-        
-        # Get last active time
-        last_active = db.query(BehaviorData.timestamp).filter(
-            BehaviorData.user_id == student.id
-        ).order_by(BehaviorData.timestamp.desc()).first()
-        
-        students_data.append({
-            "user_id": student.id,
-            "guest_id": None,
-            "name": student.full_name or student.username,
-            "email": student.email,
-            "total_sessions": len(sessions),
-            "total_events": total_events,
-            "last_active": last_active[0] if last_active else None
-        })
-    
-    # Get guest students
-    guest_sessions = db.query(BehaviorData.guest_session_id).filter(
-        BehaviorData.guest_session_id.isnot(None),
-        BehaviorData.module_id.in_(module_ids)
-    ).distinct().all()
-    
-    for (guest_id,) in guest_sessions:
-        # Get guest's sessions
-        sessions = db.query(BehaviorData.session_id).filter(
-            BehaviorData.guest_session_id == guest_id,
-            BehaviorData.module_id.in_(module_ids)
-        ).distinct().all()
-        
-        # Get total events
-        total_events = db.query(BehaviorData).filter(
-            BehaviorData.guest_session_id == guest_id,
-            BehaviorData.module_id.in_(module_ids)
-        ).count()
-        
-        # Get last active time
-        last_active = db.query(BehaviorData.timestamp).filter(
-            BehaviorData.guest_session_id == guest_id
-        ).order_by(BehaviorData.timestamp.desc()).first()
-        
-        students_data.append({
-            "user_id": None,
-            "guest_id": guest_id,
-            "name": f"Guest-{guest_id[:8]}",
-            "email": None,
-            "total_sessions": len(sessions),
-            "total_events": total_events,
-            "last_active": last_active[0] if last_active else None
-        })
-    
-    return students_data
+        ClassStudent.class_id == class_id,
+        SessionFeature.module_id.in_(module_ids)
+    )
+    if user_id is not None:
+        query = query.filter(SessionFeature.user_id == user_id)
+    rows = query.order_by(SessionFeature.computed_at.desc()).limit(limit).all()
+    return [serialize_session_feature(row) for row in rows]
 
 @router.delete("/{class_id}")
-async def delete_class(
+def delete_class(
     class_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -91,7 +91,7 @@ def get_sparc_metrics(db: Session):
 
 
 @router.get("/overview", response_model=DashboardOverview)
-async def get_dashboard_overview(
+def get_dashboard_overview(
     range_days: int = 14,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_read_db)
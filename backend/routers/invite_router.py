@@ -1,17 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import datetime
+import os
+import io
+import csv
 import random
 import string
 
 from database import get_db
 from models import InviteCode, InviteRole, User, UserRole, Class, EmailTemplate
-from schemas import InviteCreate, InviteResponse
+from schemas import InviteCreate, InviteResponse, InviteBulkCreate
 from email_service import send_email, render_template
 from routers.auth_router import get_current_user
 
 router = APIRouter(prefix="/api/invites", tags=["invites"])
 
+INVITE_BULK_MAX_CODES = int(os.getenv("INVITE_BULK_MAX_CODES", "10000"))
+INVITE_BULK_INSERT_ATTEMPTS = 3
+INVITE_CSV_COLUMNS = ["code", "role", "class_id", "class_name", "max_uses", "expires_at"]
+
 
 def generate_invite_code(prefix: str) -> str:
     part1 = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
@@ -19,6 +29,39 @@ def generate_invite_code(prefix: str) -> str:
     return f"{prefix}-{part1}-{part2}"
 
 
+def generate_unique_codes(db: Session, prefix: str, count: int) -> list[str]:
+    """
+    Generate count invite codes that are not in use yet
+    Each round checks every candidate in one IN query and only regenerates the collisions
+    """
+    codes = set()
+    while len(codes) < count:
+        candidates = {generate_invite_code(prefix) for _ in range(count - len(codes))} - codes
+        taken = set(db.scalars(select(InviteCode.code).where(InviteCode.code.in_(candidates))))
+        codes |= candidates - taken
+    return list(codes)
+
+
+def iter_invite_csv(rows: list[dict], class_names: dict[int, str]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(INVITE_CSV_COLUMNS)
+    for index, row in enumerate(rows, start=1):
+        writer.writerow([
+            row["code"],
+            row["role"].value,
+            row["class_id"] or "",
+            class_names.get(row["class_id"], ""),
+            row["max_uses"] or "",
+            row["expires_at"].isoformat() if row["expires_at"] else ""
+        ])
+        if index % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
 def build_invite_email(invite: InviteCode, role_label: str) -> tuple[str, str]:
     subject = f"Your {role_label} invite code"
     body = (
@@ -54,7 +97,7 @@ def verify_teacher_access(current_user: User):
 
 
 @router.post("/teachers", response_model=InviteResponse)
-async def create_teacher_invite(
+def create_teacher_invite(
     invite_data: InviteCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -97,7 +140,7 @@ async def create_teacher_invite(
 
 
 @router.post("/students", response_model=InviteResponse)
-async def create_student_invite(
+def create_student_invite(
     invite_data: InviteCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -160,8 +203,104 @@ async def create_student_invite(
     return invite
 
 
+@router.post("/bulk")
+def create_bulk_invites(
+    invite_data: InviteBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate many invite codes in one request and return them as a CSV download
+    """
+    if invite_data.role == InviteRole.TEACHER:
+        verify_admin_access(current_user)
+    else:
+        verify_teacher_access(current_user)
+
+    if invite_data.count < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="count must be at least 1"
+        )
+
+    classes = {}
+    if invite_data.role == InviteRole.STUDENT:
+        class_ids = set(invite_data.class_ids)
+        if not class_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="class_ids is required for student invites"
+            )
+        classes = {
+            class_obj.id: class_obj
+            for class_obj in db.query(Class).filter(Class.id.in_(class_ids), Class.is_active == True)
+        }
+        missing = sorted(class_ids - classes.keys())
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Class not found: {', '.join(str(class_id) for class_id in missing)}"
+            )
+        for class_obj in classes.values():
+            if class_obj.teacher_id != current_user.id:
+                if current_user.role != UserRole.ORG_ADMIN or class_obj.organization_id != current_user.organization_id:
+                    raise HTTPException(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        detail=f"You don't have access to class {class_obj.id}"
+                    )
+        targets = [(class_obj.id, class_obj.organization_id) for class_obj in classes.values()]
+    else:
+        targets = [(None, current_user.organization_id)]
+    # Read before the commit expires the instances; the CSV is streamed after the session closes
+    class_names = {class_obj.id: class_obj.name for class_obj in classes.values()}
+
+    total = invite_data.count * len(targets)
+    if total > INVITE_BULK_MAX_CODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {INVITE_BULK_MAX_CODES} invite codes can be generated per request"
+        )
+
+    prefix = "TCH" if invite_data.role == InviteRole.TEACHER else "STD"
+    for attempt in range(INVITE_BULK_INSERT_ATTEMPTS):
+        codes = iter(generate_unique_codes(db, prefix, total))
+        rows = [
+            {
+                "code": next(codes),
+                "role": invite_data.role,
+                "created_by": current_user.id,
+                "organization_id": organization_id,
+                "class_id": class_id,
+                "max_uses": invite_data.max_uses,
+                "expires_at": invite_data.expires_at,
+                "notes": invite_data.notes
+            }
+            for class_id, organization_id in targets
+            for _ in range(invite_data.count)
+        ]
+        try:
+            db.execute(insert(InviteCode), rows)
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent request took one of the codes between the check and the insert
+            db.rollback()
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Could not allocate unique invite codes, please retry"
+        )
+
+    filename = f"{invite_data.role.value}-invites-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
+    return StreamingResponse(
+        iter_invite_csv(rows, class_names),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/mine", response_model=list[InviteResponse])
-async def get_my_invites(
+def get_my_invites(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -178,7 +317,7 @@ async def get_my_invites(
 
 
 @router.post("/{invite_id}/toggle", response_model=InviteResponse)
-async def toggle_invite(
+def toggle_invite(
     invite_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -20,6 +20,7 @@ from models import (
     SparcGameSession,
 )
 from auth import verify_password, get_password_hash, create_access_token, verify_token
+from result_cache import result_cache
 
 router = APIRouter(prefix="/api/sparc", tags=["sparc"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/sparc/auth/login")
@@ -264,6 +265,8 @@ def sparc_register(payload: SparcRegisterIn, request: Request, db: Session = Dep
 
     db.commit()
     db.refresh(new_user)
+    if invite.role == InviteRole.STUDENT and class_obj:
+        result_cache.invalidate_org(class_obj.organization_id)
 
     token = create_access_token(
         data={"sub": new_user.email, "user_id": new_user.id, "role": new_user.role.value}
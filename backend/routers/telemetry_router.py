@@ -1,35 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
-import os
-import re
-from pathlib import Path
-import json
 import uuid
 import hashlib
-import zstandard as zstd
 
 from database import get_db
-from models import User, BehaviorData, UserRole
+from models import User, UserRole, TelemetryErasureJob
 from schemas import TelemetrySessionCreate, TelemetryEventCreate, TelemetryEventBatch
 from routers.auth_router import get_current_user, get_optional_user
+from telemetry_storage import store_telemetry_batches
+from telemetry_writer import writer_pool
+from telemetry_sessions import open_telemetry_session, get_telemetry_session, end_telemetry_session_row
+from telemetry_wire import COMPACT_CONTENT_TYPES, WireFormatError, decode_compact_batch, media_type
+from telemetry_erasure import request_erasure, serialize_erasure_job
+from telemetry_export import EXPORT_FORMATS, EXPORT_COMPRESSIONS, stream_owner_export, export_filename
+from telemetry_hints import build_org_settings, build_ingest_hints, ingest_rate
+from telemetry_queue import (
+    ingest_queue,
+    queue_mode_enabled,
+    TelemetryQueueFull,
+    TELEMETRY_QUEUE_RETRY_AFTER
+)
 
 router = APIRouter(prefix="/api/telemetry", tags=["telemetry"])
 
-TELEMETRY_DATA_DIR = os.getenv("TELEMETRY_DATA_DIR", "/mnt/data/pingdata/telemetry")
-
-
-def sanitize_segment(value: str) -> str:
-    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", value or "").strip("_")
-    return safe or "unknown"
-
-
-def get_session_file_path(module_id: str, session_id: str) -> Path:
-    safe_module = sanitize_segment(module_id)
-    safe_session = sanitize_segment(session_id)
-    return Path(TELEMETRY_DATA_DIR) / safe_module / f"{safe_session}.jsonl.zst"
-
 
 def summarize_payload(event_type: str, payload: dict) -> dict:
     if event_type == "text_input":
@@ -44,26 +43,6 @@ def summarize_payload(event_type: str, payload: dict) -> dict:
         return {k: v for k, v in summary.items() if v is not None}
     return dict(payload)
 
-
-def write_events_to_file(module_id: str, session_id: str, anonymized_id: str, events: list[dict]) -> None:
-    file_path = get_session_file_path(module_id, session_id)
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    compressor = zstd.ZstdCompressor()
-    with open(file_path, "ab") as f:
-        with compressor.stream_writer(f) as writer:
-            for event in events:
-                record = {
-                    "session_id": session_id,
-                    "module_id": module_id,
-                    "event_type": event.get("event_type"),
-                    "timestamp": event.get("timestamp"),
-                    "client_timestamp": event.get("client_timestamp"),
-                    "anon_id": anonymized_id,
-                    "payload": event.get("payload")
-                }
-                line = json.dumps(record, ensure_ascii=False) + "\n"
-                writer.write(line.encode("utf-8"))
-
 # Helper function to anonymize user data
 def anonymize_user_id(user_id: Optional[int], guest_id: Optional[str]) -> str:
     """
@@ -74,7 +53,7 @@ def anonymize_user_id(user_id: Optional[int], guest_id: Optional[str]) -> str:
     return hashlib.sha256(identifier.encode()).hexdigest()[:16]
 
 @router.post("/session/start")
-async def start_telemetry_session(
+def start_telemetry_session(
     session_data: dict = Body(default_factory=dict),
     current_user: User | None = Depends(get_optional_user),
     db: Session = Depends(get_db)
@@ -87,30 +66,21 @@ async def start_telemetry_session(
     # Generate unique session ID
     session_id = str(uuid.uuid4())
     
-    # Get organization settings (TODO: implement when org model is ready)
-    # For now, use default settings
-    org_settings = {
-        "telemetry_enabled": True,
-        "capture_keyboard": True,
-        "capture_mouse": False,
-        "capture_focus_blur": True,
-        "sampling_rate": 1.0,
-        "batch_ms": 5000,
-        "max_events_per_session": 10000
-    }
-    
     if "module_id" not in session_data:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="module_id is required")
 
-    # Create session record (optional: store in DB)
-    # For MVP, we can just return the session_id and let frontend manage it
-    
     user_id = None
     guest_id = None
     if current_user:
         user_id = current_user.id if current_user.role != UserRole.GUEST else None
         guest_id = current_user.guest_id if current_user.role == UserRole.GUEST else None
 
+    # Register the session; its counters are updated as batches are stored
+    open_telemetry_session(db, session_id, str(session_data["module_id"]), user_id, guest_id)
+
+    # Organization configuration, adjusted for current ingest load
+    org_settings = build_org_settings(db, current_user.organization_id if current_user else None)
+
     return {
         "session_id": session_id,
         "user_id": user_id,
@@ -119,20 +89,82 @@ async def start_telemetry_session(
         "started_at": datetime.utcnow().isoformat()
     }
 
-@router.post("/events")
+def event_fields(event: TelemetryEventCreate) -> dict:
+    return {
+        "module_id": event.module_id,
+        "event_type": event.event_type,
+        "payload": dict(event.payload),
+        "timestamp": event.timestamp,
+        "client_timestamp": event.client_timestamp
+    }
+
+
+def decode_event_batch(body: bytes, content_type: str | None) -> tuple[str, list[dict]]:
+    """
+    The batch's session_id and its events as the dicts ingest stores
+    """
+    content_type = media_type(content_type)
+    if content_type in COMPACT_CONTENT_TYPES:
+        try:
+            return decode_compact_batch(body, content_type)
+        except WireFormatError as exc:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    if content_type != "application/json":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Use application/json, application/msgpack or application/cbor"
+        )
+    try:
+        batch = TelemetryEventBatch.model_validate_json(body)
+    except ValidationError as exc:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in exc.errors()])
+    return batch.session_id, [event_fields(event) for event in batch.events]
+
+
+@router.post(
+    "/events",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": TelemetryEventBatch.model_json_schema()},
+                "application/msgpack": {"schema": {"type": "object"}},
+                "application/cbor": {"schema": {"type": "object"}}
+            }
+        }
+    }
+)
 async def upload_telemetry_events(
-    batch: TelemetryEventBatch,
+    request: Request,
     current_user: User | None = Depends(get_optional_user),
     db: Session = Depends(get_db)
 ):
     """
     Upload a batch of telemetry events
+    Accepts the JSON batch or the compact MessagePack/CBOR batch (see telemetry_wire)
+    """
+    # Only the body read is async; decoding and validating a batch is CPU work for the threadpool
+    body = await request.body()
+    return await run_in_threadpool(
+        decode_and_ingest_events, body, request.headers.get("content-type"), current_user, db
+    )
+
+
+def decode_and_ingest_events(body: bytes, content_type: str | None, current_user: User | None, db: Session):
+    session_id, events = decode_event_batch(body, content_type)
+    return ingest_telemetry_events(session_id, events, current_user, db)
+
+
+def ingest_telemetry_events(
+    session_id: str,
+    received_events: list[dict],
+    current_user: User | None,
+    db: Session
+):
+    """
     Events are anonymized and stored in behavior_data table
     """
     
-    # Verify session belongs to current user
-    session_id = batch.session_id
-    
     # Anonymize user identifier
     if current_user:
         anonymized_id = anonymize_user_id(
@@ -142,59 +174,60 @@ async def upload_telemetry_events(
     else:
         anonymized_id = anonymize_user_id(None, None)
     
-    # Process each event
-    saved_events = []
-    file_events_by_key = {}
-    for event in batch.events:
-        # Validate event data (K-12 compliance check)
-        if not validate_event_compliance(event):
-            continue  # Skip non-compliant events
-        
-        # Create behavior data record
-        payload_data = dict(event.payload)
-        payload_data["anon_id"] = anonymized_id
-        user_id = None
-        guest_id = None
-        if current_user:
-            user_id = current_user.id if current_user.role != UserRole.GUEST else None
-            guest_id = current_user.guest_id if current_user.role == UserRole.GUEST else None
-
-        behavior_record = BehaviorData(
-            user_id=user_id,
-            guest_session_id=guest_id,
-            module_id=event.module_id,
-            session_id=session_id,
-            event_type=event.event_type,
-            event_data=json.dumps(payload_data)
+    user_id = None
+    guest_id = None
+    organization_id = None
+    if current_user:
+        user_id = current_user.id if current_user.role != UserRole.GUEST else None
+        guest_id = current_user.guest_id if current_user.role == UserRole.GUEST else None
+        organization_id = current_user.organization_id
+
+    # Validate event data (K-12 compliance check), skipping non-compliant events
+    events = [event for event in received_events if validate_event_compliance(event)]
+    ingest_rate.record(len(events))
+    pending = {
+        "session_id": session_id,
+        "user_id": user_id,
+        "guest_id": guest_id,
+        "organization_id": organization_id,
+        "anon_id": anonymized_id,
+        "events": events
+    }
+
+    if queue_mode_enabled():
+        if events:
+            try:
+                ingest_queue.submit(pending)
+            except TelemetryQueueFull:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Telemetry ingest queue is full",
+                    headers={"Retry-After": str(TELEMETRY_QUEUE_RETRY_AFTER)}
+                )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "success": True,
+                "queued": True,
+                "events_received": len(received_events),
+                "events_accepted": len(events),
+                "session_id": session_id,
+                "hints": build_ingest_hints(db, organization_id)
+            }
         )
-        
-        db.add(behavior_record)
-        saved_events.append(behavior_record)
-        file_key = (event.module_id, session_id)
-        file_events_by_key.setdefault(file_key, []).append({
-            "event_type": event.event_type,
-            "payload": dict(event.payload),
-            "timestamp": event.timestamp,
-            "client_timestamp": event.client_timestamp
-        })
-    
-    db.commit()
 
-    for (module_id, sess_id), events in file_events_by_key.items():
-        try:
-            write_events_to_file(module_id, sess_id, anonymized_id, events)
-        except Exception:
-            pass
-    
+    saved = store_telemetry_batches(db, [pending])
+
     return {
         "success": True,
-        "events_received": len(batch.events),
-        "events_saved": len(saved_events),
-        "session_id": session_id
+        "events_received": len(received_events),
+        "events_saved": saved,
+        "session_id": session_id,
+        "hints": build_ingest_hints(db, organization_id)
     }
 
 @router.post("/session/end")
-async def end_telemetry_session(
+def end_telemetry_session(
     session_id: str,
     current_user: User | None = Depends(get_optional_user),
     db: Session = Depends(get_db)
@@ -202,21 +235,30 @@ async def end_telemetry_session(
     """
     End telemetry session and finalize data
     """
+
+    # Close the session's pooled file writers so the last frame reaches disk
+    writer_pool.close_session(session_id)
     
-    # Count events for this session
-    event_count = db.query(BehaviorData).filter(
-        BehaviorData.session_id == session_id
-    ).count()
-    
+    session_row = get_telemetry_session(db, session_id)
+    if not session_row:
+        return {
+            "success": True,
+            "session_id": session_id,
+            "total_events": 0,
+            "ended_at": datetime.utcnow().isoformat()
+        }
+
+    end_telemetry_session_row(db, session_row)
+
     return {
         "success": True,
         "session_id": session_id,
-        "total_events": event_count,
-        "ended_at": datetime.utcnow().isoformat()
+        "total_events": session_row.event_count,
+        "ended_at": session_row.ended_at.isoformat() if session_row.ended_at else datetime.utcnow().isoformat()
     }
 
 @router.get("/session/{session_id}/stats")
-async def get_session_stats(
+def get_session_stats(
     session_id: str,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -225,41 +267,31 @@ async def get_session_stats(
     Get statistics for a telemetry session
     """
     
-    # Verify user owns this session
-    events = db.query(BehaviorData).filter(
-        BehaviorData.session_id == session_id
-    ).all()
+    session_row = get_telemetry_session(db, session_id)
     
-    if not events:
+    if not session_row or not session_row.event_count:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Session not found"
         )
     
     # Check ownership
-    first_event = events[0]
     if current_user.role == UserRole.GUEST:
-        if first_event.guest_session_id != current_user.guest_id:
+        if session_row.guest_session_id != current_user.guest_id:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
     else:
-        if first_event.user_id != current_user.id:
+        if session_row.user_id != current_user.id:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
     
-    # Calculate stats
-    event_types = {}
-    for event in events:
-        event_type = event.event_type
-        event_types[event_type] = event_types.get(event_type, 0) + 1
-    
     return {
         "session_id": session_id,
-        "total_events": len(events),
-        "event_types": event_types,
-        "start_time": events[0].timestamp.isoformat() if events else None,
-        "end_time": events[-1].timestamp.isoformat() if events else None
+        "total_events": session_row.event_count,
+        "event_types": session_row.event_type_counts or {},
+        "start_time": session_row.first_event_at.isoformat() if session_row.first_event_at else None,
+        "end_time": session_row.last_event_at.isoformat() if session_row.last_event_at else None
     }
 
-def validate_event_compliance(event: TelemetryEventCreate) -> bool:
+def validate_event_compliance(event: dict) -> bool:
     """
     Validate event data for K-12 compliance
     Ensures no sensitive text data is captured
@@ -278,12 +310,12 @@ def validate_event_compliance(event: TelemetryEventCreate) -> bool:
         'telemetry_paused', 'telemetry_resumed'
     ]
     
-    if event.event_type not in allowed_types:
+    if event["event_type"] not in allowed_types:
         return False
     
     # For keyboard events, ensure we only have key codes, not text
-    if event.event_type in ['key_down', 'key_up']:
-        payload = event.payload
+    if event["event_type"] in ['key_down', 'key_up']:
+        payload = event["payload"]
         
         # CRITICAL: Reject if any of these fields are present
         forbidden_fields = ['key', 'value', 'text', 'input', 'data']
@@ -297,74 +329,62 @@ def validate_event_compliance(event: TelemetryEventCreate) -> bool:
     
     return True
 
-@router.delete("/user/data")
-async def delete_user_telemetry_data(
+@router.delete("/user/data", status_code=status.HTTP_202_ACCEPTED)
+def delete_user_telemetry_data(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Delete all telemetry data for current user
     Implements "Right to be Forgotten" (GDPR/COPPA)
+    Runs as a background job; poll /user/data/erasure/{job_id} for progress
     """
-    
-    if current_user.role == UserRole.GUEST:
-        # Delete guest data
-        deleted = db.query(BehaviorData).filter(
-            BehaviorData.guest_session_id == current_user.guest_id
-        ).delete()
-    else:
-        # Delete user data
-        deleted = db.query(BehaviorData).filter(
-            BehaviorData.user_id == current_user.id
-        ).delete()
-    
-    db.commit()
-
-    for (module_id, sess_id), events in file_events_by_key.items():
-        try:
-            write_events_to_file(module_id, sess_id, anonymized_id, events)
-        except Exception:
-            pass
-    
+    user_id = current_user.id if current_user.role != UserRole.GUEST else None
+    guest_id = current_user.guest_id if current_user.role == UserRole.GUEST else None
+    job = request_erasure(db, user_id, guest_id)
     return {
         "success": True,
-        "records_deleted": deleted
+        "job": serialize_erasure_job(job),
+        "status_url": f"/api/telemetry/user/data/erasure/{job.job_id}"
     }
 
-@router.get("/user/export")
-async def export_user_telemetry_data(
+@router.get("/user/data/erasure/{job_id}")
+def get_erasure_status(
+    job_id: str,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
+):
+    """
+    Progress of a telemetry erasure job
+    """
+    job = db.query(TelemetryErasureJob).filter(TelemetryErasureJob.job_id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Erasure job not found")
+    is_owner = (
+        job.guest_session_id == current_user.guest_id
+        if current_user.role == UserRole.GUEST
+        else job.user_id == current_user.id
+    )
+    if not is_owner and current_user.role != UserRole.PLATFORM_ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return serialize_erasure_job(job)
+
+@router.get("/user/export")
+def export_user_telemetry_data(
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    compression: Optional[str] = Query(None, pattern="^(gzip|zstd)$"),
+    current_user: User = Depends(get_current_user)
 ):
     """
     Export all telemetry data for current user
     Implements "Right to Data Portability" (GDPR)
+    Streamed as the JSON document or as NDJSON, optionally gzip/zstd compressed
     """
-    
-    if current_user.role == UserRole.GUEST:
-        events = db.query(BehaviorData).filter(
-            BehaviorData.guest_session_id == current_user.guest_id
-        ).all()
-    else:
-        events = db.query(BehaviorData).filter(
-            BehaviorData.user_id == current_user.id
-        ).all()
-    
-    # Convert to exportable format
-    export_data = []
-    for event in events:
-        export_data.append({
-            "session_id": event.session_id,
-            "module_id": event.module_id,
-            "event_type": event.event_type,
-            "event_data": event.event_data,
-            "timestamp": event.timestamp.isoformat()
-        })
-    
-    return {
-        "user_id": current_user.id if current_user.role != UserRole.GUEST else None,
-        "guest_id": current_user.guest_id if current_user.role == UserRole.GUEST else None,
-        "export_date": datetime.utcnow().isoformat(),
-        "total_events": len(export_data),
-        "events": export_data
-    }
+    user_id = current_user.id if current_user.role != UserRole.GUEST else None
+    guest_id = current_user.guest_id if current_user.role == UserRole.GUEST else None
+    filename = export_filename(format, compression)
+    return StreamingResponse(
+        stream_owner_export(user_id, guest_id, format, compression),
+        media_type=EXPORT_COMPRESSIONS[compression][0] if compression else EXPORT_FORMATS[format][0],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field, validator
+from typing import Optional, List, Dict, Annotated
 from datetime import datetime, date
-from models import UserRole
+from models import UserRole, InviteRole
 
 # User Schemas
 class UserBase(BaseModel):
@@ -158,6 +158,16 @@ class InviteCreate(BaseModel):
     notes: Optional[str] = None
 
 
+class InviteBulkCreate(BaseModel):
+    role: InviteRole = InviteRole.STUDENT
+    # Student invites: count codes for each class; teacher invites: count codes in total
+    class_ids: List[int] = []
+    count: int
+    expires_at: Optional[datetime] = None
+    max_uses: Optional[int] = None
+    notes: Optional[str] = None
+
+
 class InviteResponse(BaseModel):
     id: int
     code: str
@@ -296,6 +306,39 @@ class TelemetryEventBatch(BaseModel):
     session_id: str
     events: List[TelemetryEventCreate]
 
+SamplingRate = Annotated[float, Field(ge=0, le=1)]
+
+class TelemetrySettingsUpdate(BaseModel):
+    """Per-organization overrides of DEFAULT_TELEMETRY_SETTINGS; omitted keys keep the default"""
+    telemetry_enabled: Optional[bool] = None
+    capture_keyboard: Optional[bool] = None
+    capture_mouse: Optional[bool] = None
+    capture_focus_blur: Optional[bool] = None
+    sampling_rate: Optional[SamplingRate] = None
+    batch_ms: Optional[int] = Field(default=None, ge=250, le=300000)
+    max_events_per_session: Optional[int] = Field(default=None, ge=1, le=10000000)
+    event_sampling: Optional[Dict[str, SamplingRate]] = None
+
+    class Config:
+        extra = "forbid"
+
+class TelemetryQueryAggregation(BaseModel):
+    op: str  # count, min, max, mean, sum, count_distinct, percentile
+    column: Optional[str] = None
+    q: Optional[float] = None  # 0-1, for percentile
+
+class TelemetryQuery(BaseModel):
+    module_id: str
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    event_types: Optional[List[str]] = None
+    session_ids: Optional[List[str]] = None
+    group_by: List[str] = []
+    aggregations: List[TelemetryQueryAggregation] = [TelemetryQueryAggregation(op="count")]
+    order_by: Optional[str] = None
+    descending: bool = True
+    limit: int = 1000
+
 # Behavior Data Schemas (legacy - being replaced by Telemetry)
 class BehaviorDataCreate(BaseModel):
     module_id: str
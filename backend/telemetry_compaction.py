@@ -0,0 +1,434 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import select, update, func, or_, bindparam
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import TelemetrySession
+from telemetry_paths import (
+    TELEMETRY_COLUMNAR_DIR,
+    sanitize_segment,
+    get_session_file_path,
+    get_columnar_module_dir,
+    get_columnar_partition_dir
+)
+from telemetry_dictionaries import iter_session_lines
+from telemetry_writer import TELEMETRY_WRITER_FLUSH_SECONDS, TELEMETRY_WRITER_IDLE_SECONDS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_COMPACTION_ENABLED = os.getenv("TELEMETRY_COMPACTION_ENABLED", "true").lower() == "true"
+TELEMETRY_COMPACTION_INTERVAL_MINUTES = float(os.getenv("TELEMETRY_COMPACTION_INTERVAL_MINUTES", "30"))
+# Sessions without an explicit end are treated as closed after this much inactivity
+TELEMETRY_COMPACTION_IDLE_MINUTES = int(os.getenv("TELEMETRY_COMPACTION_IDLE_MINUTES", "120"))
+TELEMETRY_COMPACTION_BATCH_SESSIONS = int(os.getenv("TELEMETRY_COMPACTION_BATCH_SESSIONS", "200"))
+# Rows buffered for one module/day before its partition is rewritten mid-run
+TELEMETRY_COMPACTION_FLUSH_ROWS = int(os.getenv("TELEMETRY_COMPACTION_FLUSH_ROWS", "500000"))
+# Rows buffered across all partitions; above this the largest partitions are written early
+TELEMETRY_COMPACTION_BUFFER_ROWS = int(os.getenv("TELEMETRY_COMPACTION_BUFFER_ROWS", "2000000"))
+# Every worker's writer pool has flushed a session's frames this long after its last write
+WRITER_SETTLE_SECONDS = max(TELEMETRY_WRITER_FLUSH_SECONDS, TELEMETRY_WRITER_IDLE_SECONDS)
+
+PARQUET_COMPRESSION = "zstd"
+PARTITION_FILE_NAME = "events.parquet"
+LOCK_FILE_NAME = ".compaction.lock"
+LOCK_RETRY_SECONDS = 0.2
+ROW_GROUP_ROWS = 128 * 1024
+MARK_CHUNK_SESSIONS = 1000
+
+# Payload fields recorded by TelemetryService, promoted to typed columns
+PAYLOAD_COLUMNS = {
+    "code": pa.string(),
+    "button": pa.int32(),
+    "x": pa.float64(),
+    "y": pa.float64(),
+    "target": pa.string(),
+    "repeat": pa.bool_(),
+    "alt": pa.bool_(),
+    "ctrl": pa.bool_(),
+    "shift": pa.bool_(),
+    "meta": pa.bool_(),
+    "field_id": pa.string(),
+    "length": pa.int32(),
+    "device": pa.string()
+}
+
+EVENT_SCHEMA = pa.schema([
+    ("session_id", pa.dictionary(pa.int32(), pa.string())),
+    ("event_type", pa.dictionary(pa.int32(), pa.string())),
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("client_timestamp", pa.timestamp("ms", tz="UTC")),
+    ("anon_id", pa.dictionary(pa.int32(), pa.string())),
+    *[(f"payload_{name}", dtype) for name, dtype in PAYLOAD_COLUMNS.items()],
+    # The full payload, for fields without their own column
+    ("payload", pa.string())
+])
+
+
+def parse_timestamp_ms(value) -> int | None:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def coerce(value, dtype: pa.DataType):
+    if value is None:
+        return None
+    try:
+        if pa.types.is_boolean(dtype):
+            return bool(value)
+        if pa.types.is_integer(dtype):
+            return int(value)
+        if pa.types.is_floating(dtype):
+            return float(value)
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def new_columns() -> dict[str, list]:
+    return {field.name: [] for field in EVENT_SCHEMA}
+
+
+def record_time_ms(record: dict) -> int | None:
+    client_ms = record.get("client_timestamp")
+    if isinstance(client_ms, int):
+        return client_ms
+    return parse_timestamp_ms(record.get("timestamp"))
+
+
+def append_record(columns: dict[str, list], record: dict) -> None:
+    client_ms = record.get("client_timestamp")
+    payload = record.get("payload") if isinstance(record.get("payload"), dict) else {}
+    columns["session_id"].append(record.get("session_id"))
+    columns["event_type"].append(record.get("event_type"))
+    columns["timestamp"].append(parse_timestamp_ms(record.get("timestamp")))
+    columns["client_timestamp"].append(client_ms if isinstance(client_ms, int) else None)
+    columns["anon_id"].append(record.get("anon_id"))
+    for name, dtype in PAYLOAD_COLUMNS.items():
+        columns[f"payload_{name}"].append(coerce(payload.get(name), dtype))
+    columns["payload"].append(json.dumps(payload, ensure_ascii=False) if payload else None)
+
+
+def append_session_columns(grouped: dict[str, dict[str, list]], module_id: str, session_id: str) -> None:
+    """Add the events of one session file to per-UTC-day column lists"""
+    path = get_session_file_path(module_id, session_id)
+    if not path.exists():
+        return
+    for line in iter_session_lines(path):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        event_ms = record_time_ms(record) or 0
+        day = datetime.fromtimestamp(event_ms / 1000, tz=timezone.utc).date().isoformat()
+        append_record(grouped.setdefault(day, new_columns()), record)
+
+
+def get_partition_file(module_id: str, day: str) -> Path:
+    return get_columnar_partition_dir(module_id, day) / PARTITION_FILE_NAME
+
+
+def iter_partition_tables(path: Path, row_filter=None, new_rows: pa.Table | None = None):
+    if path.exists():
+        existing = pq.ParquetFile(path)
+        for index in range(existing.num_row_groups):
+            group = existing.read_row_group(index)
+            yield row_filter(group) if row_filter else group
+    if new_rows is not None:
+        yield new_rows
+
+
+def rewrite_partition(path: Path, row_filter=None, new_rows: pa.Table | None = None) -> None:
+    """
+    Copy a partition file row group by row group into a new file, optionally filtering
+    rows and appending new ones, then swap it in with os.replace so readers never see
+    partial or duplicate data. Small row groups are merged on the way.
+    """
+    temp_path = path.with_name(f".{PARTITION_FILE_NAME}.{uuid.uuid4().hex}.tmp")
+    try:
+        with pq.ParquetWriter(temp_path, EVENT_SCHEMA, compression=PARQUET_COMPRESSION) as writer:
+            pending, pending_rows = [], 0
+            for table in iter_partition_tables(path, row_filter, new_rows):
+                pending.append(table)
+                pending_rows += table.num_rows
+                if pending_rows >= ROW_GROUP_ROWS:
+                    writer.write_table(pa.concat_tables(pending), row_group_size=ROW_GROUP_ROWS)
+                    pending, pending_rows = [], 0
+            if pending_rows:
+                writer.write_table(pa.concat_tables(pending), row_group_size=ROW_GROUP_ROWS)
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def without_sessions(group: pa.Table, session_ids: pa.Array) -> pa.Table:
+    return group.filter(pc.invert(pc.is_in(group["session_id"].cast(pa.string()), session_ids)))
+
+
+def write_partition(module_id: str, day: str, columns: dict[str, list], session_ids: pa.Array) -> Path:
+    """
+    Write the rows of the given sessions into a module/day partition, kept as a single
+    Parquet file; rows those sessions already had there are replaced, not duplicated
+    """
+    path = get_partition_file(module_id, day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rewrite_partition(
+        path,
+        row_filter=lambda group: without_sessions(group, session_ids),
+        new_rows=pa.Table.from_pydict(columns, schema=EVENT_SCHEMA)
+    )
+    return path
+
+
+class PartitionBuffer:
+    """
+    Rows compacted during one run, per module/day partition
+    Each partition file is rewritten once at the end of the run, or early when its buffer
+    reaches flush_rows or all buffers together exceed max_rows (largest first), rather
+    than once per batch of sessions
+    """
+
+    def __init__(self, flush_rows: int = TELEMETRY_COMPACTION_FLUSH_ROWS, max_rows: int = TELEMETRY_COMPACTION_BUFFER_ROWS):
+        self.flush_rows = flush_rows
+        self.max_rows = max_rows
+        self.buffered_rows = 0
+        self.partitions: dict[tuple[str, str], dict[str, list]] = {}
+        self.sessions: dict[tuple[str, str], set[str]] = {}
+        self.files: set[str] = set()
+
+    def add_session(self, module_id: str, session_id: str) -> None:
+        grouped: dict[str, dict[str, list]] = {}
+        append_session_columns(grouped, module_id, session_id)
+        for day, columns in grouped.items():
+            key = (module_id, day)
+            self.sessions.setdefault(key, set()).add(session_id)
+            buffered = self.partitions.setdefault(key, new_columns())
+            for name, values in columns.items():
+                buffered[name].extend(values)
+            self.buffered_rows += len(columns["session_id"])
+            if len(buffered["session_id"]) >= self.flush_rows:
+                self.flush(key)
+        while self.buffered_rows > self.max_rows:
+            self.flush(max(self.partitions, key=lambda key: len(self.partitions[key]["session_id"])))
+
+    def flush(self, key: tuple[str, str]) -> None:
+        module_id, day = key
+        replaced = pa.array(sorted(self.sessions.pop(key)), type=pa.string())
+        columns = self.partitions.pop(key)
+        self.buffered_rows -= len(columns["session_id"])
+        path = write_partition(module_id, day, columns, replaced)
+        self.files.add(str(path))
+
+    def flush_all(self) -> None:
+        for key in list(self.partitions):
+            self.flush(key)
+
+
+def lock_file(handle, blocking: bool) -> bool:
+    """Exclusive lock on an open file, released when it is closed; flock, or msvcrt on Windows"""
+    if fcntl:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        return True
+    while True:
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(LOCK_RETRY_SECONDS)
+
+
+@contextmanager
+def partition_lock(blocking: bool = True):
+    """
+    Exclusive lock over partition rewrites, shared by compaction and erasure on this host
+    Yields False when blocking is off and another process holds it
+    """
+    root = Path(TELEMETRY_COLUMNAR_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE_NAME, "w") as lock:
+        yield lock_file(lock, blocking)
+
+
+def remove_sessions_from_partitions(module_id: str, session_ids: list[str]) -> int:
+    """
+    Rewrite the module's partitions without the given sessions, for erasure
+    Only the session_id column is read to find affected partitions; returns rows removed
+    """
+    module_root = get_columnar_module_dir(module_id)
+    if not module_root.is_dir() or not session_ids:
+        return 0
+    with partition_lock():
+        return remove_partition_rows(module_root, pa.array(session_ids, type=pa.string()))
+
+
+def remove_partition_rows(module_root: Path, erased: pa.Array) -> int:
+    removed = 0
+    for path in sorted(module_root.glob(f"date=*/{PARTITION_FILE_NAME}")):
+        present = pc.is_in(pq.read_table(path, columns=["session_id"])["session_id"].cast(pa.string()), erased)
+        matches = pc.sum(present).as_py() or 0
+        if not matches:
+            continue
+        rewrite_partition(path, row_filter=lambda group: without_sessions(group, erased))
+        removed += matches
+    return removed
+
+
+def closed_sessions_query(after_id: int, limit: int):
+    """
+    Ended or idle sessions whose last write is older than WRITER_SETTLE_SECONDS, so frames
+    buffered in any worker's writer pool are on disk before the file is read
+    """
+    now = datetime.now(timezone.utc)
+    idle_cutoff = now - timedelta(minutes=TELEMETRY_COMPACTION_IDLE_MINUTES)
+    settled_cutoff = now - timedelta(seconds=WRITER_SETTLE_SECONDS)
+    return select(
+        TelemetrySession.id, TelemetrySession.module_id, TelemetrySession.session_id, TelemetrySession.event_count
+    ).where(
+        TelemetrySession.id > after_id,
+        TelemetrySession.compacted_at.is_(None),
+        TelemetrySession.event_count > 0,
+        TelemetrySession.last_event_at < settled_cutoff,
+        or_(
+            TelemetrySession.ended_at < settled_cutoff,
+            TelemetrySession.last_event_at < idle_cutoff
+        )
+    ).order_by(TelemetrySession.id).limit(limit)
+
+
+def mark_compacted(db: Session, sessions: list[dict]) -> None:
+    """
+    Mark sessions compacted unless events arrived since they were read
+    Ingest clears compacted_at, so a session whose event_count moved on is compacted again
+    """
+    table = TelemetrySession.__table__
+    statement = update(table).where(
+        table.c.id == bindparam("session_pk"),
+        table.c.event_count == bindparam("read_event_count")
+    ).values(compacted_at=func.now())
+    for start in range(0, len(sessions), MARK_CHUNK_SESSIONS):
+        db.execute(statement, sessions[start:start + MARK_CHUNK_SESSIONS])
+    db.commit()
+
+
+def compact_closed_sessions(db: Session, limit: int = TELEMETRY_COMPACTION_BATCH_SESSIONS) -> dict:
+    """
+    Copy every closed, not yet compacted session into module/day Parquet partitions
+    Sessions are read in batches but buffered per partition for the whole run, and marked
+    compacted once all partitions are written. Writing a session replaces its earlier rows,
+    so a crash before the mark, or new events after it, just compacts it again.
+    """
+    buffer = PartitionBuffer()
+    compacted: list[dict] = []
+    after_id = 0
+    while True:
+        sessions = db.execute(closed_sessions_query(after_id, limit)).all()
+        for session_pk, module_id, session_id, event_count in sessions:
+            buffer.add_session(module_id, session_id)
+            compacted.append({"session_pk": session_pk, "read_event_count": event_count})
+        if len(sessions) < limit:
+            break
+        after_id = sessions[-1][0]
+
+    buffer.flush_all()
+    mark_compacted(db, compacted)
+    return {"sessions": len(compacted), "files": sorted(buffer.files)}
+
+
+def run_compaction() -> dict:
+    """Compact every closed session; the partition lock keeps one compactor per host"""
+    with partition_lock(blocking=False) as acquired:
+        if not acquired:
+            return {"sessions": 0, "files": [], "skipped": "another compaction is running"}
+        db = SessionLocal()
+        try:
+            return compact_closed_sessions(db)
+        finally:
+            db.close()
+
+
+def list_columnar_partitions(module_id: str) -> dict:
+    module_root = get_columnar_module_dir(module_id)
+    partitions = []
+    if module_root.is_dir():
+        for partition_dir in sorted(module_root.glob("date=*")):
+            path = partition_dir / PARTITION_FILE_NAME
+            if not path.exists():
+                continue
+            metadata = pq.read_metadata(path)
+            partitions.append({
+                "date": partition_dir.name[len("date="):],
+                "rows": metadata.num_rows,
+                "size": path.stat().st_size
+            })
+    return {"module_id": module_id, "partitions": partitions}
+
+
+class CompactionWorker:
+    def __init__(self, interval_minutes: float = TELEMETRY_COMPACTION_INTERVAL_MINUTES):
+        self.interval = interval_minutes * 60
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread or not TELEMETRY_COMPACTION_ENABLED:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telemetry-compaction", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                result = run_compaction()
+                if result["sessions"]:
+                    logger.info("Compacted %s telemetry sessions into %s files", result["sessions"], len(result["files"]))
+            except Exception:
+                logger.exception("Telemetry compaction failed")
+
+
+compaction_worker = CompactionWorker()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["run"]:
+        print(json.dumps(run_compaction()))
+    elif len(sys.argv) == 3 and sys.argv[1] == "list":
+        print(json.dumps(list_columnar_partitions(sanitize_segment(sys.argv[2]))))
+    else:
+        print("usage: python telemetry_compaction.py run | list <module_id>")
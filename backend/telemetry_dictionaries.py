@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import zstandard as zstd
+
+from telemetry_paths import get_module_dir
+
+TELEMETRY_DICT_SIZE = int(os.getenv("TELEMETRY_DICT_SIZE", str(112 * 1024)))
+TELEMETRY_DICT_SAMPLE_SESSIONS = int(os.getenv("TELEMETRY_DICT_SAMPLE_SESSIONS", "200"))
+TELEMETRY_DICT_MAX_SAMPLES = int(os.getenv("TELEMETRY_DICT_MAX_SAMPLES", "50000"))
+TELEMETRY_DICT_REFRESH_SECONDS = float(os.getenv("TELEMETRY_DICT_REFRESH_SECONDS", "60"))
+
+DICTIONARY_DIR_NAME = "_dictionaries"
+FRAME_HEADER_MAX_SIZE = 18
+READ_CHUNK_SIZE = 1 << 16
+
+_compressors: dict[tuple[str, int], tuple[float, int, zstd.ZstdCompressor]] = {}
+_compressors_lock = threading.Lock()
+
+
+def get_dictionary_dir(module_dir: Path) -> Path:
+    return module_dir / DICTIONARY_DIR_NAME
+
+
+def current_dictionary_id(module_dir: Path) -> int:
+    try:
+        return int((get_dictionary_dir(module_dir) / "current").read_text().strip())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+@lru_cache(maxsize=64)
+def load_dictionary(module_dir: Path, dict_id: int) -> zstd.ZstdCompressionDict:
+    path = get_dictionary_dir(module_dir) / f"{dict_id}.zdict"
+    return zstd.ZstdCompressionDict(path.read_bytes())
+
+
+def module_has_dictionaries(module_id: str) -> bool:
+    return get_dictionary_dir(get_module_dir(module_id)).is_dir()
+
+
+def get_compressor(module_id: str, level: int) -> zstd.ZstdCompressor:
+    """
+    Compressor for new frames of a module, using its current dictionary if one is trained
+    The dictionary ID is written into every frame header so readers can pick the right one
+    """
+    now = time.monotonic()
+    key = (module_id, level)
+    with _compressors_lock:
+        cached = _compressors.get(key)
+        if cached and now - cached[0] < TELEMETRY_DICT_REFRESH_SECONDS:
+            return cached[2]
+        module_dir = get_module_dir(module_id)
+        dict_id = current_dictionary_id(module_dir)
+        if cached and cached[1] == dict_id:
+            compressor = cached[2]
+        elif dict_id:
+            compressor = zstd.ZstdCompressor(level=level, dict_data=load_dictionary(module_dir, dict_id))
+        else:
+            compressor = zstd.ZstdCompressor(level=level)
+        _compressors[key] = (now, dict_id, compressor)
+        return compressor
+
+
+def get_decompressor(module_dir: Path, dict_id: int) -> zstd.ZstdDecompressor:
+    """
+    New decompressor for one stream; only the dictionary is cached
+    Decompressors share one context across their decompressobj streams, so they are never shared
+    """
+    if not dict_id:
+        return zstd.ZstdDecompressor()
+    return zstd.ZstdDecompressor(dict_data=load_dictionary(module_dir, dict_id))
+
+
+def iter_session_chunks(path: Path):
+    """
+    Yield the decompressed bytes of a session file frame by frame
+    Each frame is decoded with the dictionary named in its header; a truncated
+    trailing frame (still being written) ends the stream quietly
+    """
+    module_dir = path.parent
+    with open(path, "rb") as f:
+        buffer = b""
+        reader = None
+        at_eof = False
+        while True:
+            if reader is None:
+                while len(buffer) < FRAME_HEADER_MAX_SIZE and not at_eof:
+                    chunk = f.read(READ_CHUNK_SIZE)
+                    at_eof = not chunk
+                    buffer += chunk
+                if not buffer:
+                    return
+                try:
+                    params = zstd.get_frame_parameters(buffer)
+                except zstd.ZstdError:
+                    return
+                reader = get_decompressor(module_dir, params.dict_id).decompressobj()
+            if buffer:
+                output = reader.decompress(buffer)
+                buffer = b""
+                if output:
+                    yield output
+            if reader.eof:
+                buffer = reader.unused_data
+                reader = None
+                continue
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            buffer = chunk
+
+
+def iter_session_frames(path: Path):
+    """
+    Yield (offset, compressed_size, data) for each complete frame of a session file
+    Used to rebuild indexes; a truncated trailing frame is skipped
+    """
+    module_dir = path.parent
+    with open(path, "rb") as f:
+        offset = 0
+        buffer = b""
+        while True:
+            while len(buffer) < FRAME_HEADER_MAX_SIZE:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                buffer += chunk
+            if not buffer:
+                return
+            try:
+                params = zstd.get_frame_parameters(buffer)
+            except zstd.ZstdError:
+                return
+            reader = get_decompressor(module_dir, params.dict_id).decompressobj()
+            output = []
+            fed = 0
+            while True:
+                output.append(reader.decompress(buffer))
+                fed += len(buffer)
+                if reader.eof:
+                    break
+                buffer = f.read(READ_CHUNK_SIZE)
+                if not buffer:
+                    return
+            buffer = reader.unused_data
+            size = fed - len(buffer)
+            yield offset, size, b"".join(output)
+            offset += size
+
+
+def iter_session_lines(path: Path):
+    remainder = b""
+    for chunk in iter_session_chunks(path):
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            if line:
+                yield line
+    if remainder:
+        yield remainder
+
+
+def iter_standard_zstd(path: Path, level: int = 3):
+    """
+    Re-encode a session file as a plain zstd stream that needs no dictionary
+    """
+    compressor = zstd.ZstdCompressor(level=level).compressobj()
+    for chunk in iter_session_chunks(path):
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def train_module_dictionary(module_id: str, dict_size: int = TELEMETRY_DICT_SIZE) -> int | None:
+    """
+    Train a dictionary from the newest session files of a module and make it current
+    Older dictionaries are kept so files that reference them stay readable
+    """
+    module_dir = get_module_dir(module_id)
+    if not module_dir.is_dir():
+        return None
+    session_files = sorted(
+        module_dir.glob("*.jsonl.zst"),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True
+    )[:TELEMETRY_DICT_SAMPLE_SESSIONS]
+
+    samples = []
+    for session_file in session_files:
+        for line in iter_session_lines(session_file):
+            samples.append(line + b"\n")
+            if len(samples) >= TELEMETRY_DICT_MAX_SAMPLES:
+                break
+        if len(samples) >= TELEMETRY_DICT_MAX_SAMPLES:
+            break
+    if not samples:
+        return None
+
+    try:
+        dictionary = zstd.train_dictionary(dict_size, samples)
+    except zstd.ZstdError:
+        return None
+
+    dict_id = dictionary.dict_id()
+    dict_dir = get_dictionary_dir(module_dir)
+    dict_dir.mkdir(parents=True, exist_ok=True)
+    (dict_dir / f"{dict_id}.zdict").write_bytes(dictionary.as_bytes())
+    pointer = dict_dir / "current.tmp"
+    pointer.write_text(str(dict_id))
+    os.replace(pointer, dict_dir / "current")
+    return dict_id
+
+
+def list_module_dictionaries(module_id: str) -> dict:
+    module_dir = get_module_dir(module_id)
+    dict_dir = get_dictionary_dir(module_dir)
+    versions = []
+    if dict_dir.is_dir():
+        for path in sorted(dict_dir.glob("*.zdict"), key=lambda p: p.stat().st_mtime):
+            stat = path.stat()
+            versions.append({
+                "dict_id": int(path.stem),
+                "size": stat.st_size,
+                "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stat.st_mtime))
+            })
+    return {
+        "module_id": module_id,
+        "current_dict_id": current_dictionary_id(module_dir) or None,
+        "dictionaries": versions
+    }
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:]:
+        print(json.dumps({"module_id": name, "dict_id": train_module_dictionary(name)}))
@@ -0,0 +1,272 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, update, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import BehaviorData, TelemetrySession, TelemetryErasureJob, SessionFeature, ActivityRollup
+from telemetry_paths import get_session_file_path
+from telemetry_writer import writer_pool
+from telemetry_manifest import remove_sessions
+from telemetry_compaction import WRITER_SETTLE_SECONDS, remove_sessions_from_partitions
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_ERASURE_BATCH_SIZE = int(os.getenv("TELEMETRY_ERASURE_BATCH_SIZE", "5000"))
+TELEMETRY_ERASURE_POLL_SECONDS = float(os.getenv("TELEMETRY_ERASURE_POLL_SECONDS", "30"))
+# A running job without a heartbeat for this long is assumed orphaned by a dead process and retried
+TELEMETRY_ERASURE_STALE_MINUTES = int(os.getenv("TELEMETRY_ERASURE_STALE_MINUTES", "60"))
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def owner_filter(model, user_id: int | None, guest_id: str | None):
+    if user_id is not None:
+        return model.user_id == user_id
+    return model.guest_session_id == guest_id
+
+
+def request_erasure(db: Session, user_id: int | None, guest_id: str | None) -> TelemetryErasureJob:
+    """Queue an erasure job for the owner, reusing one that is already queued or running"""
+    job = db.query(TelemetryErasureJob).filter(
+        owner_filter(TelemetryErasureJob, user_id, guest_id),
+        TelemetryErasureJob.status.in_(ACTIVE_STATUSES)
+    ).first()
+    if job:
+        return job
+    job = TelemetryErasureJob(job_id=str(uuid.uuid4()), user_id=user_id, guest_session_id=guest_id, status="pending")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    erasure_worker.wake()
+    return job
+
+
+def serialize_erasure_job(job: TelemetryErasureJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "sessions_total": job.sessions_total,
+        "sessions_erased": job.sessions_erased,
+        "rows_deleted": job.rows_deleted,
+        "files_removed": job.files_removed,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None
+    }
+
+
+def find_owner_sessions(db: Session, user_id: int | None, guest_id: str | None) -> list[tuple[str, str]]:
+    """
+    (module_id, session_id) of every session the owner has data in
+    The registry is the index; sessions recorded before it existed come from behavior_data
+    """
+    registered = db.execute(
+        select(TelemetrySession.module_id, TelemetrySession.session_id).where(
+            owner_filter(TelemetrySession, user_id, guest_id)
+        )
+    ).all()
+    unregistered = db.execute(
+        select(BehaviorData.module_id, BehaviorData.session_id).where(
+            owner_filter(BehaviorData, user_id, guest_id),
+            BehaviorData.session_id.not_in(select(TelemetrySession.session_id))
+        ).distinct()
+    ).all()
+    return [tuple(row) for row in registered] + [tuple(row) for row in unregistered]
+
+
+def heartbeat(db: Session, job: TelemetryErasureJob) -> None:
+    """Record that the job is still making progress, so it is not reclaimed"""
+    job.heartbeat_at = func.now()
+    db.commit()
+
+
+def delete_owner_rows(db: Session, job: TelemetryErasureJob, batch_size: int = TELEMETRY_ERASURE_BATCH_SIZE) -> None:
+    """Delete behavior_data in id-bounded batches, committing each so no lock is held for long"""
+    owner = owner_filter(BehaviorData, job.user_id, job.guest_session_id)
+    while True:
+        batch = select(BehaviorData.id).where(owner).limit(batch_size)
+        result = db.execute(
+            delete(BehaviorData).where(BehaviorData.id.in_(batch)).execution_options(synchronize_session=False)
+        )
+        job.rows_deleted += result.rowcount
+        heartbeat(db, job)
+        if result.rowcount < batch_size:
+            return
+
+
+def erase_session_files(
+    db: Session,
+    job: TelemetryErasureJob,
+    sessions: list[tuple[str, str]],
+    count_progress: bool = True
+) -> None:
+    """Session files hold a single owner's events, so they are removed rather than rewritten"""
+    for start in range(0, len(sessions), TELEMETRY_ERASURE_BATCH_SIZE):
+        group = sessions[start:start + TELEMETRY_ERASURE_BATCH_SIZE]
+        session_ids_by_module: dict[str, list[str]] = {}
+        for module_id, session_id in group:
+            session_ids_by_module.setdefault(module_id, []).append(session_id)
+            writer_pool.close_session(session_id, module_id)
+            path = get_session_file_path(module_id, session_id)
+            try:
+                path.unlink()
+                job.files_removed += 1
+            except FileNotFoundError:
+                pass
+        for module_id, session_ids in session_ids_by_module.items():
+            remove_sessions(module_id, session_ids)
+            remove_sessions_from_partitions(module_id, session_ids)
+            heartbeat(db, job)
+        group_session_ids = [session_id for _, session_id in group]
+        for model in (SessionFeature, TelemetrySession):
+            db.execute(
+                delete(model).where(
+                    model.session_id.in_(group_session_ids)
+                ).execution_options(synchronize_session=False)
+            )
+        if count_progress:
+            job.sessions_erased += len(group)
+        db.commit()
+
+
+def wait_for_writers(db: Session, job: TelemetryErasureJob, stop: threading.Event) -> bool:
+    """
+    Wait out the writer flush and idle windows, heartbeating, so writer pools in other
+    processes have flushed and closed the owner's sessions; False if stopped first
+    """
+    deadline = time.monotonic() + WRITER_SETTLE_SECONDS
+    while (remaining := deadline - time.monotonic()) > 0:
+        if stop.wait(min(remaining, TELEMETRY_ERASURE_POLL_SECONDS)):
+            return False
+        heartbeat(db, job)
+    return True
+
+
+def run_erasure_job(db: Session, job: TelemetryErasureJob, stop: threading.Event) -> bool:
+    """
+    Erase the owner's telemetry, then sweep again once other processes' writers have settled,
+    since their buffered frames and batches can recreate files and rows after the first pass
+    False if stopped in between; the job is left running and is reclaimed once stale
+    """
+    sessions = find_owner_sessions(db, job.user_id, job.guest_session_id)
+    job.sessions_total = len(sessions)
+    db.commit()
+    delete_owner_rows(db, job)
+    erase_session_files(db, job, sessions)
+    if not wait_for_writers(db, job, stop):
+        return False
+    resweep = list(dict.fromkeys(sessions + find_owner_sessions(db, job.user_id, job.guest_session_id)))
+    job.sessions_total = len(resweep)
+    db.commit()
+    delete_owner_rows(db, job)
+    erase_session_files(db, job, resweep, count_progress=False)
+    db.execute(
+        delete(ActivityRollup).where(
+            owner_filter(ActivityRollup, job.user_id, job.guest_session_id)
+        ).execution_options(synchronize_session=False)
+    )
+    job.sessions_erased = job.sessions_total
+    job.status = "completed"
+    job.completed_at = func.now()
+    db.commit()
+    return True
+
+
+def claim_next_job(db: Session) -> TelemetryErasureJob | None:
+    """Move one pending job to running; the conditional update makes the claim safe across processes"""
+    stale = datetime.now(timezone.utc) - timedelta(minutes=TELEMETRY_ERASURE_STALE_MINUTES)
+    # Jobs started before heartbeats were recorded fall back to their start time
+    db.execute(
+        update(TelemetryErasureJob).where(
+            TelemetryErasureJob.status == "running",
+            func.coalesce(TelemetryErasureJob.heartbeat_at, TelemetryErasureJob.started_at) < stale
+        ).values(status="pending")
+    )
+    db.commit()
+    candidates = db.execute(
+        select(TelemetryErasureJob.id).where(
+            TelemetryErasureJob.status == "pending"
+        ).order_by(TelemetryErasureJob.id).limit(10)
+    ).scalars().all()
+    for job_pk in candidates:
+        claimed = db.execute(
+            update(TelemetryErasureJob).where(
+                TelemetryErasureJob.id == job_pk,
+                TelemetryErasureJob.status == "pending"
+            ).values(status="running", started_at=func.now(), heartbeat_at=func.now())
+        )
+        db.commit()
+        if claimed.rowcount:
+            return db.get(TelemetryErasureJob, job_pk)
+    return None
+
+
+def process_pending_erasures(stop: threading.Event) -> int:
+    processed = 0
+    db = SessionLocal()
+    try:
+        while not stop.is_set():
+            job = claim_next_job(db)
+            if job is None:
+                return processed
+            try:
+                if not run_erasure_job(db, job, stop):
+                    return processed
+            except Exception as exc:
+                db.rollback()
+                logger.exception("Telemetry erasure job %s failed", job.job_id)
+                job.status = "failed"
+                job.error = str(exc)[:1000]
+                job.completed_at = func.now()
+                db.commit()
+            processed += 1
+        return processed
+    finally:
+        db.close()
+
+
+class ErasureWorker:
+    """Background thread that runs queued erasure jobs, woken on request or by polling"""
+
+    def __init__(self, poll_seconds: float = TELEMETRY_ERASURE_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telemetry-erasure", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        if self._thread:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                process_pending_erasures(self._stop)
+            except Exception:
+                logger.exception("Telemetry erasure worker failed")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+erasure_worker = ErasureWorker()
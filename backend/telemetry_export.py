@@ -0,0 +1,223 @@
+import os
+import json
+import zlib
+import zipfile
+from datetime import datetime, timezone
+from itertools import islice
+
+import zstandard as zstd
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import BehaviorData, TelemetrySession
+from telemetry_paths import sanitize_segment, get_module_dir, get_session_file_path
+from telemetry_manifest import lookup_sessions
+from telemetry_dictionaries import module_has_dictionaries, iter_standard_zstd
+
+TELEMETRY_EXPORT_BATCH_SIZE = int(os.getenv("TELEMETRY_EXPORT_BATCH_SIZE", "2000"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Members that may approach the 4 GiB ZIP limit are written with zip64 headers up front
+ZIP64_MEMBER_THRESHOLD = zipfile.ZIP64_LIMIT // 2
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "json": ("application/json", "json")
+}
+EXPORT_COMPRESSIONS = {
+    "gzip": ("application/gzip", "gz"),
+    "zstd": ("application/zstd", "zst")
+}
+
+
+def iter_owner_events(user_id: int | None, guest_id: str | None):
+    """
+    Yield a user's or guest's events as export dicts, oldest first
+    Rows are streamed with a server-side cursor in TELEMETRY_EXPORT_BATCH_SIZE batches;
+    the generator owns its database session because it outlives the request dependency
+    """
+    owner = BehaviorData.guest_session_id == guest_id if user_id is None else BehaviorData.user_id == user_id
+    query = select(
+        BehaviorData.session_id,
+        BehaviorData.module_id,
+        BehaviorData.event_type,
+        BehaviorData.event_data,
+        BehaviorData.timestamp
+    ).where(owner).order_by(BehaviorData.timestamp, BehaviorData.id)
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(query.execution_options(yield_per=TELEMETRY_EXPORT_BATCH_SIZE))
+        for session_id, module_id, event_type, event_data, timestamp in rows:
+            yield {
+                "session_id": session_id,
+                "module_id": module_id,
+                "event_type": event_type,
+                "event_data": event_data,
+                "timestamp": timestamp.isoformat()
+            }
+    finally:
+        db.close()
+
+
+def iter_ndjson(events):
+    for event in events:
+        yield json.dumps(event) + "\n"
+
+
+def iter_json_document(header: dict, events):
+    """
+    The legacy export document, written incrementally
+    total_events follows the events array because it is only known at the end
+    """
+    yield json.dumps(header)[:-1] + ', "events": ['
+    total = 0
+    for event in events:
+        yield ("," if total else "") + json.dumps(event)
+        total += 1
+    yield f'], "total_events": {total}}}'
+
+
+def iter_chunked(parts):
+    """Coalesce many small strings into EXPORT_CHUNK_BYTES byte chunks"""
+    buffer = bytearray()
+    for part in parts:
+        buffer += part.encode()
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def iter_compressed(chunks, compression: str | None):
+    if compression is None:
+        yield from chunks
+        return
+    if compression == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    else:
+        compressor = zstd.ZstdCompressor(level=3).compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_owner_export(user_id: int | None, guest_id: str | None, fmt: str, compression: str | None):
+    events = iter_owner_events(user_id, guest_id)
+    if fmt == "ndjson":
+        parts = iter_ndjson(events)
+    else:
+        parts = iter_json_document({
+            "user_id": user_id,
+            "guest_id": guest_id,
+            "export_date": datetime.utcnow().isoformat()
+        }, events)
+    return iter_compressed(iter_chunked(parts), compression)
+
+
+def export_filename(fmt: str, compression: str | None) -> str:
+    name = f"telemetry_export_{datetime.utcnow():%Y%m%d_%H%M%S}.{EXPORT_FORMATS[fmt][1]}"
+    if compression:
+        name += f".{EXPORT_COMPRESSIONS[compression][1]}"
+    return name
+
+
+class ZipChunkSink:
+    """
+    Write-only, non-seekable target for zipfile; bytes are drained after each member chunk
+    zipfile falls back to data descriptors because there is no tell()/seek()
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_module_session_ids(module_id: str, start_dt: datetime | None, end_dt: datetime | None):
+    query = select(TelemetrySession.session_id).where(
+        TelemetrySession.module_id == module_id,
+        TelemetrySession.event_count > 0
+    )
+    if start_dt:
+        query = query.where(TelemetrySession.last_event_at >= start_dt)
+    if end_dt:
+        query = query.where(TelemetrySession.first_event_at <= end_dt)
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(query.order_by(TelemetrySession.id).execution_options(yield_per=TELEMETRY_EXPORT_BATCH_SIZE))
+        for (session_id,) in rows:
+            yield session_id
+    finally:
+        db.close()
+
+
+def iter_session_file_chunks(path):
+    with open(path, "rb") as f:
+        while chunk := f.read(EXPORT_CHUNK_BYTES):
+            yield chunk
+
+
+def utc_bound(dt: datetime | None) -> datetime | None:
+    """An export bound as an aware UTC datetime; naive bounds are taken as UTC"""
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def iter_module_session_files(module_id: str, start_dt: datetime | None, end_dt: datetime | None):
+    """
+    (path, size) of the session files to export
+    Sessions are selected from the registry by server event time; sizes come from the
+    module manifest where it indexes them, otherwise from a stat of the file
+    """
+    module_dir = get_module_dir(module_id)
+    session_ids = iter_module_session_ids(module_id, utc_bound(start_dt), utc_bound(end_dt))
+    while batch := list(islice(session_ids, TELEMETRY_EXPORT_BATCH_SIZE)):
+        entries = lookup_sessions(module_id, batch)
+        for session_id in batch:
+            entry = entries.get(session_id)
+            if entry is not None:
+                yield module_dir / entry["file_name"], entry["byte_size"]
+                continue
+            file_path = get_session_file_path(module_id, session_id)
+            try:
+                yield file_path, file_path.stat().st_size
+            except FileNotFoundError:
+                continue
+
+
+def stream_module_sessions_zip(module_id: str, start_dt: datetime | None, end_dt: datetime | None):
+    """
+    Stream a ZIP of a module's session files as it is built, one .zst member per session
+    Members are ZIP_STORED since the files are already zstd-compressed; nothing touches disk
+    """
+    uses_dictionaries = module_has_dictionaries(module_id)
+    folder = sanitize_segment(module_id)
+    sink = ZipChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for file_path, size in iter_module_session_files(module_id, start_dt, end_dt):
+            info = zipfile.ZipInfo(f"{folder}/{file_path.name}", date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            # Frames may reference a trained dictionary; re-encode as plain zstd for the client
+            chunks = iter_standard_zstd(file_path) if uses_dictionaries else iter_session_file_chunks(file_path)
+            with zf.open(info, "w", force_zip64=size > ZIP64_MEMBER_THRESHOLD) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    if len(sink.buffer) >= EXPORT_CHUNK_BYTES:
+                        yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
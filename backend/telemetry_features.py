@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sqlalchemy import select, or_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import TelemetrySession, SessionFeature
+from telemetry_paths import get_session_file_path
+from telemetry_dictionaries import iter_session_lines
+from telemetry_compaction import record_time_ms
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_FEATURE_WORKERS = int(os.getenv("TELEMETRY_FEATURE_WORKERS", str(min(4, os.cpu_count() or 1))))
+TELEMETRY_FEATURE_BATCH_SESSIONS = int(os.getenv("TELEMETRY_FEATURE_BATCH_SESSIONS", "500"))
+# Gaps between consecutive events longer than this count as idle time
+TELEMETRY_FEATURE_IDLE_GAP_MS = int(os.getenv("TELEMETRY_FEATURE_IDLE_GAP_MS", "5000"))
+
+# Bump when feature definitions change so every session is recomputed
+FEATURE_VERSION = 1
+KEYSTROKE_BINS_MS = [0, 50, 100, 200, 400, 800, 1600, np.inf]
+FOCUS_EVENTS = {"window_focus": 1, "unity_focus": 1, "window_blur": 0, "unity_blur": 0}
+
+_run_lock = threading.Lock()
+
+
+def load_session_arrays(module_id: str, session_id: str) -> dict[str, dict[str, np.ndarray]] | None:
+    """Per event type arrays of ms timestamps and pointer coordinates, sorted by time"""
+    path = get_session_file_path(module_id, session_id)
+    if not path.exists():
+        return None
+    columns: dict[str, tuple[list, list, list]] = {}
+    for line in iter_session_lines(path):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        ts = record_time_ms(record)
+        if ts is None:
+            continue
+        payload = record.get("payload") if isinstance(record.get("payload"), dict) else {}
+        ts_list, x_list, y_list = columns.setdefault(record.get("event_type"), ([], [], []))
+        ts_list.append(ts)
+        x_list.append(payload.get("x") if isinstance(payload.get("x"), (int, float)) else np.nan)
+        y_list.append(payload.get("y") if isinstance(payload.get("y"), (int, float)) else np.nan)
+
+    arrays = {}
+    for event_type, (ts_list, x_list, y_list) in columns.items():
+        ts = np.asarray(ts_list, dtype=np.int64)
+        order = np.argsort(ts, kind="stable")
+        arrays[event_type] = {
+            "ts": ts[order],
+            "x": np.asarray(x_list, dtype=np.float64)[order],
+            "y": np.asarray(y_list, dtype=np.float64)[order]
+        }
+    return arrays
+
+
+def rounded(value) -> float | None:
+    return None if value is None or not np.isfinite(value) else round(float(value), 2)
+
+
+def keystroke_features(arrays: dict) -> dict:
+    ts = arrays["key_down"]["ts"] if "key_down" in arrays else np.empty(0, dtype=np.int64)
+    intervals = np.diff(ts)
+    features = {"keystroke_count": int(ts.size)}
+    if intervals.size:
+        p10, p50, p90 = np.percentile(intervals, [10, 50, 90])
+        features.update({
+            "keystroke_interval_mean_ms": rounded(intervals.mean()),
+            "keystroke_interval_std_ms": rounded(intervals.std()),
+            "keystroke_interval_p10_ms": rounded(p10),
+            "keystroke_interval_median_ms": rounded(p50),
+            "keystroke_interval_p90_ms": rounded(p90),
+            "keystroke_interval_histogram": np.histogram(intervals, bins=KEYSTROKE_BINS_MS)[0].tolist()
+        })
+    return features
+
+
+def focus_features(arrays: dict, session_start: int, session_end: int) -> dict:
+    """
+    Time spent blurred vs focused, from the focus/blur toggles
+    Each toggle's state lasts until the next one, the last until the session's final event;
+    before the first toggle the opposite state is assumed
+    """
+    toggles = [(arrays[name]["ts"], state) for name, state in FOCUS_EVENTS.items() if name in arrays]
+    if not toggles:
+        return {"blur_count": 0, "blurred_ms": 0, "focused_ms": None}
+    ts = np.concatenate([toggle_ts for toggle_ts, _ in toggles])
+    states = np.concatenate([np.full(toggle_ts.size, state) for toggle_ts, state in toggles])
+    order = np.argsort(ts, kind="stable")
+    ts, states = ts[order], states[order]
+    boundaries = np.concatenate(([session_start], ts, [session_end]))
+    durations = np.diff(boundaries)
+    interval_states = np.concatenate(([1 - states[0]], states))
+    return {
+        "blur_count": int((states == 0).sum()),
+        "blurred_ms": int(durations[interval_states == 0].sum()),
+        "focused_ms": int(durations[interval_states == 1].sum())
+    }
+
+
+def path_features(arrays: dict, event_type: str, prefix: str) -> dict:
+    """Path length and speed over consecutive samples; segments across idle gaps are skipped"""
+    if event_type not in arrays:
+        return {f"{prefix}_path_px": 0.0}
+    stream = arrays[event_type]
+    dt = np.diff(stream["ts"])
+    distance = np.hypot(np.diff(stream["x"]), np.diff(stream["y"]))
+    valid = np.isfinite(distance) & (dt > 0) & (dt <= TELEMETRY_FEATURE_IDLE_GAP_MS)
+    speed = distance[valid] / dt[valid] * 1000
+    return {
+        f"{prefix}_path_px": rounded(distance[valid].sum()),
+        f"{prefix}_speed_mean_px_s": rounded(speed.mean()) if speed.size else None,
+        f"{prefix}_speed_p90_px_s": rounded(np.percentile(speed, 90)) if speed.size else None
+    }
+
+
+def compute_features(arrays: dict) -> dict:
+    all_ts = np.sort(np.concatenate([stream["ts"] for stream in arrays.values()])) if arrays else np.empty(0, dtype=np.int64)
+    if not all_ts.size:
+        return {"event_count": 0}
+    gaps = np.diff(all_ts)
+    idle = gaps[gaps > TELEMETRY_FEATURE_IDLE_GAP_MS]
+    duration = int(all_ts[-1] - all_ts[0])
+    return {
+        "event_count": int(all_ts.size),
+        "duration_ms": duration,
+        "active_ms": duration - int(idle.sum()),
+        "idle_gap_count": int(idle.size),
+        "idle_ms": int(idle.sum()),
+        "longest_gap_ms": int(gaps.max()) if gaps.size else 0,
+        **keystroke_features(arrays),
+        **focus_features(arrays, int(all_ts[0]), int(all_ts[-1])),
+        **path_features(arrays, "pointer_move", "pointer"),
+        **path_features(arrays, "touch_move", "touch")
+    }
+
+
+def extract_session_features(task: tuple[str, str]) -> tuple[str, dict | None]:
+    """Process pool entry point; returns None for sessions whose file is gone"""
+    module_id, session_id = task
+    arrays = load_session_arrays(module_id, session_id)
+    return session_id, None if arrays is None else compute_features(arrays)
+
+
+def stale_sessions_query(after_id: int, limit: int, module_id: str | None = None):
+    """Sessions with no features, features from an older version, or events added since"""
+    query = select(
+        TelemetrySession.id,
+        TelemetrySession.module_id,
+        TelemetrySession.session_id,
+        TelemetrySession.user_id,
+        TelemetrySession.guest_session_id,
+        TelemetrySession.event_count
+    ).outerjoin(
+        SessionFeature, SessionFeature.session_id == TelemetrySession.session_id
+    ).where(
+        TelemetrySession.id > after_id,
+        TelemetrySession.event_count > 0,
+        or_(
+            SessionFeature.id.is_(None),
+            SessionFeature.feature_version != FEATURE_VERSION,
+            SessionFeature.event_count != TelemetrySession.event_count
+        )
+    )
+    if module_id:
+        query = query.where(TelemetrySession.module_id == module_id)
+    return query.order_by(TelemetrySession.id).limit(limit)
+
+
+def store_features(db: Session, sessions: list, results: dict[str, dict | None]) -> None:
+    existing = {
+        row.session_id: row
+        for row in db.query(SessionFeature).filter(SessionFeature.session_id.in_(list(results)))
+    }
+    for _, module_id, session_id, user_id, guest_id, event_count in sessions:
+        row = existing.get(session_id)
+        if row is None:
+            row = SessionFeature(session_id=session_id, module_id=module_id)
+            db.add(row)
+        row.user_id = user_id
+        row.guest_session_id = guest_id
+        # A missing file still records the registry count, so the session is not retried every run
+        row.features = results.get(session_id) or {}
+        row.feature_version = FEATURE_VERSION
+        row.event_count = event_count
+    db.commit()
+
+
+def run_feature_extraction(module_id: str | None = None, workers: int = TELEMETRY_FEATURE_WORKERS) -> dict:
+    """
+    Compute features for every stale session, TELEMETRY_FEATURE_BATCH_SESSIONS at a time
+    Session files are parsed and reduced in a process pool; only results come back to this process
+    """
+    if not _run_lock.acquire(blocking=False):
+        return {"sessions": 0, "skipped": "feature extraction is already running"}
+    db = SessionLocal()
+    processed = 0
+    try:
+        # spawn, because the API process has running threads that fork would copy mid-state
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            after_id = 0
+            while True:
+                sessions = db.execute(stale_sessions_query(after_id, TELEMETRY_FEATURE_BATCH_SESSIONS, module_id)).all()
+                if not sessions:
+                    break
+                tasks = [(row.module_id, row.session_id) for row in sessions]
+                results = dict(executor.map(extract_session_features, tasks, chunksize=8))
+                store_features(db, sessions, results)
+                processed += len(sessions)
+                after_id = sessions[-1].id
+    finally:
+        db.close()
+        _run_lock.release()
+    return {"sessions": processed}
+
+
+def serialize_session_feature(row: SessionFeature) -> dict:
+    return {
+        "session_id": row.session_id,
+        "module_id": row.module_id,
+        "user_id": row.user_id,
+        "guest_id": row.guest_session_id,
+        "feature_version": row.feature_version,
+        "features": row.features,
+        "computed_at": row.computed_at.isoformat() if row.computed_at else None
+    }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["run"] and len(sys.argv) <= 3:
+        print(json.dumps(run_feature_extraction(sys.argv[2] if len(sys.argv) == 3 else None)))
+    else:
+        print("usage: python telemetry_features.py run [module_id]")
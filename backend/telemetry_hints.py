@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from models import Organization
+from schemas import TelemetrySettingsUpdate
+from telemetry_queue import ingest_queue, queue_mode_enabled
+
+logger = logging.getLogger(__name__)
+
+# Sustained events/second per worker process that counts as full load in sync mode
+TELEMETRY_TARGET_EVENTS_PER_SECOND = float(os.getenv("TELEMETRY_TARGET_EVENTS_PER_SECOND", "2000"))
+# Load fraction where shedding starts, and where it reaches its floor
+TELEMETRY_SHED_START = float(os.getenv("TELEMETRY_SHED_START", "0.5"))
+TELEMETRY_SHED_FULL = float(os.getenv("TELEMETRY_SHED_FULL", "0.9"))
+TELEMETRY_MIN_STREAM_SAMPLING = float(os.getenv("TELEMETRY_MIN_STREAM_SAMPLING", "0.1"))
+TELEMETRY_MAX_BATCH_MS = int(os.getenv("TELEMETRY_MAX_BATCH_MS", "30000"))
+ORG_SETTINGS_CACHE_SECONDS = 30
+RATE_WINDOW_SECONDS = 10
+
+# High-frequency streams are shed first under load
+HIGH_FREQUENCY_EVENTS = ("pointer_move", "touch_move")
+
+DEFAULT_TELEMETRY_SETTINGS = {
+    "telemetry_enabled": True,
+    "capture_keyboard": True,
+    "capture_mouse": False,
+    "capture_focus_blur": True,
+    "sampling_rate": 1.0,
+    "batch_ms": 5000,
+    "max_events_per_session": 10000,
+    "event_sampling": {}
+}
+
+
+class IngestRateMeter:
+    """Events accepted per second over a short sliding window, for this process"""
+
+    def __init__(self, window: int = RATE_WINDOW_SECONDS):
+        self.window = window
+        self._buckets: deque[list] = deque()
+        self._lock = threading.Lock()
+
+    def record(self, count: int) -> None:
+        second = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += count
+            else:
+                self._buckets.append([second, count])
+            self._trim(second)
+
+    def rate(self) -> float:
+        second = int(time.monotonic())
+        with self._lock:
+            self._trim(second)
+            return sum(count for _, count in self._buckets) / self.window
+
+    def _trim(self, second: int) -> None:
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+
+ingest_rate = IngestRateMeter()
+_org_settings_cache: dict[int | None, tuple[float, dict]] = {}
+
+
+def current_ingest_load() -> float:
+    """0.0 idle, 1.0 saturated; the higher of queue fill and ingest rate"""
+    load = ingest_rate.rate() / TELEMETRY_TARGET_EVENTS_PER_SECOND
+    if queue_mode_enabled() and ingest_queue.max_batches:
+        load = max(load, ingest_queue.depth() / ingest_queue.max_batches)
+    return load
+
+
+def valid_overrides(organization_id: int | None, overrides) -> dict:
+    """Stored overrides that still validate; an invalid value falls back to its default"""
+    if not isinstance(overrides, dict):
+        return {}
+    valid = {}
+    for key, value in overrides.items():
+        try:
+            valid.update(TelemetrySettingsUpdate.model_validate({key: value}).model_dump(exclude_none=True))
+        except ValidationError:
+            logger.warning("Ignoring invalid telemetry setting %s=%r for organization %s", key, value, organization_id)
+    return valid
+
+
+def get_org_telemetry_settings(db: Session, organization_id: int | None) -> dict:
+    now = time.monotonic()
+    cached = _org_settings_cache.get(organization_id)
+    if cached and now - cached[0] < ORG_SETTINGS_CACHE_SECONDS:
+        return cached[1]
+
+    settings = dict(DEFAULT_TELEMETRY_SETTINGS)
+    org = None
+    if organization_id:
+        org = db.query(Organization).filter(Organization.id == organization_id).first()
+    if org:
+        settings["telemetry_enabled"] = bool(org.data_collection_enabled)
+        settings["capture_keyboard"] = bool(org.keyboard_tracking_enabled)
+        settings.update(valid_overrides(org.id, org.telemetry_settings))
+    _org_settings_cache[organization_id] = (now, settings)
+    return settings
+
+
+def invalidate_org_telemetry_settings(organization_id: int | None) -> None:
+    _org_settings_cache.pop(organization_id, None)
+
+
+def apply_load_shedding(settings: dict, load: float) -> dict:
+    """Thin high-frequency streams and widen batch windows as load rises"""
+    span = max(TELEMETRY_SHED_FULL - TELEMETRY_SHED_START, 1e-6)
+    shed = min(max((load - TELEMETRY_SHED_START) / span, 0.0), 1.0)
+
+    base_rate = float(settings.get("sampling_rate", 1.0))
+    event_sampling = dict(settings.get("event_sampling") or {})
+    for event_type in HIGH_FREQUENCY_EVENTS:
+        configured = float(event_sampling.get(event_type, base_rate))
+        floor = min(configured, TELEMETRY_MIN_STREAM_SAMPLING)
+        event_sampling[event_type] = round(configured - (configured - floor) * shed, 3)
+
+    base_batch_ms = int(settings.get("batch_ms", 5000))
+    batch_ms = int(base_batch_ms + (max(TELEMETRY_MAX_BATCH_MS, base_batch_ms) - base_batch_ms) * shed)
+
+    return {
+        **settings,
+        "sampling_rate": base_rate,
+        "batch_ms": batch_ms,
+        "event_sampling": event_sampling,
+        "load": round(load, 3)
+    }
+
+
+def build_org_settings(db: Session, organization_id: int | None) -> dict:
+    return apply_load_shedding(get_org_telemetry_settings(db, organization_id), current_ingest_load())
+
+
+def build_ingest_hints(db: Session, organization_id: int | None) -> dict:
+    """The subset of settings a client may change mid-session"""
+    settings = build_org_settings(db, organization_id)
+    return {
+        "sampling_rate": settings["sampling_rate"],
+        "batch_ms": settings["batch_ms"],
+        "event_sampling": settings["event_sampling"],
+        "load": settings["load"]
+    }
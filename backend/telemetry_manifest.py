@@ -0,0 +1,347 @@
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import zstandard as zstd
+
+from telemetry_paths import get_module_dir, get_session_file_path, sanitize_segment
+from telemetry_dictionaries import iter_session_frames, get_decompressor
+
+MANIFEST_NAME = "_manifest.sqlite"
+SQLITE_BUSY_TIMEOUT_MS = 10000
+# SQLite caps bound parameters per statement
+LOOKUP_CHUNK = 500
+
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    byte_size INTEGER NOT NULL DEFAULT 0,
+    frame_count INTEGER NOT NULL DEFAULT 0,
+    event_count INTEGER NOT NULL DEFAULT 0,
+    first_client_ts INTEGER,
+    last_client_ts INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_sessions_last_client_ts ON sessions (last_client_ts);
+CREATE TABLE IF NOT EXISTS frames (
+    session_id TEXT NOT NULL,
+    frame_offset INTEGER NOT NULL,
+    frame_size INTEGER NOT NULL,
+    event_count INTEGER NOT NULL,
+    first_client_ts INTEGER,
+    last_client_ts INTEGER,
+    PRIMARY KEY (session_id, frame_offset)
+);
+"""
+
+FRAME_COLUMNS = ("frame_offset", "frame_size", "event_count", "first_client_ts", "last_client_ts")
+
+MANIFEST_COLUMNS = (
+    "session_id", "file_name", "byte_size", "frame_count",
+    "event_count", "first_client_ts", "last_client_ts", "updated_at"
+)
+
+
+def get_manifest_path(module_id: str) -> Path:
+    return get_module_dir(module_id) / MANIFEST_NAME
+
+
+def open_manifest(path: Path) -> sqlite3.Connection:
+    """
+    Rollback-journal mode (not WAL) so the manifest also works on network filesystems
+    Writers from several processes serialize on SQLite's file lock
+    """
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.executescript(MANIFEST_SCHEMA)
+    return conn
+
+
+class ManifestConnections:
+    """
+    One connection per manifest, opened and given its schema once per process
+    A connection is used by one thread at a time, under its own lock
+    """
+
+    def __init__(self):
+        self._connections: dict[Path, tuple[sqlite3.Connection, threading.Lock]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connect(self, path: Path):
+        with self._lock:
+            entry = self._connections.get(path)
+            if entry is None:
+                entry = self._connections[path] = (open_manifest(path), threading.Lock())
+        conn, conn_lock = entry
+        with conn_lock:
+            yield conn
+
+    def close_all(self) -> None:
+        with self._lock:
+            for conn, conn_lock in self._connections.values():
+                with conn_lock:
+                    conn.close()
+            self._connections.clear()
+
+
+manifest_connections = ManifestConnections()
+
+
+def record_frame(
+    module_id: str,
+    session_id: str,
+    file_name: str,
+    frame_offset: int,
+    frame_size: int,
+    event_count: int,
+    first_client_ts: int | None,
+    last_client_ts: int | None
+) -> None:
+    """Add one appended frame to a session's manifest entry and its frame index"""
+    path = get_manifest_path(module_id)
+    safe_id = sanitize_segment(session_id)
+    with manifest_connections.connect(path) as conn, conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO frames (session_id, {', '.join(FRAME_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            (safe_id, frame_offset, frame_size, event_count, first_client_ts, last_client_ts)
+        )
+        conn.execute(
+            """
+            INSERT INTO sessions (session_id, file_name, byte_size, frame_count, event_count,
+                                  first_client_ts, last_client_ts, updated_at)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+            ON CONFLICT (session_id) DO UPDATE SET
+                byte_size = byte_size + excluded.byte_size,
+                frame_count = frame_count + 1,
+                event_count = event_count + excluded.event_count,
+                first_client_ts = min(coalesce(first_client_ts, excluded.first_client_ts),
+                                      coalesce(excluded.first_client_ts, first_client_ts)),
+                last_client_ts = max(coalesce(last_client_ts, excluded.last_client_ts),
+                                     coalesce(excluded.last_client_ts, last_client_ts)),
+                updated_at = excluded.updated_at
+            """,
+            (safe_id, file_name, frame_size, event_count, first_client_ts, last_client_ts, time.time())
+        )
+
+
+def remove_sessions(module_id: str, session_ids: list[str]) -> None:
+    path = get_manifest_path(module_id)
+    if not path.exists() or not session_ids:
+        return
+    keys = [(sanitize_segment(session_id),) for session_id in session_ids]
+    with manifest_connections.connect(path) as conn, conn:
+        conn.executemany("DELETE FROM frames WHERE session_id = ?", keys)
+        conn.executemany("DELETE FROM sessions WHERE session_id = ?", keys)
+
+
+def lookup_sessions(module_id: str, session_ids: list[str]) -> dict[str, dict]:
+    """
+    Manifest entries for the given sessions; sessions with no file on disk are absent
+    Entries are keyed by file-safe session ID, mapped back to the IDs passed in
+    """
+    path = get_manifest_path(module_id)
+    if not path.exists() or not session_ids:
+        return {}
+    safe_ids = {sanitize_segment(session_id): session_id for session_id in session_ids}
+    keys = list(safe_ids)
+    entries = {}
+    with manifest_connections.connect(path) as conn:
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            rows = conn.execute(
+                f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM sessions "
+                f"WHERE session_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            for row in rows:
+                entries[safe_ids[row[0]]] = dict(zip(MANIFEST_COLUMNS, row))
+    return entries
+
+
+def rebuild_module_manifest(module_id: str) -> int:
+    """
+    Recreate a module's manifest by scanning its session files
+    For data written before the manifest existed; run while ingest for the module is idle
+    """
+    module_dir = get_module_dir(module_id)
+    path = get_manifest_path(module_id)
+    if not module_dir.is_dir():
+        return 0
+    entries = []
+    frame_rows = []
+    # Session IDs are stored in their file-safe form, as they appear in file names
+    for session_file in module_dir.glob("*.jsonl.zst"):
+        session_id = session_file.name[:-len(".jsonl.zst")]
+        frames = events = 0
+        first_ts = last_ts = None
+        for offset, size, data in iter_session_frames(session_file):
+            frame_events, frame_first, frame_last = summarize_frame(data)
+            frame_rows.append((session_id, offset, size, frame_events, frame_first, frame_last))
+            frames += 1
+            events += frame_events
+            if frame_first is not None:
+                first_ts = frame_first if first_ts is None else min(first_ts, frame_first)
+                last_ts = frame_last if last_ts is None else max(last_ts, frame_last)
+        entries.append((
+            session_id, session_file.name, session_file.stat().st_size,
+            frames, events, first_ts, last_ts, time.time()
+        ))
+    with manifest_connections.connect(path) as conn, conn:
+        conn.execute("DELETE FROM frames")
+        conn.execute("DELETE FROM sessions")
+        conn.executemany(
+            f"INSERT INTO sessions ({', '.join(MANIFEST_COLUMNS)}) VALUES ({', '.join('?' * len(MANIFEST_COLUMNS))})",
+            entries
+        )
+        conn.executemany(
+            f"INSERT INTO frames (session_id, {', '.join(FRAME_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            frame_rows
+        )
+    return len(entries)
+
+
+def summarize_frame(data: bytes) -> tuple[int, int | None, int | None]:
+    events = 0
+    first_ts = last_ts = None
+    for record in iter_frame_records(data):
+        events += 1
+        ts = record.get("client_timestamp")
+        if isinstance(ts, int):
+            first_ts = ts if first_ts is None else min(first_ts, ts)
+            last_ts = ts if last_ts is None else max(last_ts, ts)
+    return events, first_ts, last_ts
+
+
+def iter_frame_records(data: bytes):
+    for line in data.splitlines():
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def session_frames(module_id: str, session_id: str) -> list[dict]:
+    """
+    Frame index of one session in file order
+    Empty unless it covers the whole file; frames appended before the index existed are not in it
+    """
+    path = get_manifest_path(module_id)
+    if not path.exists():
+        return []
+    safe_id = sanitize_segment(session_id)
+    with manifest_connections.connect(path) as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(FRAME_COLUMNS)} FROM frames WHERE session_id = ? ORDER BY frame_offset",
+            (safe_id,)
+        ).fetchall()
+        byte_size = conn.execute("SELECT byte_size FROM sessions WHERE session_id = ?", (safe_id,)).fetchone()
+    frames = [dict(zip(FRAME_COLUMNS, row)) for row in rows]
+    if not byte_size or sum(frame["frame_size"] for frame in frames) != byte_size[0]:
+        return []
+    return frames
+
+
+def read_frame(module_dir: Path, f, offset: int, size: int) -> bytes:
+    """One frame of an open session file; seek and read, as os.pread is POSIX-only"""
+    f.seek(offset)
+    frame = f.read(size)
+    params = zstd.get_frame_parameters(frame)
+    return get_decompressor(module_dir, params.dict_id).decompressobj().decompress(frame)
+
+
+def in_window(record: dict, start_ms: int | None, end_ms: int | None) -> bool:
+    if start_ms is None and end_ms is None:
+        return True
+    ts = record.get("client_timestamp")
+    if not isinstance(ts, int):
+        return False
+    return (start_ms is None or ts >= start_ms) and (end_ms is None or ts <= end_ms)
+
+
+def select_frames(frames: list[dict], start_ms: int | None, end_ms: int | None, offset: int) -> tuple[list[dict], int]:
+    """
+    Indexed frames that can hold requested events, plus the number of events skipped unread
+    Without a time window, leading frames wholly inside the offset are skipped by their counts
+    """
+    windowed = start_ms is not None or end_ms is not None
+    selected = []
+    skipped = 0
+    for frame in frames:
+        if windowed and frame["first_client_ts"] is None:
+            continue
+        if start_ms is not None and frame["last_client_ts"] < start_ms:
+            continue
+        if end_ms is not None and frame["first_client_ts"] > end_ms:
+            continue
+        if not windowed and not selected and skipped + frame["event_count"] <= offset:
+            skipped += frame["event_count"]
+            continue
+        selected.append(frame)
+    return selected, skipped
+
+
+def read_session_events(
+    module_id: str,
+    session_id: str,
+    start_ms: int | None = None,
+    end_ms: int | None = None,
+    offset: int = 0,
+    limit: int = 1000
+) -> dict:
+    """
+    Events of a session within a client time window, after skipping offset matches
+    Only the frames the index says can contain them are read and decompressed
+    """
+    file_path = get_session_file_path(module_id, session_id)
+    frames = session_frames(module_id, session_id)
+    events = []
+    frames_read = 0
+    with open(file_path, "rb") as f:
+        if frames:
+            selected, skipped = select_frames(frames, start_ms, end_ms, offset)
+            blobs = (
+                read_frame(file_path.parent, f, frame["frame_offset"], frame["frame_size"])
+                for frame in selected
+            )
+        else:
+            # Written before the frame index existed; scan the whole file
+            skipped = 0
+            blobs = (data for _, _, data in iter_session_frames(file_path))
+        for data in blobs:
+            frames_read += 1
+            for record in iter_frame_records(data):
+                if not in_window(record, start_ms, end_ms):
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                events.append(record)
+                if len(events) >= limit:
+                    break
+            if len(events) >= limit:
+                break
+
+    return {
+        "module_id": module_id,
+        "session_id": session_id,
+        "indexed": bool(frames),
+        "frames_total": len(frames) if frames else None,
+        "frames_read": frames_read,
+        "offset": offset,
+        "limit": limit,
+        "events": events
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "rebuild":
+        for name in sys.argv[2:]:
+            print(json.dumps({"module_id": sanitize_segment(name), "sessions": rebuild_module_manifest(name)}))
+    else:
+        print("usage: python telemetry_manifest.py rebuild <module_id> [...]")
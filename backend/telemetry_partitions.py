@@ -0,0 +1,144 @@
+import os
+import re
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text, func, select
+from sqlalchemy.engine import Engine, Connection
+
+from models import BehaviorData, Organization
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_PARTITION_MONTHS_AHEAD = int(os.getenv("TELEMETRY_PARTITION_MONTHS_AHEAD", "3"))
+TELEMETRY_PARTITION_MAINTENANCE_HOURS = float(os.getenv("TELEMETRY_PARTITION_MAINTENANCE_HOURS", "6"))
+# 0 keeps the longest organization data_retention_days
+TELEMETRY_RETENTION_DAYS = int(os.getenv("TELEMETRY_RETENTION_DAYS", "0"))
+
+TABLE_NAME = BehaviorData.__tablename__
+PARTITION_NAME = re.compile(rf"^{TABLE_NAME}_p(\d{{4}})(\d{{2}})$")
+MAINTENANCE_LOCK_KEY = 7_240_117
+
+def is_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def add_months(value: date, months: int) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE_NAME}_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    relkind = conn.execute(text(
+        "SELECT c.relkind FROM pg_class c "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": TABLE_NAME}).scalar()
+    return relkind == "p"
+
+
+def ensure_monthly_partitions(conn: Connection, months_ahead: int = TELEMETRY_PARTITION_MONTHS_AHEAD) -> list[str]:
+    created = []
+    current = month_start(datetime.utcnow().date())
+    for offset in range(-1, months_ahead + 1):
+        start = add_months(current, offset)
+        end = add_months(start, 1)
+        name = partition_name(start)
+        exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        if exists:
+            continue
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {TABLE_NAME} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        created.append(name)
+    return created
+
+
+def resolve_retention_days(conn: Connection) -> int:
+    if TELEMETRY_RETENTION_DAYS > 0:
+        return TELEMETRY_RETENTION_DAYS
+    longest = conn.execute(select(func.max(Organization.data_retention_days))).scalar()
+    return int(longest or 0)
+
+
+def drop_expired_partitions(conn: Connection, retention_days: int) -> list[str]:
+    """Drop monthly partitions whose whole range is older than the retention window"""
+    if retention_days <= 0:
+        return []
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    names = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :name"
+    ), {"name": TABLE_NAME}).scalars().all()
+
+    dropped = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if not match:
+            continue
+        start = date(int(match.group(1)), int(match.group(2)), 1)
+        if add_months(start, 1) <= cutoff:
+            conn.execute(text(f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def maintain_behavior_data_partitions(engine: Engine) -> dict:
+    if not is_postgres(engine):
+        return {"partitioned": False}
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return {"partitioned": False}
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+        created = ensure_monthly_partitions(conn)
+        dropped = drop_expired_partitions(conn, resolve_retention_days(conn))
+    if created or dropped:
+        logger.info("behavior_data partitions created=%s dropped=%s", created, dropped)
+    return {"partitioned": True, "created": created, "dropped": dropped}
+
+
+class PartitionMaintainer:
+    def __init__(self, engine: Engine, interval_hours: float = TELEMETRY_PARTITION_MAINTENANCE_HOURS):
+        self.engine = engine
+        self.interval = interval_hours * 3600
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread or not is_postgres(self.engine):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="behavior-data-partitions", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                maintain_behavior_data_partitions(self.engine)
+            except Exception:
+                logger.exception("behavior_data partition maintenance failed")
+            if self._stop.wait(self.interval):
+                return
+
+
+if __name__ == "__main__":
+    from database import engine
+    print(maintain_behavior_data_partitions(engine))
@@ -0,0 +1,30 @@
+import os
+import re
+from pathlib import Path
+
+TELEMETRY_DATA_DIR = os.getenv("TELEMETRY_DATA_DIR", "/mnt/data/pingdata/telemetry")
+
+
+def sanitize_segment(value: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", value or "").strip("_")
+    return safe or "unknown"
+
+
+def get_module_dir(module_id: str) -> Path:
+    return Path(TELEMETRY_DATA_DIR) / sanitize_segment(module_id)
+
+
+def get_session_file_path(module_id: str, session_id: str) -> Path:
+    return get_module_dir(module_id) / f"{sanitize_segment(session_id)}.jsonl.zst"
+
+
+# Compacted Parquet, hive-partitioned as module=<module>/date=<YYYY-MM-DD>/
+TELEMETRY_COLUMNAR_DIR = os.getenv("TELEMETRY_COLUMNAR_DIR", str(Path(TELEMETRY_DATA_DIR) / "_columnar"))
+
+
+def get_columnar_module_dir(module_id: str) -> Path:
+    return Path(TELEMETRY_COLUMNAR_DIR) / f"module={sanitize_segment(module_id)}"
+
+
+def get_columnar_partition_dir(module_id: str, day: str) -> Path:
+    return get_columnar_module_dir(module_id) / f"date={day}"
@@ -0,0 +1,150 @@
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from telemetry_paths import get_columnar_module_dir
+from telemetry_compaction import PARTITION_FILE_NAME, EVENT_SCHEMA
+
+QUERY_MAX_LIMIT = 10000
+
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+# Columns that may be grouped on; "date" is the partition key
+GROUPABLE_COLUMNS = {
+    "date", "session_id", "event_type", "anon_id",
+    "payload_code", "payload_button", "payload_target", "payload_field_id", "payload_device"
+}
+NUMERIC_COLUMNS = {"timestamp", "client_timestamp", "payload_x", "payload_y", "payload_length", "payload_button"}
+
+# Request op -> pyarrow hash aggregation
+AGGREGATIONS = {
+    "min": "min",
+    "max": "max",
+    "mean": "mean",
+    "sum": "sum",
+    "count_distinct": "count_distinct",
+    "percentile": "tdigest"
+}
+
+
+class TelemetryQueryError(ValueError):
+    pass
+
+
+def partition_files(module_id: str, start_date: date | None, end_date: date | None) -> list[str]:
+    """Partition pruning by directory name, so other modules and days are never listed or opened"""
+    module_root = get_columnar_module_dir(module_id)
+    if not module_root.is_dir():
+        return []
+    files = []
+    for partition_dir in module_root.glob("date=*"):
+        day = partition_dir.name[len("date="):]
+        if start_date and day < start_date.isoformat():
+            continue
+        if end_date and day > end_date.isoformat():
+            continue
+        path = partition_dir / PARTITION_FILE_NAME
+        if path.exists():
+            files.append(str(path))
+    return sorted(files)
+
+
+def build_aggregations(aggregations: list[dict]) -> tuple[list[tuple], list[str], set[str]]:
+    """pyarrow aggregation specs, their output names, and the columns they read"""
+    specs, names, columns = [], [], set()
+    for aggregation in aggregations:
+        op = aggregation["op"]
+        column = aggregation.get("column")
+        if op == "count" and not column:
+            specs.append(([], "count_all"))
+            names.append("count")
+            continue
+        if op == "count":
+            specs.append((column, "count"))
+            names.append(f"count_{column}")
+            columns.add(column)
+            continue
+        if op not in AGGREGATIONS:
+            raise TelemetryQueryError(f"Unsupported aggregation: {op}")
+        if column not in EVENT_SCHEMA.names:
+            raise TelemetryQueryError(f"Unknown column: {column}")
+        if op != "count_distinct" and column not in NUMERIC_COLUMNS:
+            raise TelemetryQueryError(f"{op} needs a numeric or time column")
+        if op == "percentile":
+            q = aggregation.get("q")
+            if q is None or not 0 <= q <= 1:
+                raise TelemetryQueryError("percentile needs q between 0 and 1")
+            specs.append((column, "tdigest", pc.TDigestOptions(q=q)))
+            names.append(f"p{round(q * 100, 2):g}_{column}")
+        else:
+            specs.append((column, AGGREGATIONS[op]))
+            names.append(f"{op}_{column}")
+        columns.add(column)
+    return specs, names, columns
+
+
+def run_telemetry_query(query: dict) -> dict:
+    """
+    Filter, group and aggregate compacted telemetry of one module
+    Module and date filters prune partitions; event_type and session filters are pushed
+    into the Parquet scan, and only the columns the query touches are read
+    """
+    group_by = query.get("group_by") or []
+    unknown = [column for column in group_by if column not in GROUPABLE_COLUMNS]
+    if unknown:
+        raise TelemetryQueryError(f"Cannot group by: {', '.join(unknown)}")
+    specs, names, agg_columns = build_aggregations(query.get("aggregations") or [{"op": "count"}])
+    limit = min(max(int(query.get("limit") or 1000), 1), QUERY_MAX_LIMIT)
+
+    files = partition_files(query["module_id"], query.get("start_date"), query.get("end_date"))
+    result = {"module_id": query["module_id"], "partitions_scanned": len(files), "rows_scanned": 0, "rows": []}
+    if not files:
+        return result
+
+    dataset = ds.dataset(
+        files,
+        schema=EVENT_SCHEMA.append(pa.field("date", pa.string())),
+        format="parquet",
+        partitioning=PARTITIONING,
+        partition_base_dir=str(get_columnar_module_dir(query["module_id"]))
+    )
+    predicate = None
+    if query.get("event_types"):
+        predicate = pc.field("event_type").isin(query["event_types"])
+    if query.get("session_ids"):
+        session_predicate = pc.field("session_id").isin(query["session_ids"])
+        predicate = session_predicate if predicate is None else predicate & session_predicate
+
+    read_columns = sorted(set(group_by) | agg_columns) or ["event_type"]
+    table = dataset.to_table(columns=read_columns, filter=predicate)
+    result["rows_scanned"] = table.num_rows
+
+    # Time columns are aggregated as epoch milliseconds so every op (mean, tdigest) applies
+    for index, name in enumerate(table.column_names):
+        if name not in agg_columns:
+            continue
+        if pa.types.is_timestamp(table.schema.field(name).type):
+            table = table.set_column(index, name, table[name].cast(pa.int64()))
+        elif pa.types.is_dictionary(table.schema.field(name).type):
+            table = table.set_column(index, name, table[name].cast(pa.string()))
+
+    aggregated = table.group_by(group_by).aggregate(specs)
+    aliases = iter(names)
+    aggregated = aggregated.rename_columns([
+        column if column in group_by else next(aliases) for column in aggregated.column_names
+    ])
+    # Grouped tdigest yields a one-element list per group
+    for index, name in enumerate(aggregated.column_names):
+        if pa.types.is_fixed_size_list(aggregated.schema.field(name).type):
+            aggregated = aggregated.set_column(index, name, pc.list_element(aggregated[name], 0))
+
+    order_by = query.get("order_by") or names[0]
+    if order_by not in aggregated.column_names:
+        raise TelemetryQueryError(f"Cannot order by: {order_by}")
+    aggregated = aggregated.sort_by([(order_by, "descending" if query.get("descending", True) else "ascending")])
+
+    result["total_groups"] = aggregated.num_rows
+    result["rows"] = aggregated.slice(0, limit).to_pylist()
+    return result
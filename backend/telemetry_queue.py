@@ -0,0 +1,142 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+from database import SessionLocal
+from telemetry_storage import store_telemetry_batches
+
+logger = logging.getLogger(__name__)
+
+# "sync" stores each upload before replying, "queue" hands it to background workers
+TELEMETRY_INGEST_MODE = os.getenv("TELEMETRY_INGEST_MODE", "sync").lower()
+TELEMETRY_QUEUE_MAX_BATCHES = int(os.getenv("TELEMETRY_QUEUE_MAX_BATCHES", "2000"))
+TELEMETRY_QUEUE_WORKERS = int(os.getenv("TELEMETRY_QUEUE_WORKERS", "2"))
+TELEMETRY_QUEUE_GROUP_SIZE = int(os.getenv("TELEMETRY_QUEUE_GROUP_SIZE", "200"))
+TELEMETRY_QUEUE_RETRY_AFTER = int(os.getenv("TELEMETRY_QUEUE_RETRY_AFTER", "5"))
+TELEMETRY_QUEUE_DRAIN_TIMEOUT = float(os.getenv("TELEMETRY_QUEUE_DRAIN_TIMEOUT", "30"))
+
+_STOP = object()
+
+
+class TelemetryQueueFull(Exception):
+    pass
+
+
+class TelemetryIngestQueue:
+    """
+    Bounded in-process write-behind queue for telemetry batches
+    Worker threads drain it in groups so one commit covers many uploads
+    """
+
+    def __init__(self, max_batches: int, workers: int, group_size: int):
+        self.max_batches = max_batches
+        self.workers = max(1, workers)
+        self.group_size = max(1, group_size)
+        self._queue = queue.Queue(maxsize=max_batches)
+        self._threads: list[threading.Thread] = []
+        self._accepting = False
+        # Held across the accepting check and the put, so nothing lands behind the stop tokens
+        self._accepting_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._run,
+                name=f"telemetry-ingest-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        self._accepting = True
+
+    def submit(self, batch: dict) -> None:
+        with self._accepting_lock:
+            if not self._accepting:
+                raise TelemetryQueueFull()
+            try:
+                self._queue.put_nowait(batch)
+            except queue.Full:
+                raise TelemetryQueueFull()
+
+    def stop(self, timeout: float = TELEMETRY_QUEUE_DRAIN_TIMEOUT) -> None:
+        """Stop accepting uploads and let the workers drain what is already queued"""
+        if not self._threads:
+            return
+        with self._accepting_lock:
+            self._accepting = False
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        remaining = self._queue.qsize()
+        if remaining:
+            logger.warning("Telemetry ingest queue stopped with %s batches undrained", remaining)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            group = [item]
+            stop_after = False
+            while len(group) < self.group_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop_after = True
+                    break
+                group.append(item)
+            self._store(group)
+            if stop_after:
+                return
+
+    def _store(self, group: list[dict]) -> None:
+        """
+        Store a group in one transaction; if that fails, retry its batches one by one
+        Every batch was already acknowledged, so one bad upload must not lose the others
+        """
+        db = SessionLocal()
+        try:
+            try:
+                store_telemetry_batches(db, group)
+                return
+            except Exception:
+                db.rollback()
+                if len(group) == 1:
+                    logger.exception("Dropped telemetry batch for session %s", group[0].get("session_id"))
+                    return
+                logger.warning("Failed to store %s telemetry batches together, retrying one by one", len(group), exc_info=True)
+            for batch in group:
+                try:
+                    store_telemetry_batches(db, [batch])
+                except Exception:
+                    db.rollback()
+                    logger.exception("Dropped telemetry batch for session %s", batch.get("session_id"))
+        finally:
+            db.close()
+
+
+ingest_queue = TelemetryIngestQueue(
+    TELEMETRY_QUEUE_MAX_BATCHES,
+    TELEMETRY_QUEUE_WORKERS,
+    TELEMETRY_QUEUE_GROUP_SIZE
+)
+
+
+def queue_mode_enabled() -> bool:
+    return TELEMETRY_INGEST_MODE == "queue"
@@ -0,0 +1,78 @@
+import os
+import json
+import asyncio
+
+from starlette.concurrency import iterate_in_threadpool
+
+from telemetry_paths import get_session_file_path
+from telemetry_hints import HIGH_FREQUENCY_EVENTS
+from telemetry_dictionaries import iter_session_frames
+from telemetry_manifest import session_frames, select_frames, read_frame, iter_frame_records, in_window
+
+# Paced replays compress idle stretches longer than this
+TELEMETRY_REPLAY_MAX_GAP_MS = int(os.getenv("TELEMETRY_REPLAY_MAX_GAP_MS", "2000"))
+
+
+def iter_replay_records(module_id: str, session_id: str, start_ms: int | None = None, end_ms: int | None = None):
+    """
+    Decompressed events of a session in file order, within an optional client time window
+    With a window and a frame index, only frames that can hold matching events are read
+    """
+    file_path = get_session_file_path(module_id, session_id)
+    windowed = start_ms is not None or end_ms is not None
+    frames = session_frames(module_id, session_id) if windowed else []
+    with open(file_path, "rb") as f:
+        if frames:
+            selected, _ = select_frames(frames, start_ms, end_ms, 0)
+            blobs = (
+                read_frame(file_path.parent, f, frame["frame_offset"], frame["frame_size"])
+                for frame in selected
+            )
+        else:
+            blobs = (data for _, _, data in iter_session_frames(file_path))
+        for data in blobs:
+            for record in iter_frame_records(data):
+                if in_window(record, start_ms, end_ms):
+                    yield record
+
+
+def downsample_records(records, rate_hz: float):
+    """
+    Thin pointer_move/touch_move streams to at most rate_hz samples per second each
+    The latest sample of a thinned interval is emitted before the next other event, so the
+    pointer position leading up to a click or key press is preserved; other events pass through
+    """
+    interval_ms = 1000 / rate_hz
+    last_emitted: dict[str, int] = {}
+    pending: dict[str, dict] = {}
+    for record in records:
+        event_type = record.get("event_type")
+        ts = record.get("client_timestamp")
+        if event_type not in HIGH_FREQUENCY_EVENTS or not isinstance(ts, int):
+            yield from sorted(pending.values(), key=lambda held: held["client_timestamp"])
+            pending.clear()
+            yield record
+            continue
+        if event_type in last_emitted and ts - last_emitted[event_type] < interval_ms:
+            pending[event_type] = record
+            continue
+        pending.pop(event_type, None)
+        last_emitted[event_type] = ts
+        yield record
+    yield from sorted(pending.values(), key=lambda held: held["client_timestamp"])
+
+
+async def pace_records(records, speed: float = 1.0, max_gap_ms: int = TELEMETRY_REPLAY_MAX_GAP_MS):
+    """
+    Yield NDJSON lines spaced by their client timestamps, divided by speed
+    Records are read in the threadpool; waiting happens on the event loop, so a long
+    replay holds no worker thread
+    """
+    previous_ts = None
+    async for record in iterate_in_threadpool(records):
+        ts = record.get("client_timestamp")
+        if isinstance(ts, int):
+            if previous_ts is not None and ts > previous_ts:
+                await asyncio.sleep(min(ts - previous_ts, max_gap_ms) / 1000 / speed)
+            previous_ts = ts
+        yield json.dumps(record) + "\n"
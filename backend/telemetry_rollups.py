@@ -0,0 +1,114 @@
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import select, delete, insert, func, case, cast, literal, Date, String
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import ActivityRollup, BehaviorData, User
+
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def owner_key(user_id: int | None, guest_id: str | None) -> str | None:
+    if user_id is not None:
+        return f"u:{user_id}"
+    if guest_id:
+        return f"g:{guest_id}"
+    return None
+
+
+def upsert_rollups(db: Session, rows: list[dict]) -> None:
+    """Add counts to existing (module, owner, day) rows or create them, in one statement"""
+    dialect_insert = UPSERT_DIALECTS[db.get_bind().dialect.name]
+    statement = dialect_insert(ActivityRollup).values(rows)
+    excluded = statement.excluded
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["module_id", "owner_key", "day"],
+        set_={
+            "session_count": ActivityRollup.session_count + excluded.session_count,
+            "event_count": ActivityRollup.event_count + excluded.event_count,
+            "last_active_at": excluded.last_active_at,
+            "organization_id": excluded.organization_id
+        }
+    ))
+
+
+def record_activity_rollups(db: Session, activity: dict[str, dict], new_today: set[str]) -> None:
+    """
+    Fold one stored group of events into today's rollups
+    activity is the per-session summary given to record_session_activity; a session adds to
+    session_count only on its first activity of the day. Events without an owner are not rolled up
+    """
+    now = datetime.now(timezone.utc)
+    rows: dict[tuple[str, str], dict] = {}
+    for session_id, entry in activity.items():
+        key = owner_key(entry["user_id"], entry["guest_id"])
+        if key is None:
+            continue
+        row = rows.setdefault((entry["module_id"], key), {
+            "module_id": entry["module_id"],
+            "day": now.date(),
+            "owner_key": key,
+            "user_id": entry["user_id"],
+            "guest_session_id": entry["guest_id"],
+            "organization_id": entry.get("organization_id"),
+            "session_count": 0,
+            "event_count": 0,
+            "last_active_at": now
+        })
+        row["session_count"] += session_id in new_today
+        row["event_count"] += sum(entry["event_types"].values())
+    if rows:
+        # Sorted so concurrent ingest workers take row locks in the same order
+        upsert_rollups(db, [rows[key] for key in sorted(rows)])
+
+
+def backfill_activity_rollups(db: Session) -> int:
+    """
+    Rebuild every rollup from behavior_data in one grouped scan
+    Run once after deploy; ingest running meanwhile can be counted twice for the current day
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        day = cast(func.timezone("UTC", BehaviorData.timestamp), Date)
+    else:
+        day = func.date(BehaviorData.timestamp)
+    key = case(
+        (BehaviorData.user_id.is_not(None), literal("u:") + cast(BehaviorData.user_id, String)),
+        else_=literal("g:") + BehaviorData.guest_session_id
+    )
+    summary = select(
+        BehaviorData.module_id,
+        day,
+        key,
+        BehaviorData.user_id,
+        BehaviorData.guest_session_id,
+        func.max(User.organization_id),
+        func.count(BehaviorData.session_id.distinct()),
+        func.count(BehaviorData.id),
+        func.max(BehaviorData.timestamp)
+    ).outerjoin(
+        User, User.id == BehaviorData.user_id
+    ).where(
+        (BehaviorData.user_id.is_not(None)) | (BehaviorData.guest_session_id.is_not(None))
+    ).group_by(BehaviorData.module_id, day, key, BehaviorData.user_id, BehaviorData.guest_session_id)
+
+    db.execute(delete(ActivityRollup))
+    result = db.execute(insert(ActivityRollup).from_select([
+        "module_id", "day", "owner_key", "user_id", "guest_session_id", "organization_id",
+        "session_count", "event_count", "last_active_at"
+    ], summary))
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    if sys.argv[1:] == ["backfill"]:
+        session = SessionLocal()
+        try:
+            print(f"Wrote {backfill_activity_rollups(session)} activity rollups")
+        finally:
+            session.close()
+    else:
+        print("usage: python telemetry_rollups.py backfill")
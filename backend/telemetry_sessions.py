@@ -0,0 +1,162 @@
+import sys
+from collections import Counter
+from datetime import date, datetime, timezone
+
+from sqlalchemy import func, select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import TelemetrySession, BehaviorData
+
+
+def get_telemetry_session(db: Session, session_id: str) -> TelemetrySession | None:
+    return db.query(TelemetrySession).filter(TelemetrySession.session_id == session_id).first()
+
+
+def lock_or_create_session(
+    db: Session,
+    session_id: str,
+    module_id: str,
+    user_id: int | None,
+    guest_id: str | None
+) -> TelemetrySession:
+    """Fetch the registry row FOR UPDATE, creating it if the session was never started"""
+    query = db.query(TelemetrySession).filter(TelemetrySession.session_id == session_id)
+    row = query.with_for_update().first()
+    if row:
+        return row
+    try:
+        with db.begin_nested():
+            row = TelemetrySession(
+                session_id=session_id,
+                module_id=module_id,
+                user_id=user_id,
+                guest_session_id=guest_id,
+                event_count=0,
+                event_type_counts={},
+                byte_size=0
+            )
+            db.add(row)
+    except IntegrityError:
+        row = query.with_for_update().first()
+    return row
+
+
+def open_telemetry_session(
+    db: Session,
+    session_id: str,
+    module_id: str,
+    user_id: int | None,
+    guest_id: str | None
+) -> TelemetrySession:
+    row = TelemetrySession(
+        session_id=session_id,
+        module_id=module_id,
+        user_id=user_id,
+        guest_session_id=guest_id,
+        event_count=0,
+        event_type_counts={},
+        byte_size=0
+    )
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+def active_on(value: datetime | None, day: date) -> bool:
+    if value is None:
+        return False
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date() == day
+
+
+def record_session_activity(db: Session, activity: dict[str, dict]) -> set[str]:
+    """
+    Add one stored group of events to the running counters of each session
+    activity maps session_id -> module_id, user_id, guest_id, event_types (Counter), bytes
+    Rows are locked in session_id order so concurrent ingest workers cannot deadlock
+    Returns the sessions whose first activity of the (UTC) day this is
+    """
+    today = datetime.now(timezone.utc).date()
+    new_today = set()
+    for session_id in sorted(activity):
+        entry = activity[session_id]
+        row = lock_or_create_session(db, session_id, entry["module_id"], entry["user_id"], entry["guest_id"])
+        if not active_on(row.last_event_at, today):
+            new_today.add(session_id)
+        counts = Counter(row.event_type_counts or {})
+        counts.update(entry["event_types"])
+        row.event_type_counts = dict(counts)
+        row.event_count = (row.event_count or 0) + sum(entry["event_types"].values())
+        row.byte_size = (row.byte_size or 0) + entry["bytes"]
+        if row.first_event_at is None:
+            row.first_event_at = func.now()
+        row.last_event_at = func.now()
+        # New events must reach columnar storage too, so the session is compacted again
+        row.compacted_at = None
+    return new_today
+
+
+def end_telemetry_session_row(db: Session, row: TelemetrySession) -> None:
+    row.ended_at = func.now()
+    db.commit()
+    db.refresh(row)
+
+
+def backfill_telemetry_sessions(db: Session) -> int:
+    """
+    Create registry rows for sessions that only exist in behavior_data
+    (data recorded before the registry existed); one grouped scan, run once after deploy
+    """
+    registered = select(TelemetrySession.session_id)
+    summary = select(
+        BehaviorData.session_id,
+        func.min(BehaviorData.module_id),
+        func.max(BehaviorData.user_id),
+        func.max(BehaviorData.guest_session_id),
+        func.count(BehaviorData.id),
+        func.min(BehaviorData.timestamp),
+        func.max(BehaviorData.timestamp),
+        func.min(BehaviorData.timestamp),
+        func.max(BehaviorData.timestamp)
+    ).where(
+        BehaviorData.session_id.not_in(registered)
+    ).group_by(BehaviorData.session_id)
+    result = db.execute(insert(TelemetrySession).from_select([
+        "session_id", "module_id", "user_id", "guest_session_id", "event_count",
+        "first_event_at", "last_event_at", "started_at", "ended_at"
+    ], summary))
+    db.commit()
+
+    histograms: dict[str, dict] = {}
+    rows = db.query(
+        BehaviorData.session_id,
+        BehaviorData.event_type,
+        func.count(BehaviorData.id)
+    ).join(
+        TelemetrySession, TelemetrySession.session_id == BehaviorData.session_id
+    ).filter(
+        TelemetrySession.event_type_counts.is_(None)
+    ).group_by(BehaviorData.session_id, BehaviorData.event_type)
+    for session_id, event_type, count in rows:
+        histograms.setdefault(session_id, {})[event_type] = count
+    for session_id, counts in histograms.items():
+        db.query(TelemetrySession).filter(
+            TelemetrySession.session_id == session_id
+        ).update({"event_type_counts": counts, "byte_size": 0}, synchronize_session=False)
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    if sys.argv[1:] == ["backfill"]:
+        session = SessionLocal()
+        try:
+            print(f"Registered {backfill_telemetry_sessions(session)} sessions")
+        finally:
+            session.close()
+    else:
+        print("usage: python telemetry_sessions.py backfill")
@@ -0,0 +1,194 @@
+import os
+import io
+import json
+import time
+from collections import Counter
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import BehaviorData, Module, ModuleWhitelist
+from telemetry_paths import get_session_file_path
+from telemetry_writer import writer_pool
+from telemetry_sessions import record_session_activity
+from telemetry_rollups import record_activity_rollups
+from result_cache import result_cache
+
+_module_organizations_cache: dict[str, tuple[float, frozenset[int]]] = {}
+
+TELEMETRY_USE_COPY = os.getenv("TELEMETRY_USE_COPY", "true").lower() == "true"
+
+# Whitelist changes reach ingest-driven cache refreshes within this long
+MODULE_ORGANIZATIONS_CACHE_SECONDS = 60
+
+BEHAVIOR_DATA_COLUMNS = ("user_id", "guest_session_id", "module_id", "session_id", "event_type", "event_data")
+
+
+def encode_file_records(module_id: str, session_id: str, anonymized_id: str, events: list[dict]) -> bytes:
+    lines = []
+    for event in events:
+        record = {
+            "session_id": session_id,
+            "module_id": module_id,
+            "event_type": event.get("event_type"),
+            "timestamp": event.get("timestamp"),
+            "client_timestamp": event.get("client_timestamp"),
+            "anon_id": anonymized_id,
+            "payload": event.get("payload")
+        }
+        lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+    return "".join(lines).encode("utf-8")
+
+
+def client_time_range(events: list[dict]) -> tuple[int | None, int | None]:
+    stamps = [event["client_timestamp"] for event in events if isinstance(event.get("client_timestamp"), int)]
+    if not stamps:
+        return None, None
+    return min(stamps), max(stamps)
+
+
+def copy_csv_field(value) -> str:
+    """
+    One field of COPY ... CSV input: NULL is an unquoted empty field, so None is written
+    bare and every string is quoted (a quoted "" stays an empty string). csv.writer cannot
+    do this: QUOTE_NONNUMERIC writes None as "" too
+    """
+    if value is None:
+        return ""
+    if isinstance(value, int):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def behavior_rows_csv(rows: list[dict]) -> str:
+    return "".join(
+        ",".join(copy_csv_field(row[column]) for column in BEHAVIOR_DATA_COLUMNS) + "\n"
+        for row in rows
+    )
+
+
+def copy_behavior_rows(db: Session, rows: list[dict]) -> None:
+    buffer = io.StringIO(behavior_rows_csv(rows))
+    dbapi_connection = db.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {BehaviorData.__tablename__} ({', '.join(BEHAVIOR_DATA_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+
+def insert_behavior_rows(db: Session, rows: list[dict]) -> int:
+    """
+    Insert a validated batch of behavior_data rows in one statement
+    Uses COPY on PostgreSQL/psycopg2 and an executemany INSERT elsewhere
+    """
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect
+    if TELEMETRY_USE_COPY and dialect.name == "postgresql" and dialect.driver == "psycopg2":
+        copy_behavior_rows(db, rows)
+    else:
+        db.execute(insert(BehaviorData.__table__), rows)
+    return len(rows)
+
+
+def module_organization_ids(db: Session, module_ids: set[str]) -> set[int]:
+    """Organizations that have any of these modules enabled; only uncached modules are queried"""
+    now = time.monotonic()
+    organization_ids = set()
+    missing = set()
+    for module_id in module_ids:
+        cached = _module_organizations_cache.get(module_id)
+        if cached and now - cached[0] < MODULE_ORGANIZATIONS_CACHE_SECONDS:
+            organization_ids |= cached[1]
+        else:
+            missing.add(module_id)
+    if missing:
+        found = {module_id: set() for module_id in missing}
+        rows = db.query(Module.module_id, ModuleWhitelist.organization_id).join(
+            ModuleWhitelist, ModuleWhitelist.module_id == Module.id
+        ).filter(
+            Module.module_id.in_(missing),
+            ModuleWhitelist.is_enabled == True
+        )
+        for module_id, organization_id in rows:
+            found[module_id].add(organization_id)
+        for module_id, organizations in found.items():
+            _module_organizations_cache[module_id] = (now, frozenset(organizations))
+            organization_ids |= organizations
+    return organization_ids
+
+
+def invalidate_module_organizations(module_id: str) -> None:
+    _module_organizations_cache.pop(module_id, None)
+
+
+def invalidate_module_results(db: Session, module_ids: set[str]) -> None:
+    """
+    Mark cached class results stale for every organization that has these modules enabled
+    Rostered students may belong to another organization, so the ingesting user's is not enough
+    """
+    for organization_id in module_organization_ids(db, module_ids):
+        result_cache.record_change(organization_id)
+
+
+def store_telemetry_batches(db: Session, batches: list[dict]) -> int:
+    """
+    Persist validated telemetry batches to behavior_data and the session files
+    Each batch carries session_id, user_id, guest_id, organization_id, anon_id and its events
+    """
+    rows = []
+    file_events_by_key = {}
+    activity = {}
+    for batch in batches:
+        session_id = batch["session_id"]
+        anonymized_id = batch["anon_id"]
+        for event in batch["events"]:
+            payload_data = dict(event["payload"])
+            payload_data["anon_id"] = anonymized_id
+            rows.append({
+                "user_id": batch["user_id"],
+                "guest_session_id": batch["guest_id"],
+                "module_id": event["module_id"],
+                "session_id": session_id,
+                "event_type": event["event_type"],
+                "event_data": json.dumps(payload_data)
+            })
+            file_key = (event["module_id"], session_id, anonymized_id)
+            file_events_by_key.setdefault(file_key, []).append(event)
+            entry = activity.setdefault(session_id, {
+                "module_id": event["module_id"],
+                "user_id": batch["user_id"],
+                "guest_id": batch["guest_id"],
+                "organization_id": batch.get("organization_id"),
+                "event_types": Counter(),
+                "bytes": 0
+            })
+            entry["event_types"][event["event_type"]] += 1
+
+    file_data = {}
+    for (module_id, sess_id, anonymized_id), events in file_events_by_key.items():
+        data = encode_file_records(module_id, sess_id, anonymized_id, events)
+        entry = file_data.setdefault((module_id, sess_id), {"data": b"", "events": []})
+        entry["data"] += data
+        entry["events"].extend(events)
+        activity[sess_id]["bytes"] += len(data)
+
+    saved = insert_behavior_rows(db, rows)
+    new_today = record_session_activity(db, activity)
+    record_activity_rollups(db, activity, new_today)
+    db.commit()
+    invalidate_module_results(db, {entry["module_id"] for entry in activity.values()})
+
+    for (module_id, sess_id), entry in file_data.items():
+        first_ts, last_ts = client_time_range(entry["events"])
+        try:
+            writer_pool.write(
+                (module_id, sess_id), get_session_file_path(module_id, sess_id), entry["data"],
+                len(entry["events"]), first_ts, last_ts
+            )
+        except Exception:
+            pass
+
+    return saved
@@ -0,0 +1,157 @@
+"""
+Decoding for telemetry uploads
+
+Besides the JSON TelemetryEventBatch, /api/telemetry/events accepts a compact
+batch as MessagePack (application/msgpack) or CBOR (application/cbor):
+
+    {
+        "session_id": "...",
+        "module_id": "...",                 # shared by every event unless overridden
+        "events": [
+            {"event_type": "key_down", "payload": {...}, "client_timestamp": 1700000000000}
+        ],
+        "streams": [                        # columnar coordinate streams
+            {
+                "event_type": "pointer_move",
+                "client_timestamp": [1700000000000, 1700000000016],
+                "columns": {"x": [10, 12], "y": [40, 41]}
+            }
+        ]
+    }
+
+"timestamp" may be omitted on compact events; it is derived from client_timestamp.
+Payloads and stream columns may only hold JSON values with string keys, and
+client_timestamp must be epoch milliseconds between 1970 and 2100.
+"""
+import math
+from datetime import datetime
+from functools import lru_cache
+from itertools import repeat
+
+import cbor2
+import msgpack
+
+MSGPACK_CONTENT_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+CBOR_CONTENT_TYPES = {"application/cbor"}
+COMPACT_CONTENT_TYPES = MSGPACK_CONTENT_TYPES | CBOR_CONTENT_TYPES
+MAX_CLIENT_TIMESTAMP_MS = 4102444800000  # 2100-01-01
+MAX_PAYLOAD_DEPTH = 16
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def media_type(content_type: str | None) -> str:
+    return (content_type or "application/json").split(";", 1)[0].strip().lower()
+
+
+@lru_cache(maxsize=4096)
+def utc_second_iso(second: int) -> str:
+    return datetime.utcfromtimestamp(second).isoformat()
+
+
+def client_ms_to_iso(client_timestamp: int) -> str:
+    # Stream samples mostly share a second, so only the millisecond part is formatted per event
+    second, millis = divmod(client_timestamp, 1000)
+    return f"{utc_second_iso(second)}.{millis:03d}Z"
+
+
+def load_compact(body: bytes, content_type: str) -> dict:
+    try:
+        if content_type in MSGPACK_CONTENT_TYPES:
+            data = msgpack.unpackb(body, raw=False, strict_map_key=False)
+        else:
+            data = cbor2.loads(body)
+    except Exception as exc:
+        raise WireFormatError(f"Could not decode {content_type} body") from exc
+    if not isinstance(data, dict):
+        raise WireFormatError("Telemetry batch must be a map")
+    return data
+
+
+def require(value, expected_type, field: str):
+    if not isinstance(value, expected_type) or isinstance(value, bool) and expected_type is int:
+        raise WireFormatError(f"Invalid or missing field: {field}")
+    return value
+
+
+def require_client_timestamp(value, field: str) -> int:
+    require(value, int, field)
+    if not 0 <= value <= MAX_CLIENT_TIMESTAMP_MS:
+        raise WireFormatError(f"{field} is out of range")
+    return value
+
+
+def require_json(value, field: str, depth: int = 0):
+    """
+    Reject values json.dumps cannot store as JSON: bytes, non-string keys, NaN, tags
+    """
+    if value is None or isinstance(value, (str, int)):
+        return value
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise WireFormatError(f"{field} must not contain NaN or infinity")
+        return value
+    if depth >= MAX_PAYLOAD_DEPTH:
+        raise WireFormatError(f"{field} is nested too deeply")
+    if isinstance(value, list):
+        for item in value:
+            require_json(item, field, depth + 1)
+        return value
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise WireFormatError(f"{field} keys must be strings")
+            require_json(item, field, depth + 1)
+        return value
+    raise WireFormatError(f"{field} must contain only JSON values")
+
+
+def decode_compact_batch(body: bytes, content_type: str) -> tuple[str, list[dict]]:
+    """
+    Expand a compact batch into the event dicts ingest stores
+    Fields are type-checked here, so no pydantic model is built per event
+    """
+    data = load_compact(body, content_type)
+    session_id = require(data.get("session_id"), str, "session_id")
+    shared_module_id = data.get("module_id")
+
+    events = []
+    for index, item in enumerate(data.get("events") or []):
+        if not isinstance(item, dict):
+            raise WireFormatError(f"events[{index}] must be a map")
+        client_timestamp = require_client_timestamp(item.get("client_timestamp"), f"events[{index}].client_timestamp")
+        timestamp = item.get("timestamp") or client_ms_to_iso(client_timestamp)
+        events.append(dict(
+            module_id=require(item.get("module_id", shared_module_id), str, f"events[{index}].module_id"),
+            event_type=require(item.get("event_type"), str, f"events[{index}].event_type"),
+            payload=require_json(require(item.get("payload", {}), dict, f"events[{index}].payload"), f"events[{index}].payload"),
+            timestamp=require(timestamp, str, f"events[{index}].timestamp"),
+            client_timestamp=client_timestamp
+        ))
+
+    for index, stream in enumerate(data.get("streams") or []):
+        if not isinstance(stream, dict):
+            raise WireFormatError(f"streams[{index}] must be a map")
+        event_type = require(stream.get("event_type"), str, f"streams[{index}].event_type")
+        module_id = require(stream.get("module_id", shared_module_id), str, f"streams[{index}].module_id")
+        timestamps = require(stream.get("client_timestamp"), list, f"streams[{index}].client_timestamp")
+        columns = require_json(require(stream.get("columns", {}), dict, f"streams[{index}].columns"), f"streams[{index}].columns")
+        for name, values in columns.items():
+            if not isinstance(values, list) or len(values) != len(timestamps):
+                raise WireFormatError(f"streams[{index}].columns.{name} must match client_timestamp length")
+        names = list(columns)
+        for client_timestamp in timestamps:
+            require_client_timestamp(client_timestamp, f"streams[{index}].client_timestamp")
+        samples = zip(*columns.values()) if names else repeat(())
+        for client_timestamp, values in zip(timestamps, samples):
+            events.append(dict(
+                module_id=module_id,
+                event_type=event_type,
+                payload=dict(zip(names, values)),
+                timestamp=client_ms_to_iso(client_timestamp),
+                client_timestamp=client_timestamp
+            ))
+
+    return session_id, events
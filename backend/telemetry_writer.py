@@ -0,0 +1,218 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from telemetry_dictionaries import get_compressor
+from telemetry_manifest import record_frame
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_WRITER_FLUSH_BYTES = int(os.getenv("TELEMETRY_WRITER_FLUSH_BYTES", str(256 * 1024)))
+TELEMETRY_WRITER_FLUSH_SECONDS = float(os.getenv("TELEMETRY_WRITER_FLUSH_SECONDS", "15"))
+TELEMETRY_WRITER_IDLE_SECONDS = float(os.getenv("TELEMETRY_WRITER_IDLE_SECONDS", "120"))
+TELEMETRY_WRITER_MAX_OPEN = int(os.getenv("TELEMETRY_WRITER_MAX_OPEN", "256"))
+TELEMETRY_WRITER_LEVEL = int(os.getenv("TELEMETRY_WRITER_LEVEL", "3"))
+
+OPEN_FLAGS = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+
+
+class SessionFileWriter:
+    """
+    Long-lived append handle for one session file
+    Buffered lines are compressed into a single zstd frame per flush and written
+    with one append, so several worker processes can share a session file
+    flush and close return the frame's offset, size and time range for record_frames
+    Callers hold its lock around append, flush and close; the pool lock only guards the
+    pool's map, so sessions compress and write in parallel
+    """
+
+    def __init__(self, module_id: str, session_id: str, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.module_id = module_id
+        self.session_id = session_id
+        self.path = path
+        self.fd = os.open(path, OPEN_FLAGS, 0o644)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.pending = bytearray()
+        self.pending_since: float | None = None
+        self.pending_events = 0
+        self.pending_first_ts: int | None = None
+        self.pending_last_ts: int | None = None
+        self.last_used = time.monotonic()
+
+    def append(self, data: bytes, now: float, event_count: int, first_ts: int | None, last_ts: int | None) -> None:
+        if not self.pending:
+            self.pending_since = now
+        self.pending += data
+        self.pending_events += event_count
+        if first_ts is not None:
+            self.pending_first_ts = first_ts if self.pending_first_ts is None else min(self.pending_first_ts, first_ts)
+        if last_ts is not None:
+            self.pending_last_ts = last_ts if self.pending_last_ts is None else max(self.pending_last_ts, last_ts)
+        self.last_used = now
+
+    def flush_due(self, now: float) -> bool:
+        if not self.pending:
+            return False
+        if len(self.pending) >= TELEMETRY_WRITER_FLUSH_BYTES:
+            return True
+        return now - self.pending_since >= TELEMETRY_WRITER_FLUSH_SECONDS
+
+    def flush(self) -> tuple | None:
+        if not self.pending:
+            return None
+        compressor = get_compressor(self.module_id, TELEMETRY_WRITER_LEVEL)
+        frame = compressor.compress(bytes(self.pending))
+        remaining = memoryview(frame)
+        frame_offset = None
+        while remaining:
+            written = os.write(self.fd, remaining)
+            if frame_offset is None:
+                # With O_APPEND this descriptor's offset ends at our write, even if other
+                # processes append to the same file concurrently
+                frame_offset = os.lseek(self.fd, 0, os.SEEK_CUR) - written
+            remaining = remaining[written:]
+        events, first_ts, last_ts = self.pending_events, self.pending_first_ts, self.pending_last_ts
+        self.pending.clear()
+        self.pending_since = None
+        self.pending_events = 0
+        self.pending_first_ts = self.pending_last_ts = None
+        return (self.module_id, self.session_id, self.path.name, frame_offset, len(frame), events, first_ts, last_ts)
+
+    def close(self) -> tuple | None:
+        self.closed = True
+        try:
+            return self.flush()
+        finally:
+            os.close(self.fd)
+
+
+def record_frames(frames: list[tuple]) -> None:
+    """Add flushed frames to their module manifests; called without any writer lock held"""
+    for frame in frames:
+        try:
+            record_frame(*frame)
+        except Exception:
+            logger.exception("Failed to update telemetry manifest for session %s", frame[1])
+
+
+class SessionWriterPool:
+    """
+    Writers keyed by (module_id, session_id), flushed on a size or age threshold
+    and closed when idle, ended, or evicted (LRU) to respect the open file cap
+    """
+
+    def __init__(self, max_open: int = TELEMETRY_WRITER_MAX_OPEN):
+        self.max_open = max(1, max_open)
+        self._writers: OrderedDict[tuple[str, str], SessionFileWriter] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def write(
+        self,
+        key: tuple[str, str],
+        path: Path,
+        data: bytes,
+        event_count: int = 0,
+        first_ts: int | None = None,
+        last_ts: int | None = None
+    ) -> None:
+        now = time.monotonic()
+        frames = []
+        while True:
+            with self._lock:
+                writer, evicted = self._writer_for(key, path)
+            frames.extend(map(self._close_writer, evicted))
+            with writer.lock:
+                # Closed after the lookup (evicted, idle or ended); look it up again
+                if writer.closed:
+                    continue
+                writer.append(data, now, event_count, first_ts, last_ts)
+                if writer.flush_due(now):
+                    frames.append(writer.flush())
+                break
+        record_frames([frame for frame in frames if frame])
+
+    def flush_due(self) -> None:
+        now = time.monotonic()
+        frames = []
+        with self._lock:
+            idle = [key for key, writer in self._writers.items() if now - writer.last_used >= TELEMETRY_WRITER_IDLE_SECONDS]
+            closing = [self._writers.pop(key) for key in idle]
+            open_writers = list(self._writers.values())
+        frames.extend(self._close_writer(writer) for writer in closing)
+        for writer in open_writers:
+            with writer.lock:
+                if not writer.closed and writer.flush_due(now):
+                    frames.append(writer.flush())
+        record_frames([frame for frame in frames if frame])
+
+    def close_session(self, session_id: str, module_id: str | None = None) -> None:
+        with self._lock:
+            closing = [
+                self._writers.pop(key)
+                for key in [k for k in self._writers if k[1] == session_id and module_id in (None, k[0])]
+            ]
+        record_frames([frame for frame in map(self._close_writer, closing) if frame])
+
+    def close_all(self) -> None:
+        with self._lock:
+            closing = list(self._writers.values())
+            self._writers.clear()
+        record_frames([frame for frame in map(self._close_writer, closing) if frame])
+
+    def start(self, interval: float = 1.0) -> None:
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(interval,),
+            name="telemetry-writer-flush",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.close_all()
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.flush_due()
+            except Exception:
+                logger.exception("Failed to flush telemetry writers")
+
+    def _writer_for(self, key: tuple[str, str], path: Path) -> tuple[SessionFileWriter, list[SessionFileWriter]]:
+        """The writer for key, opened if needed, and the writers evicted to make room; pool lock held"""
+        writer = self._writers.get(key)
+        if writer is not None:
+            self._writers.move_to_end(key)
+            return writer, []
+        evicted = []
+        while len(self._writers) >= self.max_open:
+            evicted.append(self._writers.popitem(last=False)[1])
+        writer = SessionFileWriter(key[0], key[1], path)
+        self._writers[key] = writer
+        return writer, evicted
+
+    def _close_writer(self, writer: SessionFileWriter) -> tuple | None:
+        """Flush and close a writer already removed from the pool; pool lock not held"""
+        try:
+            with writer.lock:
+                return writer.close()
+        except Exception:
+            logger.exception("Failed to close telemetry writer for %s", writer.path)
+            return None
+
+
+writer_pool = SessionWriterPool()
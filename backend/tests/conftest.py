@@ -0,0 +1,142 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+TEST_DATA_DIR = Path(tempfile.mkdtemp(prefix="ping-tests-"))
+
+# Settings are read at import time, so they are set before any backend module is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DATA_DIR / 'test.db'}"
+os.environ["TELEMETRY_DATA_DIR"] = str(TEST_DATA_DIR / "telemetry")
+os.environ["RESULT_CACHE_ENABLED"] = "false"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from alembic import command
+from alembic.config import Config
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from auth import create_access_token
+from database import Base, SessionLocal, engine
+from models import ActivityRollup, Class, ClassStudent, Module, ModuleWhitelist, Organization, User, UserRole
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    command.upgrade(config, "head")
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+
+@pytest.fixture
+def client():
+    import main
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def make_user(db):
+    def create(role: UserRole = UserRole.STUDENT, organization_id: int | None = None, name: str | None = None) -> User:
+        name = name or f"user{db.query(User).count() + 1}"
+        user = User(
+            email=f"{name}@example.com",
+            username=name,
+            full_name=name,
+            role=role,
+            is_active=True,
+            organization_id=organization_id
+        )
+        db.add(user)
+        db.commit()
+        return user
+    return create
+
+
+@pytest.fixture
+def make_class(db, make_user):
+    """A teacher's class of student_count rostered students, each with a day of module activity"""
+    def create(student_count: int) -> tuple[Class, User]:
+        organization = Organization(name=f"org{db.query(Organization).count() + 1}")
+        db.add(organization)
+        db.flush()
+        module = db.query(Module).filter(Module.module_id == "roster-module").first()
+        if module is None:
+            module = Module(module_id="roster-module", title="Roster module", subject="physics", is_published=True)
+            db.add(module)
+            db.flush()
+        db.add(ModuleWhitelist(organization_id=organization.id, module_id=module.id, is_enabled=True))
+        teacher = make_user(UserRole.TEACHER, organization.id)
+        class_obj = Class(
+            name="Roster class",
+            join_code=f"CODE-{organization.id:04d}",
+            teacher_id=teacher.id,
+            organization_id=organization.id
+        )
+        db.add(class_obj)
+        db.flush()
+        for index in range(student_count):
+            student = make_user(UserRole.STUDENT, organization.id)
+            db.add(ClassStudent(class_id=class_obj.id, user_id=student.id))
+            db.add(ActivityRollup(
+                module_id=module.module_id,
+                day=date(2026, 1, 1),
+                owner_key=f"u:{student.id}",
+                user_id=student.id,
+                organization_id=organization.id,
+                session_count=1,
+                event_count=index + 1,
+                last_active_at=datetime(2026, 1, 1, tzinfo=timezone.utc)
+            ))
+        db.commit()
+        return class_obj, teacher
+    return create
+
+
+@pytest.fixture
+def auth_headers():
+    def headers(user: User) -> dict:
+        return {"Authorization": f"Bearer {create_access_token({'sub': user.email, 'user_id': user.id})}"}
+    return headers
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_statements():
+    """Context manager recording every SQL statement sent through the engine"""
+    @contextmanager
+    def counting():
+        counter = StatementCounter()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+    return counting
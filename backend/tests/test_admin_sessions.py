@@ -0,0 +1,30 @@
+"""
+Admin session listing reports session files that the module manifest does not index
+"""
+from datetime import datetime, timezone
+
+from models import TelemetrySession, UserRole
+from telemetry_paths import get_session_file_path
+
+
+def test_session_listing_stats_files_without_manifest(db, client, make_user, auth_headers):
+    db.add(TelemetrySession(
+        session_id="unindexed-session",
+        module_id="unindexed-module",
+        event_count=1,
+        last_event_at=datetime.now(timezone.utc)
+    ))
+    db.commit()
+    file_path = get_session_file_path("unindexed-module", "unindexed-session")
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(b"frame")
+
+    response = client.get(
+        "/api/admin/telemetry/sessions",
+        params={"module_id": "unindexed-module"},
+        headers=auth_headers(make_user(UserRole.PLATFORM_ADMIN))
+    )
+    assert response.status_code == 200
+    [session] = response.json()["sessions"]
+    assert session["file_exists"] is True
+    assert session["file_size"] == 5
@@ -0,0 +1,117 @@
+"""
+Load test: /api/auth/me p99 latency while telemetry ingestion saturates the worker
+Ingest decodes and stores batches on the threadpool, so the event loop keeps accepting
+requests; the remaining slowdown is the single worker's CPU being shared. Runs a real
+uvicorn server; LOAD_TEST_P99_MS sets the budget.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import subprocess
+from pathlib import Path
+
+import httpx
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+LOAD_SECONDS = float(os.getenv("LOAD_TEST_SECONDS", "3"))
+INGEST_CLIENTS = int(os.getenv("LOAD_TEST_INGEST_CLIENTS", "4"))
+P99_BUDGET_SECONDS = float(os.getenv("LOAD_TEST_P99_MS", "250")) / 1000
+EVENTS_PER_BATCH = 200
+PROBE_REQUESTS = 200
+
+
+@pytest.fixture
+def live_server(db):
+    """The app in its own uvicorn process, so load generation here does not share its GIL"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy()
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            httpx.get(f"{base_url}/docs", timeout=1)
+            break
+        except httpx.TransportError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                pytest.fail("uvicorn did not start")
+            time.sleep(0.1)
+    yield base_url
+    server.terminate()
+    server.wait(timeout=30)
+
+
+def p99(samples: list[float]) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def probe_me(base_url: str, headers: dict) -> list[float]:
+    latencies = []
+    with httpx.Client(base_url=base_url, headers=headers) as http:
+        for _ in range(PROBE_REQUESTS):
+            start = time.perf_counter()
+            response = http.get("/api/auth/me")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+    return latencies
+
+
+def ingest_until(base_url: str, headers: dict, stop: threading.Event, stored: list[int]) -> None:
+    with httpx.Client(base_url=base_url, headers=headers, timeout=30) as http:
+        session_id = http.post("/api/telemetry/session/start", json={"module_id": "load-test"}).json()["session_id"]
+        body = json.dumps({
+            "session_id": session_id,
+            "events": [
+                {
+                    "session_id": session_id,
+                    "module_id": "load-test",
+                    "event_type": "pointer_move",
+                    "payload": {"x": index, "y": index},
+                    "timestamp": "2026-01-01T00:00:00Z",
+                    "client_timestamp": 1767225600000 + index
+                }
+                for index in range(EVENTS_PER_BATCH)
+            ]
+        }).encode()
+        while not stop.is_set():
+            response = http.post("/api/telemetry/events", content=body, headers={"Content-Type": "application/json"})
+            if response.status_code < 300:
+                stored.append(EVENTS_PER_BATCH)
+
+
+def test_auth_me_p99_under_ingest(live_server, make_user, auth_headers):
+    headers = auth_headers(make_user())
+    probe_me(live_server, headers)
+    idle = probe_me(live_server, headers)
+
+    stop = threading.Event()
+    stored: list[int] = []
+    ingesters = [
+        threading.Thread(target=ingest_until, args=(live_server, headers, stop, stored))
+        for _ in range(INGEST_CLIENTS)
+    ]
+    for thread in ingesters:
+        thread.start()
+    time.sleep(0.5)
+    loaded = probe_me(live_server, headers)
+    time.sleep(max(0.0, LOAD_SECONDS - 0.5))
+    stop.set()
+    for thread in ingesters:
+        thread.join()
+
+    print(f"\n/api/auth/me p99 idle {p99(idle) * 1000:.1f} ms, under ingest {p99(loaded) * 1000:.1f} ms "
+          f"({sum(stored) / LOAD_SECONDS:,.0f} events/s from {INGEST_CLIENTS} clients)")
+    assert stored
+    assert p99(loaded) < P99_BUDGET_SECONDS
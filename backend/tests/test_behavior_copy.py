@@ -0,0 +1,65 @@
+"""
+COPY input for behavior_data: None must reach PostgreSQL as NULL, not as an empty string.
+The round trip through COPY runs when BENCHMARK_POSTGRES_URL points at a scratch database.
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import BehaviorData
+from telemetry_storage import behavior_rows_csv, insert_behavior_rows
+
+BENCHMARK_POSTGRES_URL = os.getenv("BENCHMARK_POSTGRES_URL")
+
+ROWS = [
+    {
+        "user_id": None,
+        "guest_session_id": "guest-1",
+        "module_id": "m",
+        "session_id": "s1",
+        "event_type": "click",
+        "event_data": '{"label": "a, \\"b\\""}'
+    },
+    {
+        "user_id": 7,
+        "guest_session_id": None,
+        "module_id": "m",
+        "session_id": "s2",
+        "event_type": "click",
+        "event_data": ""
+    }
+]
+
+
+def test_copy_csv_writes_none_as_unquoted_empty_field():
+    assert behavior_rows_csv(ROWS).splitlines() == [
+        ',"guest-1","m","s1","click","{""label"": ""a, \\""b\\""""}"',
+        '7,,"m","s2","click",""'
+    ]
+
+
+def test_copy_stores_none_as_null():
+    if not BENCHMARK_POSTGRES_URL:
+        pytest.skip("BENCHMARK_POSTGRES_URL is not set")
+    engine = create_engine(BENCHMARK_POSTGRES_URL)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        db.query(BehaviorData).filter(BehaviorData.module_id == "m").delete()
+        insert_behavior_rows(db, ROWS)
+        db.commit()
+        stored = {
+            row.session_id: row
+            for row in db.query(BehaviorData).filter(BehaviorData.module_id == "m")
+        }
+        assert stored["s1"].user_id is None
+        assert stored["s1"].event_data == ROWS[0]["event_data"]
+        assert stored["s2"].guest_session_id is None
+        assert stored["s2"].event_data == ""
+        db.query(BehaviorData).filter(BehaviorData.module_id == "m").delete()
+        db.commit()
+    finally:
+        db.close()
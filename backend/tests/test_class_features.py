@@ -0,0 +1,31 @@
+"""
+Class session features only cover the class roster
+"""
+from models import ClassStudent, SessionFeature, UserRole
+
+
+def add_features(db, user_id: int, session_id: str) -> None:
+    db.add(SessionFeature(
+        session_id=session_id,
+        module_id="roster-module",
+        user_id=user_id,
+        features={"pointer_path_px": 1.0},
+        feature_version=1
+    ))
+    db.commit()
+
+
+def test_class_features_exclude_students_outside_the_roster(db, client, make_class, make_user, auth_headers):
+    class_obj, teacher = make_class(1)
+    student_id = db.query(ClassStudent.user_id).filter(ClassStudent.class_id == class_obj.id).scalar()
+    outsider = make_user(UserRole.STUDENT, class_obj.organization_id)
+    add_features(db, student_id, "rostered-session")
+    add_features(db, outsider.id, "outsider-session")
+    headers = auth_headers(teacher)
+
+    response = client.get(f"/api/classes/{class_obj.id}/features", headers=headers)
+    assert response.status_code == 200
+    assert [row["session_id"] for row in response.json()] == ["rostered-session"]
+
+    response = client.get(f"/api/classes/{class_obj.id}/features", params={"user_id": outsider.id}, headers=headers)
+    assert response.status_code == 404
@@ -0,0 +1,32 @@
+"""
+Class statistics are a fixed number of grouped queries however many students a class has
+"""
+import pytest
+
+
+def statements_for(client, count_statements, headers: dict, path: str) -> int:
+    with count_statements() as counter:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize("suffix", ["/students", ""])
+def test_class_statistics_query_count_is_constant(db, client, make_class, auth_headers, count_statements, suffix):
+    counts = {}
+    for student_count in (2, 40):
+        class_obj, teacher = make_class(student_count)
+        path = f"/api/classes/{class_obj.id}{suffix}"
+        headers = auth_headers(teacher)
+        counts[student_count] = statements_for(client, count_statements, headers, path)
+
+    assert counts[2] == counts[40], counts
+
+
+def test_class_students_reports_roster_totals(db, client, make_class, auth_headers):
+    class_obj, teacher = make_class(3)
+    response = client.get(f"/api/classes/{class_obj.id}/students", headers=auth_headers(teacher))
+    assert response.status_code == 200
+    students = response.json()
+    assert [student["total_events"] for student in students] == [1, 2, 3]
+    assert all(student["total_sessions"] == 1 for student in students)
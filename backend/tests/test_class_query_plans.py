@@ -0,0 +1,25 @@
+"""
+Roster statistics reach every table through an index, so their cost follows class size
+"""
+from sqlalchemy import text
+
+from database import engine
+from routers.class_router import get_class_module_ids, roster_activity
+
+
+def query_plan(db, query) -> list[str]:
+    statement = query.statement.compile(engine, compile_kwargs={"literal_binds": True})
+    return [row[3] for row in db.execute(text(f"EXPLAIN QUERY PLAN {statement}"))]
+
+
+def test_roster_activity_uses_index_searches(db, make_class):
+    class_obj, _ = make_class(20)
+    plan = query_plan(db, roster_activity(db, class_obj.id, get_class_module_ids(db, class_obj)))
+
+    for table, index in [
+        ("class_students", "class_id=?"),
+        ("users", "rowid=?"),
+        ("activity_rollups", "ix_activity_rollups_user_module (user_id=? AND module_id=?)")
+    ]:
+        assert any(step.startswith(f"SEARCH {table} ") and index in step for step in plan), plan
+    assert not any(step.startswith("SCAN ") for step in plan), plan
@@ -0,0 +1,82 @@
+"""
+Events/second per worker for the behavior_data write path: one ORM object per event,
+as uploads used to store them, against insert_behavior_rows (executemany INSERT, or
+COPY on PostgreSQL). Runs on the test SQLite database, and on PostgreSQL as well when
+BENCHMARK_POSTGRES_URL points at a scratch database. Run with -s to see the rates.
+"""
+import os
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, SessionLocal
+from models import BehaviorData
+from telemetry_storage import insert_behavior_rows
+
+BENCHMARK_EVENTS = int(os.getenv("BENCHMARK_EVENTS", "5000"))
+BATCH_SIZE = 500
+BENCHMARK_POSTGRES_URL = os.getenv("BENCHMARK_POSTGRES_URL")
+
+
+def build_batches() -> list[list[dict]]:
+    rows = [
+        {
+            "user_id": None,
+            "guest_session_id": "guest-benchmark",
+            "module_id": "benchmark",
+            "session_id": f"session-{index // BATCH_SIZE}",
+            "event_type": "pointer_move",
+            "event_data": json.dumps({"x": index % 800, "y": index % 600, "anon_id": "anon"})
+        }
+        for index in range(BENCHMARK_EVENTS)
+    ]
+    return [rows[start:start + BATCH_SIZE] for start in range(0, len(rows), BATCH_SIZE)]
+
+
+def store_with_orm(db, batch: list[dict]) -> None:
+    for row in batch:
+        db.add(BehaviorData(**row))
+    db.commit()
+
+
+def store_in_bulk(db, batch: list[dict]) -> None:
+    insert_behavior_rows(db, batch)
+    db.commit()
+
+
+def events_per_second(session_factory, store, batches: list[list[dict]]) -> float:
+    db = session_factory()
+    try:
+        start = time.perf_counter()
+        for batch in batches:
+            store(db, batch)
+        elapsed = time.perf_counter() - start
+        db.query(BehaviorData).delete()
+        db.commit()
+    finally:
+        db.close()
+    return sum(len(batch) for batch in batches) / elapsed
+
+
+def postgres_session_factory():
+    if not BENCHMARK_POSTGRES_URL:
+        pytest.skip("BENCHMARK_POSTGRES_URL is not set")
+    engine = create_engine(BENCHMARK_POSTGRES_URL)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "postgresql"])
+def test_bulk_insert_outpaces_per_event_orm(db, dialect):
+    session_factory = SessionLocal if dialect == "sqlite" else postgres_session_factory()
+    batches = build_batches()
+
+    orm_rate = events_per_second(session_factory, store_with_orm, batches)
+    bulk_rate = events_per_second(session_factory, store_in_bulk, batches)
+
+    print(f"\n{dialect}: per-event ORM {orm_rate:,.0f} events/s, bulk {bulk_rate:,.0f} events/s "
+          f"({bulk_rate / orm_rate:.1f}x, {BATCH_SIZE}-event batches)")
+    assert bulk_rate > orm_rate
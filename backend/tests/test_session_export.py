@@ -0,0 +1,45 @@
+"""
+Module exports select sessions by server event time, whether or not the manifest indexes them
+"""
+from datetime import datetime, timezone
+
+from models import TelemetrySession
+from telemetry_export import iter_module_session_files
+from telemetry_manifest import record_frame
+from telemetry_paths import get_session_file_path
+
+MODULE_ID = "export-module"
+LAST_EVENT_AT = datetime(2026, 1, 2, 12, 0, tzinfo=timezone.utc)
+# Client clocks can be far off the server's; the manifest records client time
+SKEWED_CLIENT_MS = int(datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def add_session(db, session_id: str, indexed: bool) -> None:
+    db.add(TelemetrySession(
+        session_id=session_id,
+        module_id=MODULE_ID,
+        event_count=1,
+        first_event_at=LAST_EVENT_AT,
+        last_event_at=LAST_EVENT_AT
+    ))
+    db.commit()
+    file_path = get_session_file_path(MODULE_ID, session_id)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(b"frame")
+    if indexed:
+        record_frame(MODULE_ID, session_id, file_path.name, 0, 5, 1, SKEWED_CLIENT_MS, SKEWED_CLIENT_MS)
+
+
+def exported(start_dt, end_dt) -> list[str]:
+    return sorted(path.name for path, _ in iter_module_session_files(MODULE_ID, start_dt, end_dt))
+
+
+def test_export_filters_indexed_and_unindexed_sessions_alike(db):
+    add_session(db, "indexed-session", indexed=True)
+    add_session(db, "unindexed-session", indexed=False)
+    names = sorted(get_session_file_path(MODULE_ID, sid).name for sid in ("indexed-session", "unindexed-session"))
+
+    assert exported(datetime(2026, 1, 2), datetime(2026, 1, 2, 23, 59)) == names
+    assert exported(datetime(2026, 1, 2, 11, 59, tzinfo=timezone.utc), None) == names
+    assert exported(datetime(2026, 1, 2, 12, 1), None) == []
+    assert exported(None, datetime(2026, 1, 2, 11, 59)) == []
@@ -0,0 +1,127 @@
+"""
+Compact telemetry batches: rejection of values that cannot be stored, and the parse-cost
+benchmark against the JSON TelemetryEventBatch path (body to event dicts, as ingest
+receives them). The timing comparison runs when BENCHMARK_PARSE is set; run with -s to
+see the timings.
+"""
+import os
+import json
+import time
+
+import cbor2
+import msgpack
+import pytest
+
+from routers.telemetry_router import decode_event_batch
+from telemetry_wire import MAX_CLIENT_TIMESTAMP_MS, WireFormatError, decode_compact_batch
+
+BENCHMARK_EVENTS = int(os.getenv("BENCHMARK_EVENTS", "2000"))
+BENCHMARK_ROUNDS = 20
+BENCHMARK_PARSE = os.getenv("BENCHMARK_PARSE")
+START_MS = 1767225600000
+
+
+def json_batch(count: int) -> bytes:
+    return json.dumps({
+        "session_id": "benchmark",
+        "events": [
+            {
+                "session_id": "benchmark",
+                "module_id": "benchmark",
+                "event_type": "pointer_move",
+                "payload": {"x": index % 800, "y": index % 600},
+                "timestamp": "2026-01-01T00:00:00.000Z",
+                "client_timestamp": START_MS + index * 16
+            }
+            for index in range(count)
+        ]
+    }).encode()
+
+
+def compact_batch(count: int) -> dict:
+    return {
+        "session_id": "benchmark",
+        "module_id": "benchmark",
+        "streams": [{
+            "event_type": "pointer_move",
+            "client_timestamp": [START_MS + index * 16 for index in range(count)],
+            "columns": {
+                "x": [index % 800 for index in range(count)],
+                "y": [index % 600 for index in range(count)]
+            }
+        }]
+    }
+
+
+def seconds_per_batch(parse, body: bytes) -> float:
+    parse(body)
+    start = time.perf_counter()
+    for _ in range(BENCHMARK_ROUNDS):
+        parse(body)
+    return (time.perf_counter() - start) / BENCHMARK_ROUNDS
+
+
+def compact_bodies(count: int) -> dict[str, bytes]:
+    return {
+        "application/msgpack": msgpack.packb(compact_batch(count)),
+        "application/cbor": cbor2.dumps(compact_batch(count))
+    }
+
+
+def test_compact_batches_decode_and_are_smaller_than_json():
+    json_body = json_batch(BENCHMARK_EVENTS)
+    for content_type, body in compact_bodies(BENCHMARK_EVENTS).items():
+        session_id, events = decode_event_batch(body, content_type)
+        assert session_id == "benchmark"
+        assert len(events) == BENCHMARK_EVENTS
+        assert events[1]["payload"] == {"x": 1, "y": 1}
+        assert len(body) < len(json_body)
+
+
+def test_compact_batches_parse_faster_than_json():
+    if not BENCHMARK_PARSE:
+        pytest.skip("BENCHMARK_PARSE is not set")
+    json_body = json_batch(BENCHMARK_EVENTS)
+    json_cost = seconds_per_batch(lambda data: decode_event_batch(data, "application/json"), json_body)
+    print(f"\njson: {len(json_body):,} bytes, {json_cost * 1000:.2f} ms per {BENCHMARK_EVENTS}-event batch")
+
+    for content_type, body in compact_bodies(BENCHMARK_EVENTS).items():
+        cost = seconds_per_batch(lambda data: decode_event_batch(data, content_type), body)
+        print(f"{content_type}: {len(body):,} bytes, {cost * 1000:.2f} ms ({json_cost / cost:.1f}x)")
+        assert cost < json_cost
+
+
+def event_batch(**event) -> dict:
+    return {
+        "session_id": "s",
+        "module_id": "m",
+        "events": [{"event_type": "key_down", "client_timestamp": START_MS, **event}]
+    }
+
+
+@pytest.mark.parametrize("batch", [
+    event_batch(payload={"key": b"raw"}),
+    event_batch(payload={"nested": {1: "integer key"}}),
+    event_batch(payload={"x": float("nan")}),
+    event_batch(client_timestamp=-1),
+    event_batch(client_timestamp=MAX_CLIENT_TIMESTAMP_MS + 1),
+    event_batch(client_timestamp=True),
+    {"session_id": "s", "module_id": "m", "streams": [
+        {"event_type": "pointer_move", "client_timestamp": [START_MS], "columns": {"x": [b"raw"]}}
+    ]},
+    {"session_id": "s", "module_id": "m", "streams": [
+        {"event_type": "pointer_move", "client_timestamp": [START_MS, 10 ** 15], "columns": {"x": [1, 2]}}
+    ]}
+])
+def test_compact_batch_rejects_unstorable_values(batch):
+    with pytest.raises(WireFormatError):
+        decode_compact_batch(cbor2.dumps(batch), "application/cbor")
+
+
+def test_rejected_compact_batch_is_unprocessable(client, make_user, auth_headers):
+    response = client.post(
+        "/api/telemetry/events",
+        content=msgpack.packb(event_batch(payload={"nested": {1: "integer key"}})),
+        headers={**auth_headers(make_user()), "Content-Type": "application/msgpack"}
+    )
+    assert response.status_code == 422
@@ -16,7 +16,9 @@ const AdminTelemetry = () => {
   const [startDate, setStartDate] = useState('');
   const [endDate, setEndDate] = useState('');
   const [message, setMessage] = useState('');
-  const [offset, setOffset] = useState(0);
+  // Cursors of the pages visited so far; the last entry is the current page
+  const [cursors, setCursors] = useState([null]);
+  const [nextCursor, setNextCursor] = useState(null);
   const limit = 50;
 
   useEffect(() => {
@@ -34,7 +36,8 @@ const AdminTelemetry = () => {
     loadModules();
   }, [isAdmin]);
 
-  const fetchSessions = async (nextOffset = 0) => {
+  const fetchSessions = async (pageCursors = [null]) => {
+    const cursor = pageCursors[pageCursors.length - 1];
     setLoading(true);
     setMessage('');
     try {
@@ -45,12 +48,14 @@ const AdminTelemetry = () => {
           start_date: startDate || undefined,
           end_date: endDate || undefined,
           limit,
-          offset: nextOffset
+          cursor: cursor || undefined,
+          include_total: cursor ? undefined : true
         }
       });
       setSessions(response.data.sessions || []);
-      setTotal(response.data.total || 0);
-      setOffset(nextOffset);
+      if (!cursor) setTotal(response.data.total || 0);
+      setNextCursor(response.data.next_cursor || null);
+      setCursors(pageCursors);
     } catch (error) {
       setMessage(error.response?.data?.detail || 'Failed to load telemetry sessions.');
     } finally {
@@ -145,7 +150,7 @@ const AdminTelemetry = () => {
           End Date
           <input type="date" value={endDate} onChange={(e) => setEndDate(e.target.value)} />
         </label>
-        <button className="btn-secondary" onClick={() => fetchSessions(0)} disabled={loading}>
+        <button className="btn-secondary" onClick={() => fetchSessions()} disabled={loading}>
           {loading ? 'Loading...' : 'Search'}
         </button>
       </div>
@@ -185,16 +190,16 @@ const AdminTelemetry = () => {
       <div className="telemetry-pagination">
         <button
           className="btn-secondary"
-          onClick={() => fetchSessions(Math.max(offset - limit, 0))}
-          disabled={offset === 0 || loading}
+          onClick={() => fetchSessions(cursors.slice(0, -1))}
+          disabled={cursors.length === 1 || loading}
         >
           Previous
         </button>
-        <span>{Math.min(offset + limit, total)} of {total}</span>
+        <span>Page {cursors.length} of ~{Math.max(Math.ceil(total / limit), 1)}</span>
         <button
           className="btn-secondary"
-          onClick={() => fetchSessions(offset + limit)}
-          disabled={offset + limit >= total || loading}
+          onClick={() => fetchSessions([...cursors, nextCursor])}
+          disabled={!nextCursor || loading}
         >
           Next
         </button>
@@ -21,6 +21,7 @@ class TelemetryService {
     this.maxBufferSize = 50; // Max events before forced upload
     this.uploadInterval = 5000; // Upload every 5 seconds
     this.uploadTimer = null;
+    this.eventSampling = {};
     this.eventListeners = new Map();
     this.beforeUnloadHandler = null;
     this.pageHideHandler = null;
@@ -56,6 +57,7 @@ class TelemetryService {
     this.samplingRate = orgSettings.sampling_rate || 1.0;
     this.maxEventsPerSession = orgSettings.max_events_per_session || 10000;
     this.batchMs = orgSettings.batch_ms || 5000;
+    this.eventSampling = orgSettings.event_sampling || {};
     
     this.uploadInterval = this.batchMs;
     this.totalEventsCollected = 0;
@@ -82,6 +84,27 @@ class TelemetryService {
     return Math.random() < this.samplingRate;
   }
 
+  /**
+   * Apply load hints returned by the server with each upload
+   * Lets the backend thin high-frequency streams or widen batches without a redeploy
+   */
+  applyHints(hints) {
+    if (!hints) return;
+    if (typeof hints.sampling_rate === 'number') {
+      this.samplingRate = hints.sampling_rate;
+    }
+    if (hints.event_sampling) {
+      this.eventSampling = hints.event_sampling;
+    }
+    if (hints.batch_ms && hints.batch_ms !== this.batchMs) {
+      this.batchMs = hints.batch_ms;
+      this.uploadInterval = this.batchMs;
+      if (this.uploadTimer) {
+        this.startUploadTimer();
+      }
+    }
+  }
+
   /**
    * Start listening to browser events
    */
@@ -238,6 +261,10 @@ class TelemetryService {
   logEvent(eventType, payload = {}) {
     if (!this.isEnabled) return;
     if (this.totalEventsCollected >= this.maxEventsPerSession) return;
+    // Per-stream sampling from the server, e.g. pointer_move thinned under load
+    const streamType = eventType === 'game_event' && payload ? payload.type : eventType;
+    const streamRate = this.eventSampling[streamType];
+    if (typeof streamRate === 'number' && Math.random() >= streamRate) return;
 
     const event = {
       session_id: this.sessionId,
@@ -299,6 +326,8 @@ class TelemetryService {
 
       if (response.ok) {
         console.log(`[Telemetry] Uploaded ${eventsToUpload.length} events`);
+        const data = await response.json().catch(() => null);
+        this.applyHints(data && data.hints);
       } else {
         console.error('[Telemetry] Upload failed:', response.statusText);
         // Re-add failed events to buffer (with limit)
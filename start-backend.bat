@@ -4,4 +4,5 @@ cd backend
 python -m venv venv
 call venv\Scripts\activate
 pip install -r requirements.txt
+alembic upgrade head
 python main.py